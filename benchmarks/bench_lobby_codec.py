@@ -0,0 +1,67 @@
+"""
+Microbenchmark: LIST_ROOMS_RESPONSE decode throughput as the room count grows
+
+Compares the hand-written parser GameClient used before the lobby schemas
+with the compiled LOBBY_SCHEMAS decoder, on the memoryview payloads the
+framer hands out.
+
+Run from the repository root:
+    python -m benchmarks.bench_lobby_codec
+"""
+import struct
+import timeit
+
+from src.tcp_connect import LOBBY_SCHEMAS, MessageType, Room
+
+ROOM_LIST = LOBBY_SCHEMAS[MessageType.LIST_ROOMS_RESPONSE]
+
+
+def decode_by_hand(payload):
+    """The old _handle_list_rooms_response: one unpack per field plus bounds checks"""
+    rooms = []
+    ptr = 0
+    room_count = struct.unpack('!I', payload[ptr:ptr+4])[0]
+    ptr += 4
+    for _ in range(room_count):
+        if ptr + 4 > len(payload):
+            break
+        room_id = struct.unpack('!I', payload[ptr:ptr+4])[0]
+        ptr += 4
+        if ptr + 4 > len(payload):
+            break
+        name_len = struct.unpack('!I', payload[ptr:ptr+4])[0]
+        ptr += 4
+        if ptr + name_len > len(payload):
+            break
+        room_name = str(payload[ptr:ptr+name_len], 'utf-8', errors='ignore')
+        ptr += name_len
+        if ptr + 9 > len(payload):
+            break
+        current_players = struct.unpack('!I', payload[ptr:ptr+4])[0]
+        ptr += 4
+        max_players = struct.unpack('!I', payload[ptr:ptr+4])[0]
+        ptr += 4
+        state = payload[ptr]
+        ptr += 1
+        rooms.append(Room(room_id, room_name, current_players, max_players, state))
+    return rooms
+
+
+def make_payload(rooms):
+    return ROOM_LIST.encode([(i, f"room {i}", i % 4, 4, i % 2) for i in range(rooms)])
+
+
+def main(room_counts=(100, 1000, 5000, 20000), budget=0.5):
+    print(f"{'rooms':>6} {'bytes':>8} {'by hand ms':>11} {'schema ms':>10} {'rooms/s':>11} {'speedup':>8}")
+    for rooms in room_counts:
+        payload = memoryview(bytearray(make_payload(rooms)))
+        assert decode_by_hand(payload) == ROOM_LIST.decode(payload).rooms
+        number = max(1, int(budget * 2e5 / rooms))
+        old = timeit.timeit(lambda: decode_by_hand(payload), number=number) / number
+        new = timeit.timeit(lambda: ROOM_LIST.decode(payload), number=number) / number
+        print(f"{rooms:>6} {len(payload):>8} {old * 1000:>11.2f} {new * 1000:>10.2f} "
+              f"{rooms / new:>11,.0f} {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Microbenchmark: snapshot decode time per packet as the bullet count grows
+
+Run from the repository root:
+    python -m benchmarks.bench_snapshot_decode
+"""
+import struct
+import timeit
+
+from src.snapshot import decode_snapshot, encode_snapshot
+
+
+def decode_per_field(data):
+    """The old receive_thread parser: one unpack_from per field, dict per player"""
+    offset = 0
+    match_id = struct.unpack_from("!i", data, offset)[0]
+    offset += 4
+    player_count = struct.unpack_from("!i", data, offset)[0]
+    offset += 4
+
+    players = {}
+    for _ in range(player_count):
+        id = struct.unpack_from("!i", data, offset)[0]
+        offset += 4
+        x = struct.unpack_from("!f", data, offset)[0]
+        offset += 4
+        y = struct.unpack_from("!f", data, offset)[0]
+        offset += 4
+        health = struct.unpack_from("!i", data, offset)[0]
+        offset += 4
+        players[id] = {"x": x, "y": y, "health": health, "new": True}
+
+    bullet_count = struct.unpack_from("!i", data, offset)[0]
+    offset += 4
+    bullets = []
+    for _ in range(bullet_count):
+        x = struct.unpack_from("!f", data, offset)[0]
+        offset += 4
+        y = struct.unpack_from("!f", data, offset)[0]
+        offset += 4
+        bullets.append((x, y))
+    return match_id, players, bullets
+
+
+def make_packet(players, bullets):
+    return encode_snapshot(
+        1,
+        [(i, 10.0 * i, 20.0 * i, 100) for i in range(players)],
+        [(i, 1.5 * i, 2.5 * i) for i in range(bullets)],
+    )
+
+
+def main(players=4, bullet_counts=(0, 10, 50, 100, 250, 1000), number=20000):
+    print(f"{'bullets':>8} {'bytes':>7} {'per-field us':>13} {'decoder us':>11} {'speedup':>8}")
+    for bullets in bullet_counts:
+        packet = memoryview(bytearray(make_packet(players, bullets)))
+        old = timeit.timeit(lambda: decode_per_field(packet), number=number) / number * 1e6
+        new = timeit.timeit(lambda: decode_snapshot(packet), number=number) / number * 1e6
+        print(f"{bullets:>8} {len(packet):>7} {old:>13.2f} {new:>11.2f} {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
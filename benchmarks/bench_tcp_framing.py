@@ -0,0 +1,83 @@
+"""
+Microbenchmark: lobby TCP framing of multi-megabyte bursts
+
+Feeds the stream in recv-sized chunks through the old bytes framing of
+GameClient._tcp_receive_loop and through MessageFramer.
+
+Run from the repository root:
+    python -m benchmarks.bench_tcp_framing
+"""
+import struct
+import time
+
+from src.tcp_connect import MessageFramer, MessageType, ProtocolMessage
+
+
+def frame_bytes(chunks):
+    """The old receive loop: buffer += data, buffer = buffer[msg_length:]"""
+    count = 0
+    buffer = b''
+    for data in chunks:
+        buffer += data
+        while len(buffer) >= 8:
+            msg_length = struct.unpack('!I', buffer[:4])[0]
+            if len(buffer) < msg_length:
+                break
+            msg_data = buffer[:msg_length]
+            buffer = buffer[msg_length:]
+            if ProtocolMessage.deserialize(msg_data):
+                count += 1
+    return count
+
+
+def frame_framer(chunks):
+    count = 0
+    framer = MessageFramer()
+    for data in chunks:
+        framer.feed(data)
+        for msg in framer.messages():
+            count += 1
+    return count
+
+
+def room_list(rooms):
+    """LIST_ROOMS_RESPONSE payload with rooms entries"""
+    parts = [struct.pack('!I', rooms)]
+    for room_id in range(rooms):
+        name = f"room {room_id}".encode()
+        parts.append(struct.pack('!II', room_id, len(name)) + name + struct.pack('!IIB', 1, 4, 0))
+    return b''.join(parts)
+
+
+def room_update(room_id):
+    name = f"room {room_id}".encode()
+    payload = struct.pack('!II', room_id, len(name)) + name + struct.pack('!IIIBI', 2, 4, 7, 0, 0)
+    return ProtocolMessage(type=MessageType.ROOM_STATE_UPDATE, sequence=0, payload=payload).serialize()
+
+
+def bursts():
+    big = ProtocolMessage(type=MessageType.LIST_ROOMS_RESPONSE, sequence=1, payload=room_list(100000)).serialize()
+    yield "1 list of 100k rooms", big
+    yield "4 lists of 100k rooms", big * 4
+    yield "50k room updates", b''.join(room_update(i) for i in range(50000))
+
+
+def main(chunk=8192, repeat=3):
+    print(f"{'burst':<24} {'MB':>6} {'bytes ms':>10} {'framer ms':>10} {'speedup':>8}")
+    for name, stream in bursts():
+        chunks = [stream[i:i + chunk] for i in range(0, len(stream), chunk)]
+        timings = []
+        for frame in (frame_bytes, frame_framer):
+            best = None
+            for _ in range(repeat):
+                started = time.perf_counter()
+                frame(chunks)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            timings.append(best * 1000)
+        old, new = timings
+        print(f"{name:<24} {len(stream) / 1e6:>6.1f} {old:>10.1f} {new:>10.1f} {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
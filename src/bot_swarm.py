@@ -0,0 +1,297 @@
+"""
+Headless bot swarm: many lobby + match clients in one process, for load tests
+
+All bots share one NetworkCore event loop. Each bot owns a GameClient lobby
+connection (through AsyncGameClient) and a TestUDPClient match endpoint,
+so the process runs one network thread however many bots there are.
+
+Run from the repository root:
+    python -m src.bot_swarm --bots 200 --room-size 4 --duration 60 --register
+    python -m src.bot_swarm --udp-only --bots 300 --duration 30   # against src.local_server
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import Counter, deque
+from typing import Dict, List, Optional
+from .config import Config
+from .net_core import NetworkCore, AsyncGameClient
+from .server_connection import TestUDPClient, Action
+from .tcp_connect import ConnectionState
+
+logger = logging.getLogger(__name__)
+
+
+class BotStats:
+    """Per-bot latency, loss and error counters"""
+
+    def __init__(self, samples=1000):
+        self.lobby_latency = deque(maxlen=samples)  # giây, mỗi request lobby
+        self.input_latency = deque(maxlen=samples)  # giây, từ lúc gửi input tới snapshot ack nó
+        self.errors = Counter()
+        self.inputs_sent = 0
+        self.stage = 'init'
+
+    def error(self, kind):
+        self.errors[kind] += 1
+
+
+class Bot:
+    """One scripted player: login, room, match, then inputs until stopped"""
+
+    def __init__(self, core: NetworkCore, index: int, args):
+        self.core = core
+        self.index = index
+        self.args = args
+        self.username = f"{args.user_prefix}{index}"
+        self.stats = BotStats()
+        self.lobby: Optional[AsyncGameClient] = None
+        self.udp: Optional[TestUDPClient] = None
+        self.random = random.Random(args.seed + index if args.seed is not None else None)
+        self._unacked = deque()  # (sequence, sent_at)
+        self._held = (False, False, False, False)
+
+    async def _timed(self, kind, coro):
+        """Await a lobby call, record its latency and count a failure as an error"""
+        started = time.monotonic()
+        ok = await coro
+        self.stats.lobby_latency.append(time.monotonic() - started)
+        if not ok:
+            self.stats.error(kind)
+        return ok
+
+    async def join_lobby(self, rooms: Dict[int, asyncio.Future]):
+        """Connect, log in and get into a room; returns True once the match started"""
+        args = self.args
+        self.lobby = AsyncGameClient(self.core, args.host, args.tcp_port)
+        self.stats.stage = 'connect'
+        if not await self._timed('connect', self.lobby.connect()):
+            return False
+
+        self.stats.stage = 'login'
+        if args.register:
+            ok = await self._timed('register', self.lobby.register(self.username, args.password))
+        else:
+            ok = await self._timed('login', self.lobby.login(self.username, args.password))
+        if not ok:
+            return False
+
+        # Bot đầu tiên của mỗi nhóm tạo phòng, các bot còn lại vào theo room id của nó
+        group, slot = divmod(self.index, args.room_size)
+        room = rooms.setdefault(group, asyncio.get_running_loop().create_future())
+        self.stats.stage = 'room'
+        if slot == 0:
+            created = await self._timed('create_room', self.lobby.create_room(f"swarm-{group}", args.room_size))
+            if not room.done():
+                room.set_result(self.lobby.client.current_room_id if created else None)
+            if not created:
+                return False
+        else:
+            room_id = await room
+            if room_id is None or not await self._timed('join_room', self.lobby.join_room(room_id)):
+                return False
+
+        if slot == 0:
+            # Chờ cả nhóm vào phòng rồi mới bắt đầu
+            await asyncio.sleep(args.start_delay)
+            if not await self._timed('start_game', self.lobby.start_game()):
+                return False
+
+        self.stats.stage = 'waiting'
+        deadline = time.monotonic() + args.timeout
+        while self.lobby.state != ConnectionState.IN_GAME:
+            if time.monotonic() > deadline or self.lobby.state == ConnectionState.DISCONNECTED:
+                self.stats.error('match_start')
+                return False
+            await asyncio.sleep(0.1)
+        return True
+
+    async def open_match(self, player_id, match_id):
+        self.udp = TestUDPClient(self.args.host, self.args.udp_port, core=self.core,
+                                 player_id=player_id, match_id=match_id)
+        self.udp._match = await self.core.open_match(self.udp)
+        self.udp.running = True
+        self.udp.begin_match()
+
+    def _next_input(self, step):
+        """Random walk: hold a direction for a while, shoot now and then"""
+        if step % self.args.hold == 0:
+            self._held = (self.random.random() < 0.5, self.random.random() < 0.5,
+                          self.random.random() < 0.5, self.random.random() < 0.5)
+        action = Action.SHOOT if self.random.random() < self.args.shoot_rate else Action.NONE
+        return self._held, action
+
+    def _collect_acks(self, now):
+        acked = self.udp.acked_input
+        while self._unacked and ((acked - self._unacked[0][0]) & 0xFFFFFFFF) < 0x80000000:
+            sequence, sent_at = self._unacked.popleft()
+            self.stats.input_latency.append(now - sent_at)
+
+    async def play(self, duration):
+        self.stats.stage = 'playing'
+        interval = 1.0 / self.args.input_rate
+        end = time.monotonic() + duration
+        step = 0
+        while time.monotonic() < end:
+            (left, right, up, down), action = self._next_input(step)
+            sequence = self.udp.queue_input(left, right, up, down, action,
+                                            target_x=self.random.randrange(Config.SCREEN_WIDTH),
+                                            target_y=self.random.randrange(Config.SCREEN_HEIGHT))
+            self.udp.flush()
+            self.stats.inputs_sent += 1
+            now = time.monotonic()
+            if sequence is not None:
+                self._unacked.append((sequence, now))
+                if len(self._unacked) > Config.INPUT_HISTORY_SIZE:
+                    # Input đã rơi khỏi InputHistory mà vẫn chưa được ack
+                    self._unacked.popleft()
+                    self.stats.error('input_unacked')
+                self._collect_acks(now)
+            step += 1
+            await asyncio.sleep(interval)
+        self.stats.stage = 'done'
+
+    async def run(self, rooms, duration):
+        try:
+            if self.args.udp_only:
+                player_id, match_id = self.args.player_id_base + self.index, self.args.match_id
+            else:
+                if not await self.join_lobby(rooms):
+                    return
+                player_id, match_id = self.lobby.user_id, self.lobby.client.match_id
+            await self.open_match(player_id, match_id)
+            await self.play(duration)
+        except Exception as e:
+            self.stats.error(type(e).__name__)
+            logger.debug(f"Bot {self.index} failed: {e}")
+
+    async def close(self):
+        if self.udp:
+            self.udp.running = False
+            if self.udp._match:
+                match, self.udp._match = self.udp._match, None
+                await match.close()
+                self.udp._transport = None
+        if self.lobby:
+            await self.lobby.close()
+
+    def report(self):
+        """Per-bot summary, combining BotStats with the clients' ChannelStats"""
+        result = {
+            'bot': self.index,
+            'stage': self.stats.stage,
+            'errors': dict(self.stats.errors),
+            'inputs_sent': self.stats.inputs_sent,
+            'lobby_latency': _mean(self.stats.lobby_latency),
+            'input_latency': _mean(self.stats.input_latency),
+        }
+        if self.udp:
+            ticks = self.udp.ticks
+            expected = ticks.accepted + ticks.gaps
+            result['snapshots'] = self.udp.stats.packets_in
+            result['loss_rate'] = ticks.lost / expected if expected else 0.0
+            result['jitter'] = self.udp.stats.jitter
+            result['missing_baseline'] = self.udp.decoder.missing_baseline
+        return result
+
+
+def _mean(values):
+    return sum(values) / len(values) if values else None
+
+
+def _percentiles(values, points=(50, 90, 99)):
+    if not values:
+        return {}
+    ordered = sorted(values)
+    return {f"p{p}": ordered[min(len(ordered) - 1, len(ordered) * p // 100)] for p in points}
+
+
+def summarize(bots: List[Bot]) -> dict:
+    """Swarm-wide aggregate of every bot's stats"""
+    errors = Counter()
+    stages = Counter()
+    lobby, inputs, loss, jitter = [], [], [], []
+    for bot in bots:
+        errors.update(bot.stats.errors)
+        stages[bot.stats.stage] += 1
+        lobby.extend(bot.stats.lobby_latency)
+        inputs.extend(bot.stats.input_latency)
+        if bot.udp and bot.udp.stats.packets_in:
+            report = bot.report()
+            loss.append(report['loss_rate'])
+            jitter.append(report['jitter'])
+    return {
+        'bots': len(bots),
+        'stages': dict(stages),
+        'errors': dict(errors),
+        'inputs_sent': sum(bot.stats.inputs_sent for bot in bots),
+        'snapshots': sum(bot.udp.stats.packets_in for bot in bots if bot.udp),
+        'lobby_latency': _percentiles(lobby),
+        'input_latency': _percentiles(inputs),
+        'loss_rate': _percentiles(loss),
+        'jitter': _percentiles(jitter),
+    }
+
+
+async def run_swarm(core: NetworkCore, args) -> List[Bot]:
+    bots = [Bot(core, i, args) for i in range(args.bots)]
+    rooms: Dict[int, asyncio.Future] = {}
+    tasks = []
+    for bot in bots:
+        tasks.append(asyncio.create_task(bot.run(rooms, args.duration)))
+        # Tăng dần số bot thay vì mở hàng trăm kết nối cùng lúc
+        await asyncio.sleep(args.ramp / max(args.bots, 1))
+    await asyncio.gather(*tasks)
+    for bot in bots:
+        await bot.close()
+    return bots
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless bot swarm load generator")
+    parser.add_argument('--bots', type=int, default=10)
+    parser.add_argument('--host', default=Config.SERVER_IP)
+    parser.add_argument('--tcp-port', type=int, default=Config.SERVER_PORT_TCP)
+    parser.add_argument('--udp-port', type=int, default=Config.SERVER_PORT_UDP)
+    parser.add_argument('--user-prefix', default='bot')
+    parser.add_argument('--password', default='bot')
+    parser.add_argument('--register', action='store_true', help="register the accounts instead of logging in")
+    parser.add_argument('--room-size', type=int, default=4)
+    parser.add_argument('--start-delay', type=float, default=2.0, help="seconds the room owner waits before starting")
+    parser.add_argument('--timeout', type=float, default=30.0, help="seconds to wait for the match to start")
+    parser.add_argument('--duration', type=float, default=30.0, help="seconds each bot plays")
+    parser.add_argument('--ramp', type=float, default=5.0, help="seconds over which the bots are started")
+    parser.add_argument('--input-rate', type=float, default=Config.FPS, help="inputs per second per bot")
+    parser.add_argument('--hold', type=int, default=15, help="inputs before a bot changes direction")
+    parser.add_argument('--shoot-rate', type=float, default=0.05, help="chance an input shoots")
+    parser.add_argument('--udp-only', action='store_true', help="skip the lobby and send straight to the match server")
+    parser.add_argument('--player-id-base', type=int, default=1, help="player ids with --udp-only")
+    parser.add_argument('--match-id', type=int, default=Config.MATCHID, help="match id with --udp-only")
+    parser.add_argument('--protocol', type=int, choices=(1, 2), default=Config.UDP_PROTOCOL_VERSION)
+    parser.add_argument('--per-bot', action='store_true', help="also print every bot's report")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    Config.UDP_PROTOCOL_VERSION = args.protocol
+    # Hàng trăm bot cùng log mỗi response thì không đọc nổi
+    logging.getLogger('src.tcp_connect').setLevel(logging.WARNING)
+
+    core = NetworkCore()
+    core.start()
+    try:
+        bots = core.call(run_swarm(core, args))
+    finally:
+        core.stop()
+
+    if args.per_bot:
+        for bot in bots:
+            print(json.dumps(bot.report()))
+    print(json.dumps(summarize(bots), indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
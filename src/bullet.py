@@ -2,11 +2,13 @@ import pygame
 from .config import Config
 
 class Bullet:
+    # Surface đã load + scale, dùng chung cho mọi bullet cùng ảnh
+    _images = {}
+
     def __init__(self, x, y, target_x=0, target_y=0, image_path=Config.BULLET_PATH + "bullet_A.png", speed=10):
         self.speed = speed
 
-        self.image = pygame.image.load(image_path).convert_alpha()
-        self.image = pygame.transform.scale(self.image, (20, 20))
+        self.image = Bullet.load_image(image_path)
         self.image_rect = self.image.get_rect(center=(x, y))
 
         # Dùng Vector2 lưu vị trí thực
@@ -16,6 +18,20 @@ class Bullet:
         if direction.length() != 0:
             direction = direction.normalize()
         self.velocity = direction * speed
+        self.generation = 0  # lần BulletManager.sync gần nhất thấy bullet này
+
+    @classmethod
+    def load_image(cls, image_path, size=(20, 20)):
+        image = cls._images.get((image_path, size))
+        if image is None:
+            image = pygame.image.load(image_path).convert_alpha()
+            image = cls._images[(image_path, size)] = pygame.transform.scale(image, size)
+        return image
+
+    def set_position(self, x, y):
+        """Đặt vị trí theo snapshot, không cấp phát object mới"""
+        self.pos.update(x, y)
+        self.image_rect.center = (round(x), round(y))
 
     def update(self):
         # Di chuyển bằng Vector2
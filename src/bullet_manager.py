@@ -3,6 +3,10 @@ from .bullet import Bullet
 class BulletManager:
     def __init__(self):
         self.bullets = []
+        # Bullet theo id trong snapshot của server; bullet đã biến mất quay về pool
+        self.remote = {}
+        self._pool = []
+        self._generation = 0
 
     def shoot(self, start_pos, target_pos, kill_count=0):
         x, y = start_pos
@@ -26,7 +30,34 @@ class BulletManager:
             self.bullets.remove(bullet)
     def clear(self):
         self.bullets.clear()
+        self._pool.extend(self.remote.values())
+        self.remote.clear()
+
+    def sync(self, bullets):
+        """Cập nhật bullet của server từ (id, x, y) của snapshot, tại chỗ.
+
+        Bullet đã có chỉ đổi vị trí; bullet mới lấy từ pool, chỉ tạo Bullet
+        khi pool rỗng. Ở trạng thái ổn định không cấp phát gì.
+        """
+        self._generation += 1
+        generation = self._generation
+        remote = self.remote
+        seen = 0
+        for bullet_id, x, y in bullets:
+            bullet = remote.get(bullet_id)
+            if bullet is None:
+                bullet = self._pool.pop() if self._pool else Bullet(x, y)
+                remote[bullet_id] = bullet
+            bullet.set_position(x, y)
+            bullet.generation = generation
+            seen += 1
+        # Chỉ duyệt tìm bullet đã biến mất khi thực sự có
+        if len(remote) > seen:
+            for bullet_id in [bid for bid, bullet in remote.items() if bullet.generation != generation]:
+                self._pool.append(remote.pop(bullet_id))
         
     def draw(self, screen):
         for bullet in self.bullets:
+            bullet.draw(screen)
+        for bullet in self.remote.values():
             bullet.draw(screen)
\ No newline at end of file
@@ -0,0 +1,130 @@
+"""
+NTP-style clock synchronisation with the match server over the UDP channel
+"""
+import struct
+import time
+from collections import deque
+
+# Request: header !III với msg_type MSG_TIME_SYNC, body t0(d) = thời điểm client gửi
+# Reply:   magic(I) t0(d) t1(d) t2(d)
+#   t0  client clock when the request was sent (echoed back)
+#   t1  server clock when the request arrived
+#   t2  server clock when the reply was sent
+TIME_SYNC_MAGIC = 0x5A545332  # 'ZTS2'
+TIME_SYNC_REQUEST = struct.Struct('!d')
+TIME_SYNC_REPLY = struct.Struct('!Iddd')
+
+
+def is_time_sync_reply(data):
+    return len(data) == TIME_SYNC_REPLY.size and struct.unpack_from('!I', data, 0)[0] == TIME_SYNC_MAGIC
+
+
+class ClockSync:
+    """Estimates the server clock offset, RTT and drift from ping exchanges.
+
+    Each exchange gives offset = ((t1 - t0) + (t2 - t3)) / 2 and
+    rtt = (t3 - t0) - (t2 - t1). Samples with queueing delay have a larger
+    RTT and a skewed offset, so the estimate uses the minimum-RTT sample of
+    the last window exchanges (the NTP clock filter). Drift is the
+    least-squares slope of those filtered offsets over time.
+
+    Pings go out burst times at burst_interval to converge quickly, then
+    every interval seconds for the rest of the match.
+    """
+
+    def __init__(self, interval=2.0, window=8, burst=5, burst_interval=0.1, drift_history=32, clock=time.monotonic):
+        self.interval = interval
+        self.burst = burst
+        self.burst_interval = burst_interval
+        self.clock = clock
+
+        self._samples = deque(maxlen=window)        # (rtt, offset, t3)
+        self._filtered = deque(maxlen=drift_history)  # (t3, offset) của mẫu RTT nhỏ nhất
+        self._last_request = None
+
+        self.offset = 0.0
+        self.rtt = None
+        self.drift = 0.0  # giây lệch thêm mỗi giây local
+        self._reference = 0.0  # thời điểm local mà self.offset đúng
+        self.requests = 0
+        self.samples = 0
+        self.rejected = 0
+
+    @property
+    def synchronized(self):
+        return self.samples > 0
+
+    def _next_interval(self):
+        return self.burst_interval if self.requests < self.burst else self.interval
+
+    def time_until_due(self, now):
+        if self._last_request is None:
+            return 0.0
+        return max(self._last_request + self._next_interval() - now, 0.0)
+
+    def is_due(self, now):
+        return self._last_request is None or now - self._last_request >= self._next_interval()
+
+    def request(self, now=None):
+        """Body of the next ping; marks the ping as sent"""
+        now = self.clock() if now is None else now
+        self._last_request = now
+        self.requests += 1
+        return TIME_SYNC_REQUEST.pack(now)
+
+    def handle_reply(self, data, now=None):
+        """Feed a reply datagram received at local time now"""
+        t3 = self.clock() if now is None else now
+        magic, t0, t1, t2 = TIME_SYNC_REPLY.unpack_from(data, 0)
+        rtt = (t3 - t0) - (t2 - t1)
+        if rtt < 0 or t0 > t3:
+            # Reply không khớp với request nào của đồng hồ này
+            self.rejected += 1
+            return False
+        self._samples.append((rtt, ((t1 - t0) + (t2 - t3)) / 2, t3))
+        self.samples += 1
+
+        rtt, offset, at = min(self._samples)
+        self.rtt = rtt
+        if not self._filtered or self._filtered[-1][0] != at:
+            self._filtered.append((at, offset))
+        self.offset = offset
+        self._reference = at
+        self.drift = self._estimate_drift()
+        return True
+
+    def _estimate_drift(self):
+        points = self._filtered
+        if len(points) < 4 or points[-1][0] - points[0][0] < 10.0:
+            return 0.0
+        n = len(points)
+        mean_t = sum(t for t, _ in points) / n
+        mean_o = sum(o for _, o in points) / n
+        var = sum((t - mean_t) ** 2 for t, _ in points)
+        if var == 0:
+            return 0.0
+        return sum((t - mean_t) * (o - mean_o) for t, o in points) / var
+
+    def offset_at(self, local):
+        return self.offset + self.drift * (local - self._reference)
+
+    def server_time(self, local=None):
+        """Server clock reading that corresponds to local monotonic time local (default: now)"""
+        local = self.clock() if local is None else local
+        return local + self.offset_at(local)
+
+    def local_time(self, server):
+        """Local monotonic time at which the server clock reads server"""
+        # offset_at phụ thuộc local; drift rất nhỏ nên một bước lặp là đủ
+        local = server - self.offset
+        return server - self.offset_at(local)
+
+    def reset(self):
+        self._samples.clear()
+        self._filtered.clear()
+        self._last_request = None
+        self.offset = 0.0
+        self.rtt = None
+        self.drift = 0.0
+        self.requests = 0
+        self.samples = 0
@@ -10,6 +10,33 @@ class Config:
     ENEMYID=2
     MATCHID=0
 
+    # 1: input/snapshot gốc; 2: input có sequence, snapshot có header ZSN2
+    UDP_PROTOCOL_VERSION = 1
+    USE_NETWORK_CORE = False  # True: TCP lobby + UDP match chạy chung một event loop asyncio (net_core)
+    INPUT_HISTORY_SIZE = 32  # số input gửi lặp lại trong mỗi datagram
+    INPUT_KEEPALIVE_RATE = 5  # Hz, tần suất gửi khi input không đổi
+    INPUT_TICK_RATE = 30  # Hz, số lệnh di chuyển mỗi giây khi giữ phím, mỗi lệnh một datagram
+    UDP_MTU = 1200  # byte, datagram lớn nhất hai bên gửi; snapshot lớn hơn được chia fragment
+    FRAGMENT_TIMEOUT = 0.25  # giây, tick chưa đủ fragment sau thời gian này bị bỏ
+    CLOCK_SYNC_INTERVAL = 2.0  # giây giữa hai lần ping đồng bộ đồng hồ trong trận (protocol 2)
+    INTEREST_MARGIN = 200  # px, lề quanh viewport gửi cho server để entity không hiện đột ngột ở mép
+    RECORD_TRAFFIC_PATH = None  # đường dẫn file: ghi mọi snapshot/input/ProtocolMessage (net_recorder)
+    LOBBY_EVENT_QUEUE_SIZE = 256  # event lobby chờ luồng chính xử lý; đầy thì bỏ event thông tin cũ nhất, không bỏ event chuyển trạng thái
+    LOBBY_EVENT_BUDGET = 0.002  # giây mỗi frame dành cho xử lý event lobby
+    RECONNECT_BASE_DELAY = 0.5  # giây, backoff lần thử đầu; gấp đôi mỗi lần, có jitter
+    RECONNECT_MAX_DELAY = 15.0  # giây, trần của backoff
+    RECONNECT_MAX_ATTEMPTS = 0  # 0: thử lại mãi
+    HEARTBEAT_INTERVAL = 15.0  # giây giữa hai heartbeat lobby khi kết nối tốt
+    HEARTBEAT_MIN_INTERVAL = 1.0  # giây, chu kỳ khi kết nối có dấu hiệu xấu (mất echo, RTT tăng vọt)
+    HEARTBEAT_TIMEOUT = 3.0  # giây chờ echo trước khi tính là mất
+    HEARTBEAT_MAX_MISSED = 3  # số echo mất liên tiếp thì coi server đã chết
+
+    # Network / interpolation (giây)
+    INTERP_BUFFER_SIZE = 32
+    INTERP_MIN_DELAY = 0.05
+    INTERP_MAX_DELAY = 0.3
+    INTERP_MAX_EXTRAPOLATION = 0.25
+
     # Screen settings
     SCREEN_WIDTH = 1360
     SCREEN_HEIGHT = 780
@@ -0,0 +1,100 @@
+"""
+Registry of remote player sprites keyed by snapshot player id
+"""
+from .player import Player
+
+
+class RemotePlayers:
+    """Creates, pools and retires a Player sprite per remote player id.
+
+    sync() is called every frame with the interpolated positions. A player
+    that disappears from them (left the match or the area of interest) is
+    retired to the pool and its sprite reused for the next id that shows
+    up, so joining and leaving players do not allocate once the pool is
+    warm. Sprites share their animation surfaces through Player.
+    """
+
+    def __init__(self):
+        self.players = {}  # id -> Player
+        self._pool = []
+        self._generation = 0
+        self.created = 0
+        self.retired = 0
+
+    def __len__(self):
+        return len(self.players)
+
+    def __contains__(self, player_id):
+        return player_id in self.players
+
+    def get(self, player_id):
+        return self.players.get(player_id)
+
+    def sync(self, positions, exclude=None):
+        """Move sprites to {id: (x, y)}; ids missing from positions are retired"""
+        self._generation += 1
+        generation = self._generation
+        players = self.players
+        seen = 0
+        for player_id, (x, y) in positions.items():
+            if player_id == exclude:
+                continue
+            player = players.get(player_id)
+            if player is None:
+                player = players[player_id] = self._acquire(x, y)
+            else:
+                _face(player, x - player.x, y - player.y)
+            player.set_position(x, y)
+            player.generation = generation
+            seen += 1
+        if len(players) > seen:
+            for player_id in [pid for pid, player in players.items() if player.generation != generation]:
+                self.retire(player_id)
+
+    def set_health(self, player_id, health):
+        player = self.players.get(player_id)
+        if player is not None:
+            player.health = health
+
+    def _acquire(self, x, y):
+        if self._pool:
+            player = self._pool.pop()
+            player.reset()
+            player.set_position(x, y)
+        else:
+            player = Player(x, y)
+            self.created += 1
+        player.action = -1
+        return player
+
+    def retire(self, player_id):
+        player = self.players.pop(player_id, None)
+        if player is not None:
+            self._pool.append(player)
+            self.retired += 1
+
+    def update(self):
+        for player in self.players.values():
+            player.update_animation()
+
+    def draw(self, screen):
+        for player in self.players.values():
+            player.draw(screen)
+
+    def clear(self):
+        self._pool.extend(self.players.values())
+        self.players.clear()
+
+
+def _face(player, dx, dy):
+    """Pick the walk animation from the movement since the previous frame"""
+    if dy < 0:
+        player.update_action(2)
+    elif dy > 0:
+        player.update_action(3)
+    elif dx < 0:
+        player.update_action(0)
+    elif dx > 0:
+        player.update_action(1)
+    else:
+        player.action = -1
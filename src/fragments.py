@@ -0,0 +1,94 @@
+"""
+Split protocol 2 snapshots larger than the MTU across datagrams and reassemble them
+"""
+import struct
+from collections import OrderedDict
+
+# Fragment datagram (network byte order):
+#   magic(I) tick(I) index(H) count(H) chunk
+# The chunks of one tick, in index order, are the bytes of one ordinary
+# protocol 2 snapshot datagram (ZSN2 header included).
+FRAGMENT_MAGIC = 0x5A465232  # 'ZFR2'
+FRAGMENT_HEADER = struct.Struct('!IIHH')
+
+
+def is_fragment(data):
+    return len(data) >= FRAGMENT_HEADER.size and struct.unpack_from('!I', data, 0)[0] == FRAGMENT_MAGIC
+
+
+def split_snapshot(data, tick, mtu):
+    """Return [data] if it fits in mtu bytes, else fragment datagrams of at most mtu bytes"""
+    if len(data) <= mtu:
+        return [data]
+    chunk = mtu - FRAGMENT_HEADER.size
+    count = -(-len(data) // chunk)
+    if count > 0xFFFF:
+        raise ValueError(f"snapshot of {len(data)} bytes needs {count} fragments")
+    view = memoryview(data)
+    return [FRAGMENT_HEADER.pack(FRAGMENT_MAGIC, tick, index, count) + view[index * chunk:(index + 1) * chunk]
+            for index in range(count)]
+
+
+class FragmentAssembler:
+    """Collects fragments per tick until every index has arrived.
+
+    A tick that stays incomplete for timeout seconds is dropped, as are
+    incomplete ticks older than a tick that completes. At most max_pending
+    ticks are buffered; the oldest goes first.
+    """
+
+    def __init__(self, timeout=0.25, max_pending=8):
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self._pending = OrderedDict()  # tick -> [first_seen, parts, missing]
+        self.completed = 0
+        self.expired = 0
+        self.malformed = 0
+
+    def add(self, data, now):
+        """Add one fragment datagram; returns (tick, snapshot bytes) once complete, else None"""
+        magic, tick, index, count = FRAGMENT_HEADER.unpack_from(data, 0)
+        if count == 0 or index >= count:
+            self.malformed += 1
+            return None
+        self._expire(now)
+
+        entry = self._pending.get(tick)
+        if entry is None:
+            if len(self._pending) >= self.max_pending:
+                self._pending.popitem(last=False)
+                self.expired += 1
+            entry = self._pending[tick] = [now, [None] * count, count]
+        parts = entry[1]
+        if len(parts) != count:
+            self.malformed += 1
+            return None
+        if parts[index] is None:
+            # Buffer nhận được dùng lại cho datagram sau nên phải copy phần dữ liệu
+            parts[index] = bytes(data[FRAGMENT_HEADER.size:])
+            entry[2] -= 1
+        if entry[2]:
+            return None
+
+        del self._pending[tick]
+        # Các tick cũ hơn còn dở sẽ bị TickFilter loại, bỏ luôn
+        for older in [t for t in self._pending if ((tick - t) & 0xFFFFFFFF) < 0x80000000]:
+            del self._pending[older]
+            self.expired += 1
+        self.completed += 1
+        return tick, b''.join(parts)
+
+    def _expire(self, now):
+        while self._pending:
+            tick, entry = next(iter(self._pending.items()))
+            if now - entry[0] < self.timeout:
+                break
+            del self._pending[tick]
+            self.expired += 1
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def reset(self):
+        self._pending.clear()
@@ -9,18 +9,35 @@ from .audio_manager import AudioManager
 from .ui_manager import UIManager
 from .world import World
 from .player import Player
+from .entity_registry import RemotePlayers
 from .bullet_manager import BulletManager
 from .server_connection import TestUDPClient
 from .server_connection import Action
-from .bullet import Bullet
+from .prediction import InputPredictor
+from .interpolation import SnapshotBuffer
+from .net_core import NetworkCore
+from .net_stats import NetworkStats
+from .net_recorder import TrafficRecorder
+from .lobby_events import StateChanged
+from .tcp_connect import ConnectionState
+from .interest import InterestTracker, interest_rect
+
+MOVEMENT_KEYS = (pygame.K_a, pygame.K_d, pygame.K_w, pygame.K_s)
 
 class GameManager:
-    def __init__(self):
+    def __init__(self, offline=False):
+        """offline: không mở kết nối nào, traffic được đưa vào từ ngoài (net_replay)"""
+
+        self.network = None
+        if Config.USE_NETWORK_CORE and not offline:
+            self.network = NetworkCore()
+            self.network.start()
 
-        self.udp_client = TestUDPClient()
+        self.udp_client = TestUDPClient(core=self.network)
         
-        self.udp_client.initialize()
-        self.udp_client.start()
+        if not offline:
+            self.udp_client.initialize()
+            self.udp_client.start()
 
         # Initialize pygame
         self.screen = pygame.display.set_mode((Config.SCREEN_WIDTH, Config.SCREEN_HEIGHT))
@@ -29,15 +46,34 @@ class GameManager:
         
         # Initialize managers
         self.audio_manager = AudioManager()
-        self.ui_manager = UIManager(self.screen)
+        self.ui_manager = UIManager(self.screen, network=self.network, connect=not offline)
         self.bullet_manager = BulletManager()
+        self.interest = InterestTracker()
+        # Sau reconnect giữa trận, supervisor gắn lại kênh UDP vào Config.MATCHID
+        self.ui_manager.supervisor.udp_client = self.udp_client
+        self.ui_manager.client_connect.events.subscribe(StateChanged, self._on_state_changed)
+        self.net_stats = NetworkStats(tcp=self.ui_manager.client_connect.stats,
+                                      udp=self.udp_client.stats,
+                                      ticks=self.udp_client.ticks,
+                                      interest=self.interest,
+                                      clock=self.udp_client.clock_sync,
+                                      reconnect=self.ui_manager.supervisor,
+                                      heartbeat=self.ui_manager.client_connect.heartbeat)
+        self.show_net_stats = False
+
+        self.recorder = None
+        if Config.RECORD_TRAFFIC_PATH and not offline:
+            self.recorder = TrafficRecorder(Config.RECORD_TRAFFIC_PATH)
+            self.udp_client.recorder = self.recorder
+            self.ui_manager.client_connect.recorder = self.recorder
         #self.enemy_manager = EnemyManager()
         
         # Initialize game objects
         self.world = World(self.screen,level=1)
         self.player = Player(300,68)  
 
-        self.enemy = Player(80,68)
+        # Sprite người chơi khác theo id trong snapshot, tạo/thu hồi khi vào/ra
+        self.remote_players = RemotePlayers()
         
         # Initialize game state
         self.game_state = GameState()
@@ -52,6 +88,14 @@ class GameManager:
         }
 
         self.action = Action.NONE
+        self.input_dirty = False
+        self.input_submitted = False
+
+        # Version snapshot đã vẽ gần nhất
+        self.snapshot_version = 0
+        self.interpolation = SnapshotBuffer()
+        self.predictor = InputPredictor()
+        self.udp_reattached = self.udp_client.reattached
         
         # Mouse target for bullet direction
         self.target = Object(0, 0, 50, 50, pygame.image.load(Config.BULLET_PATH + "tam.png"),self.screen)
@@ -61,12 +105,33 @@ class GameManager:
         while self.game_state.running:
             self.clock.tick(Config.FPS)
             
+            self.process_network_events()
             self.handle_events()
             self.update()
             self.render()
+
+        self.ui_manager.shutdown()
+        self.udp_client.stop()
+        if self.network:
+            self.network.stop()
+        if self.recorder:
+            self.recorder.close()
             
+    def _on_state_changed(self, event):
+        # Ping đồng bộ đồng hồ chỉ chạy trong trận; mất kết nối lobby giữa trận không dừng trận UDP
+        if event.state == ConnectionState.IN_GAME:
+            self.udp_client.begin_match()
+        elif event.state != ConnectionState.DISCONNECTED:
+            self.udp_client.end_match()
+
+    def process_network_events(self):
+        """Apply lobby events posted by the network threads, within the frame's budget"""
+        self.ui_manager.client_connect.events.drain(Config.LOBBY_EVENT_BUDGET)
+
     def handle_events(self):
         """Handle all game events"""
+        self.input_submitted = False
+        self.input_dirty = False
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 self.game_state.running = False
@@ -83,6 +148,10 @@ class GameManager:
             # Handle death/win events
             else:
                 self._handle_death_win_events(event)
+
+        # Gửi ngay khi input đổi, trước khi update/render frame này
+        if self.input_dirty:
+            self._submit_input(changed=True)
                 
     def _handle_menu_events(self, event):
         self.ui_manager.update_login_screen(event)
@@ -93,9 +162,13 @@ class GameManager:
         """Handle in-game events"""
         if event.type == pygame.MOUSEBUTTONDOWN:
             self.action = Action.SHOOT
+            self.input_dirty = True
             #do something
             # self.audio_manager.play_shot()
             
+        if event.type in (pygame.KEYDOWN, pygame.KEYUP) and event.key in MOVEMENT_KEYS:
+            self.input_dirty = True
+
         if event.type == pygame.KEYDOWN:
             if event.key == pygame.K_a:
                 self.input_state['moving_left'] = True
@@ -107,6 +180,8 @@ class GameManager:
                 self.input_state['moving_down'] = True
             elif event.key == pygame.K_SPACE:
                 self.game_state.paused = True
+            elif event.key == pygame.K_F3:
+                self.show_net_stats = not self.show_net_stats
                 
         if event.type == pygame.KEYUP:
             if event.key == pygame.K_a:
@@ -120,6 +195,39 @@ class GameManager:
             elif event.key == pygame.K_ESCAPE:
                 self.game_state.running = False
                 
+    def _submit_input(self, changed=False):
+        """Gửi input: ngay khi đổi, còn khi giữ phím thì một lệnh mỗi tick mô phỏng"""
+        left = self.input_state['moving_left']
+        right = self.input_state['moving_right']
+        up = self.input_state['moving_up']
+        down = self.input_state['moving_down']
+        # Vùng quan tâm theo camera, server chỉ gửi entity trong vùng này
+        self.udp_client.viewport = interest_rect(self.world.bg_scroll, 0)
+        if changed:
+            sequence = self.udp_client.queue_input(left=left,
+                right=right,
+                up=up,
+                down=down,
+                action=self.action,
+                target_x=self.target.x,
+                target_y=self.target.y)
+            self.udp_client.input_changed()
+            sequences = [sequence]
+        else:
+            # Số lệnh theo INPUT_TICK_RATE, không theo FPS; đứng yên thì chỉ còn keepalive
+            sequences = self.udp_client.send_held_input(left=left,
+                right=right,
+                up=up,
+                down=down,
+                target_x=self.target.x,
+                target_y=self.target.y)
+        for sequence in sequences:
+            if sequence is not None:
+                # Protocol 2: di chuyển ngay, không chờ snapshot quay về
+                self.predictor.apply(self.player, sequence, left, right, up, down)
+        self.action = Action.NONE
+        self.input_submitted = True
+
     def _handle_pause_events(self, event):
         """Handle pause screen events"""
         pass  # Handled in UI manager
@@ -269,6 +377,7 @@ class GameManager:
             self.ui_manager.render_death()
         else:
             self._render_game()
+        self.ui_manager.render_connection_notice()
             
         pygame.display.update()
         
@@ -281,47 +390,49 @@ class GameManager:
         
         
 
-        self.udp_client.send_thread(left=self.input_state['moving_left'],
-            right=self.input_state['moving_right'],
-            up=self.input_state['moving_up'],
-            down=self.input_state['moving_down'],
-            action=self.action,
-            target_x=self.target.x,
-            target_y=self.target.y)
-        # Nhận và đồng bộ state nếu có
-        self.action = Action.NONE
-
-        with self.udp_client.lock:
-            if self.udp_client.game_state and "players" in self.udp_client.game_state:
-
-                    # if state["action"] == Action.SHOOT and state["target_x"] >0 and state["target_y"] > 0:
-                    #     self.audio_manager.play_shot()
-                    #     self.bullet_manager.shoot((state["x"]+self.player.width//2, state["y"]+self.player.height//2), (state["target_x"]+self.target.width//2, state["target_y"]+self.target.height//2), self.game_state.kill_count)
-                for player_id in self.udp_client.game_state["players"]:
-                    state = self.udp_client.game_state["players"].get(player_id)
-                    if state and state["new"]==True:
-                        self.udp_client.game_state["players"][player_id]["new"]=False
-                        if player_id==Config.PLAYERID:
-                            self.player.set_position(state["x"], state["y"])
-                        else:
-                            self.enemy.set_position(state["x"], state["y"])
-                        
-
-            if self.udp_client.game_state and "bullets" in self.udp_client.game_state:
-                bullets = self.udp_client.game_state["bullets"]
-                self.bullet_manager.clear()
-                for bullet in bullets:
-                    self.bullet_manager.add_bullet(Bullet(bullet[0], bullet[1]))
-                
+        if not self.input_submitted:
+            self._submit_input()
+
+        # Kênh UDP vừa gắn lại sau reconnect: input chờ ack và snapshot cũ thuộc phiên đã chết
+        if self.udp_client.reattached != self.udp_reattached:
+            self.udp_reattached = self.udp_client.reattached
+            self.predictor.reset()
+            self.interpolation.clear()
+
+        # Chỉ đọc tham chiếu snapshot mới nhất, không khóa luồng mạng
+        published = self.udp_client.handoff.latest
+        if published.version != self.snapshot_version:
+            self.snapshot_version = published.version
+            snapshot = published.snapshot
+            self.interpolation.push(snapshot, published.received_at)
+            self.interest.update(snapshot)
+            for player_id, x, y, health in snapshot.players():
+                if player_id != Config.PLAYERID:
+                    self.remote_players.set_health(player_id, health)
+                    continue
+                if snapshot.ack_input is None:
+                    self.player.set_position(x, y)
+                else:
+                    self.predictor.reconcile(self.player, x, y, snapshot.ack_input)
+
+            self.bullet_manager.sync(snapshot.bullets())
+
+        # Người chơi khác được vẽ trễ một chút và nội suy giữa các snapshot
+        # Người chơi đã ra khỏi vùng quan tâm bị thu hồi, không vẽ ở vị trí cũ
+        self.remote_players.sync(self.interpolation.sample(self.udp_client.clock()), exclude=Config.PLAYERID)
+        self.remote_players.update()
 
         self.player.update()
         
         # Draw player
         self.player.draw(self.screen)
-        self.enemy.draw(self.screen)
+        self.remote_players.draw(self.screen)
 
         self.bullet_manager.draw(self.screen)
 
+        if self.show_net_stats:
+            self.ui_manager.render_net_stats(self.net_stats.lines())
+
 
 
 
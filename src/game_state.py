@@ -26,6 +26,8 @@ class GameState:
         self.kill_count = 0
         self.enemy_waves = 0
         self.is_muted = False
+        self.current_room = None
+        self.current_room_id = 0
         
     def increment_kills(self):
         self.kill_count += 1
@@ -0,0 +1,121 @@
+"""
+Adaptive lobby heartbeat: RTT from timestamped pings, tighter pings when unhealthy, dead-peer detection
+"""
+import struct
+import time
+from collections import OrderedDict
+
+# Payload HEARTBEAT của client: thời điểm gửi (đồng hồ monotonic của client).
+# Server echo lại payload thì RTT tính thẳng từ đó, kể cả echo đến muộn;
+# server trả payload rỗng thì tra theo sequence.
+HEARTBEAT_PAYLOAD = struct.Struct('!d')
+MIN_WAIT = 0.01  # giây, chờ ngắn nhất của vòng heartbeat để không quay rỗng khi đã đến hạn
+
+
+class HeartbeatMonitor:
+    """Decides when to send the next heartbeat and when the peer is dead.
+
+    One heartbeat is outstanding at a time. An echo not back within
+    timeout seconds counts as missed and the next heartbeat goes out
+    straight away; max_missed misses in a row mean the peer is dead. While
+    the link looks unhealthy (a recent miss, or an RTT more than twice
+    the smoothed RTT plus spike_margin) heartbeats are sent every min_interval seconds
+    instead of every interval seconds, so a failing link is noticed in
+    seconds rather than after several full intervals.
+    """
+
+    def __init__(self, interval=15.0, min_interval=1.0, timeout=3.0, max_missed=3, history=8, spike_margin=0.05):
+        self.interval = interval
+        self.min_interval = min_interval
+        self.timeout = timeout
+        self.max_missed = max_missed
+        self.spike_margin = spike_margin  # giây, để jitter vài ms trên mạng LAN không bị coi là RTT tăng vọt
+        self._history = history
+        self._sent_at = OrderedDict()  # sequence -> thời điểm gửi, vài heartbeat gần nhất
+        self.sent = 0
+        self.received = 0
+        self.missed_total = 0
+        self.reset()
+
+    def reset(self):
+        """Start over for a new connection (counters are kept)"""
+        self._sent_at.clear()
+        self._outstanding = None  # (sequence, sent_at)
+        self.last_sent = None
+        self.missed = 0  # liên tiếp, về 0 khi có echo
+        self.rtt = None
+        self.srtt = None
+
+    @property
+    def dead(self):
+        return self.missed >= self.max_missed
+
+    @property
+    def healthy(self):
+        if self.missed:
+            return False
+        return self.rtt is None or self.srtt is None or self.rtt <= 2 * self.srtt + self.spike_margin
+
+    def current_interval(self):
+        return self.interval if self.healthy else self.min_interval
+
+    def time_until_due(self, now):
+        """Seconds until poll() has something to do; 0.0 when it is due now"""
+        if self._outstanding is not None:
+            return max(self._outstanding[1] + self.timeout - now, 0.0)
+        if self.last_sent is None:
+            return 0.0
+        return max(self.last_sent + self.current_interval() - now, 0.0)
+
+    def poll(self, now):
+        """Advance the timers; True when a heartbeat should be sent now"""
+        if self._outstanding is not None:
+            if now - self._outstanding[1] < self.timeout:
+                return False
+            self._outstanding = None
+            self.missed += 1
+            self.missed_total += 1
+            # Thử lại ngay thay vì chờ hết chu kỳ
+            return not self.dead
+        return self.last_sent is None or now - self.last_sent >= self.current_interval()
+
+    def payload(self, now):
+        return HEARTBEAT_PAYLOAD.pack(now)
+
+    def on_sent(self, sequence, now):
+        """Register a heartbeat; call before the bytes are written"""
+        self._outstanding = (sequence, now)
+        self.last_sent = now
+        self._sent_at[sequence] = now
+        if len(self._sent_at) > self._history:
+            self._sent_at.popitem(last=False)
+        self.sent += 1
+
+    def on_echo(self, sequence, payload, now):
+        """Feed a heartbeat reply; returns its RTT, or None if it cannot be matched"""
+        sent_at = self._sent_at.pop(sequence, None)
+        if len(payload) == HEARTBEAT_PAYLOAD.size:
+            echoed = HEARTBEAT_PAYLOAD.unpack_from(payload, 0)[0]
+            if echoed <= now and (sent_at is None or echoed == sent_at):
+                sent_at = echoed
+        if sent_at is None:
+            return None
+        self.received += 1
+        self.missed = 0
+        if self._outstanding is not None and self._outstanding[0] == sequence:
+            self._outstanding = None
+        rtt = now - sent_at
+        self.rtt = rtt
+        self.srtt = rtt if self.srtt is None else self.srtt + (rtt - self.srtt) / 8
+        return rtt
+
+    def snapshot(self):
+        return {
+            'sent': self.sent,
+            'received': self.received,
+            'missed': self.missed,
+            'missed_total': self.missed_total,
+            'rtt': self.rtt,
+            'srtt': self.srtt,
+            'interval': self.current_interval(),
+        }
@@ -0,0 +1,60 @@
+"""
+Decides when the UDP client sends an input datagram
+"""
+from .config import Config
+
+
+class InputScheduler:
+    """Send immediately when input changes, otherwise at a low keepalive rate.
+
+    The game loop reports changes with TestUDPClient.input_changed(),
+    which sends at once; every send goes through TestUDPClient.flush(),
+    which calls mark_sent(). The network thread calls is_due() on its own
+    wakeups, so keepalives do not depend on the render FPS.
+
+    While movement is held the game asks ticks_due() every frame and sends
+    one movement command per simulation tick, so the number of commands
+    (and datagrams) per second follows tick_rate, not the render FPS.
+    """
+
+    def __init__(self, keepalive_rate=Config.INPUT_KEEPALIVE_RATE, tick_rate=Config.INPUT_TICK_RATE):
+        self.interval = 1.0 / keepalive_rate
+        self.tick_interval = 1.0 / tick_rate
+        self.active = False  # bật khi game ghi nhận input đầu tiên
+        self.last_sent = 0.0
+        self.next_tick = None  # None: không giữ phím di chuyển
+        self.sent_on_change = 0
+        self.sent_keepalive = 0
+
+    def mark_sent(self, now):
+        self.last_sent = now
+
+    def is_due(self, now):
+        return self.active and now - self.last_sent >= self.interval
+
+    def time_until_due(self, now):
+        """Seconds until the next keepalive, or None when inactive"""
+        if not self.active:
+            return None
+        return max(0.0, self.last_sent + self.interval - now)
+
+    def restart_ticks(self, now):
+        """Input just changed and was sent: the next held-movement tick is one interval away"""
+        self.next_tick = now + self.tick_interval
+
+    def stop_ticks(self):
+        self.next_tick = None
+
+    def ticks_due(self, now, limit=4):
+        """Number of held-movement ticks due since the previous call (at most limit)"""
+        if self.next_tick is None:
+            self.restart_ticks(now)
+            return 0
+        due = 0
+        while now >= self.next_tick and due < limit:
+            self.next_tick += self.tick_interval
+            due += 1
+        if now >= self.next_tick:
+            # Frame bị treo lâu: bỏ phần tick còn thiếu thay vì dồn một loạt lệnh
+            self.restart_ticks(now)
+        return due
@@ -0,0 +1,45 @@
+"""
+Area of interest: the world rectangle a client wants snapshot entities for
+"""
+import struct
+from .config import Config
+
+# Gắn sau InputHistory trong datagram input protocol 2 (tùy chọn, server cũ bỏ qua):
+#   x(i) y(i) width(H) height(H)   toạ độ thế giới, đã cộng lề INTEREST_MARGIN
+VIEWPORT = struct.Struct('!iiHH')
+
+
+def interest_rect(camera_x, camera_y, margin=Config.INTEREST_MARGIN):
+    """Viewport of a camera at (camera_x, camera_y), grown by margin on every side"""
+    return (int(camera_x) - margin, int(camera_y) - margin,
+            min(Config.SCREEN_WIDTH + 2 * margin, 0xFFFF),
+            min(Config.SCREEN_HEIGHT + 2 * margin, 0xFFFF))
+
+
+def contains(rect, x, y):
+    left, top, width, height = rect
+    return left <= x < left + width and top <= y < top + height
+
+
+class InterestTracker:
+    """Player ids entering and leaving the interest area between snapshots"""
+
+    def __init__(self):
+        self.visible = frozenset()
+        self.entered_total = 0
+        self.left_total = 0
+
+    def update(self, snapshot):
+        """Return (entered, left) id sets for a new snapshot"""
+        visible = frozenset(snapshot.player_ids)
+        if visible == self.visible:
+            return frozenset(), frozenset()
+        entered = visible - self.visible
+        left = self.visible - visible
+        self.visible = visible
+        self.entered_total += len(entered)
+        self.left_total += len(left)
+        return entered, left
+
+    def reset(self):
+        self.visible = frozenset()
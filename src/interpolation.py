@@ -0,0 +1,122 @@
+"""
+Snapshot interpolation buffer for remote entities
+"""
+from collections import deque
+from .config import Config
+
+
+class SnapshotBuffer:
+    """Ring buffer of timestamped snapshots rendered a small delay in the past.
+
+    The delay adapts to the measured inter-arrival time and jitter of
+    snapshots. When the newest snapshot is older than the render time the
+    buffer extrapolates from the last two snapshots, for at most
+    max_extrapolation seconds.
+
+    Owned by the game loop: push and sample are called from the same thread.
+    """
+
+    def __init__(self, capacity=Config.INTERP_BUFFER_SIZE,
+                 min_delay=Config.INTERP_MIN_DELAY,
+                 max_delay=Config.INTERP_MAX_DELAY,
+                 max_extrapolation=Config.INTERP_MAX_EXTRAPOLATION,
+                 jitter_factor=2.0, smoothing=0.1):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.max_extrapolation = max_extrapolation
+        self.jitter_factor = jitter_factor
+        self.smoothing = smoothing
+
+        self._entries = deque(maxlen=capacity)  # (time, {id: (x, y)})
+
+        self.delay = min_delay
+        self.interval = 0.0
+        self.jitter = 0.0
+        self.extrapolating = False
+        self._last_arrival = None
+
+    def push(self, snapshot, now):
+        """Add a snapshot that arrived at local time now (seconds)"""
+        positions = dict(zip(snapshot.player_ids, zip(snapshot.player_x, snapshot.player_y)))
+        self._update_delay(now)
+        self._entries.append((now, positions))
+
+    def _update_delay(self, now):
+        if self._last_arrival is not None:
+            gap = now - self._last_arrival
+            if self.interval == 0.0:
+                self.interval = gap
+            # Ước lượng jitter kiểu RFC 3550: trung bình trượt của độ lệch
+            self.jitter += (abs(gap - self.interval) - self.jitter) * self.smoothing
+            self.interval += (gap - self.interval) * self.smoothing
+            target = self.interval + self.jitter_factor * self.jitter
+            target = min(max(target, self.min_delay), self.max_delay)
+            self.delay += (target - self.delay) * self.smoothing
+        self._last_arrival = now
+
+    def sample(self, now):
+        """Return {id: (x, y)} for render time now - delay"""
+        if not self._entries:
+            return {}
+        render_time = now - self.delay
+        entries = self._entries
+
+        newest_time, newest = entries[-1]
+        if render_time >= newest_time:
+            return self._extrapolate(render_time)
+
+        self.extrapolating = False
+        oldest_time, oldest = entries[0]
+        if render_time <= oldest_time:
+            return dict(oldest)
+
+        for i in range(len(entries) - 1, 0, -1):
+            t0, p0 = entries[i - 1]
+            if t0 <= render_time:
+                t1, p1 = entries[i]
+                return _lerp(p0, p1, (render_time - t0) / (t1 - t0))
+        return dict(oldest)
+
+    def _extrapolate(self, render_time):
+        newest_time, newest = self._entries[-1]
+        if len(self._entries) < 2:
+            self.extrapolating = False
+            return dict(newest)
+        prev_time, prev = self._entries[-2]
+        ahead = min(render_time - newest_time, self.max_extrapolation)
+        self.extrapolating = ahead > 0
+        span = newest_time - prev_time
+        if span <= 0:
+            return dict(newest)
+        return _lerp(prev, newest, 1.0 + ahead / span)
+
+    def clear(self):
+        self._entries.clear()
+        self._last_arrival = None
+
+    @property
+    def depth(self):
+        return len(self._entries)
+
+    def metrics(self):
+        """Current delay and buffer depth, for HUDs and logging"""
+        return {
+            'delay': self.delay,
+            'depth': self.depth,
+            'interval': self.interval,
+            'jitter': self.jitter,
+            'extrapolating': self.extrapolating,
+        }
+
+
+def _lerp(p0, p1, alpha):
+    """Interpolate entities present in p1; entities new in p1 are taken as is"""
+    result = {}
+    for entity_id, (x1, y1) in p1.items():
+        start = p0.get(entity_id)
+        if start is None:
+            result[entity_id] = (x1, y1)
+        else:
+            x0, y0 = start
+            result[entity_id] = (x0 + (x1 - x0) * alpha, y0 + (y1 - y0) * alpha)
+    return result
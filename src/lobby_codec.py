@@ -0,0 +1,189 @@
+"""
+Declarative lobby payload schemas compiled to struct-based encoders and decoders
+"""
+import struct
+from collections import namedtuple
+
+# Kiểu trường. Số nguyên theo network byte order; chuỗi là len(u32) + UTF-8
+U8 = 'B'
+U16 = 'H'
+U32 = 'I'
+I32 = 'i'
+STR = 'str'
+
+
+class ListOf:
+    """u32 item count followed by that many items of schema"""
+
+    def __init__(self, schema):
+        self.schema = schema
+
+
+class Schema:
+    """A payload layout: (name, type) fields in wire order.
+
+    The layout is compiled once into Python source: runs of fixed-size
+    fields, together with the length prefix of a string or list that
+    follows them, become one cached struct.Struct, so a room entry is two
+    unpack_from calls and a str() instead of one unpack per field.
+
+    decode() returns factory(*values), by default a namedtuple of the
+    field names. Fields listed in optional trail the payload and are
+    None when the payload ends before them.
+    """
+
+    def __init__(self, *fields, factory=None, optional=()):
+        self.fields = fields
+        self.names = tuple(name for name, _ in fields) + tuple(name for name, _ in optional)
+        self.optional = optional
+        self.factory = factory or namedtuple('Payload', self.names)
+        self._decode_from = _compile_decoder(self)
+        self.encode = _compile_encoder(self)
+
+    def decode(self, data, offset=0):
+        """Decode one payload; raises ValueError if it is truncated or malformed"""
+        try:
+            value, _ = self._decode_from(data, offset)
+        except struct.error as e:
+            raise ValueError(str(e)) from None
+        return value
+
+    def decode_from(self, data, offset=0):
+        """Return (value, offset after it)"""
+        try:
+            return self._decode_from(data, offset)
+        except struct.error as e:
+            raise ValueError(str(e)) from None
+
+
+class _Source:
+    def __init__(self):
+        self.lines = []
+        self.env = {'_TRUNCATED': _truncated}
+        self._names = 0
+
+    def name(self, prefix):
+        self._names += 1
+        return f"_{prefix}{self._names}"
+
+    def bind(self, prefix, value):
+        name = self.name(prefix)
+        self.env[name] = value
+        return name
+
+    def emit(self, indent, line):
+        self.lines.append('    ' * indent + line)
+
+
+def _local(name):
+    """Local variable of field name in generated code; the prefix keeps a field
+    called buf, offset, size or parts from overwriting the codec's own locals"""
+    return f"_f_{name}"
+
+
+def _truncated(offset, end):
+    raise ValueError(f"field at {offset} runs past the payload ({end} bytes)")
+
+
+def _runs(fields):
+    """Split fields into (fixed [(name, code)], tail (name, type) or None) groups"""
+    fixed = []
+    for name, kind in fields:
+        if kind == STR or isinstance(kind, ListOf):
+            yield fixed, (name, kind)
+            fixed = []
+        else:
+            fixed.append((name, kind))
+    if fixed:
+        yield fixed, None
+
+
+def _compile_decoder(schema):
+    src = _Source()
+    src.emit(0, "def decode(buf, offset):")
+    src.emit(1, "size = len(buf)")
+    values = _emit_decode_fields(src, schema.fields, 1)
+    if schema.optional:
+        for name, _ in schema.optional:
+            src.emit(1, f"{_local(name)} = None")
+        src.emit(1, "if offset < size:")
+        values += _emit_decode_fields(src, schema.optional, 2)
+    factory = src.bind('make', schema.factory)
+    src.emit(1, f"return {factory}({', '.join(values)}), offset")
+    exec('\n'.join(src.lines), src.env)
+    return src.env['decode']
+
+
+def _emit_decode_fields(src, fields, indent):
+    values = []
+    for fixed, tail in _runs(fields):
+        codes = ''.join(code for _, code in fixed)
+        names = [_local(name) for name, _ in fixed]
+        if tail is not None:
+            codes += 'I'
+            names.append(src.name('n'))
+        values += names[:len(fixed)]
+        packer = struct.Struct('!' + codes)
+        st = src.bind('S', packer)
+        target = ', '.join(names) + (',' if len(names) == 1 else '')
+        src.emit(indent, f"{target} = {st}.unpack_from(buf, offset)")
+        src.emit(indent, f"offset += {packer.size}")
+        if tail is None:
+            continue
+        name, kind = tail
+        name = _local(name)
+        count = names[-1]
+        values.append(name)
+        if kind == STR:
+            end = src.name('end')
+            src.emit(indent, f"{end} = offset + {count}")
+            src.emit(indent, f"if {end} > size: _TRUNCATED(offset, size)")
+            src.emit(indent, f"{name} = str(buf[offset:{end}], 'utf-8', 'ignore')")
+            src.emit(indent, f"offset = {end}")
+        else:
+            item = src.bind('item', kind.schema._decode_from)
+            src.emit(indent, f"{name} = []")
+            src.emit(indent, f"for _ in range({count}):")
+            src.emit(indent + 1, f"_value, offset = {item}(buf, offset)")
+            src.emit(indent + 1, f"{name}.append(_value)")
+    return values
+
+
+def _compile_encoder(schema):
+    """encode(*values) -> bytes; list fields take sequences of item tuples"""
+    src = _Source()
+    names = [_local(name) for name in schema.names]
+    src.emit(0, f"def encode({', '.join(names)}):")
+    src.emit(1, "parts = []")
+    _emit_encode_fields(src, schema.fields, 1)
+    if schema.optional:
+        src.emit(1, f"if {_local(schema.optional[0][0])} is not None:")
+        _emit_encode_fields(src, schema.optional, 2)
+    src.emit(1, "return b''.join(parts)")
+    exec('\n'.join(src.lines), src.env)
+    return src.env['encode']
+
+
+def _emit_encode_fields(src, fields, indent):
+    for fixed, tail in _runs(fields):
+        codes = ''.join(code for _, code in fixed)
+        args = [_local(name) for name, _ in fixed]
+        if tail is not None:
+            name, kind = tail
+            name = _local(name)
+            codes += 'I'
+            if kind == STR:
+                data = src.name('b')
+                src.emit(indent, f"{data} = {name}.encode('utf-8')")
+                args.append(f"len({data})")
+            else:
+                args.append(f"len({name})")
+        st = src.bind('S', struct.Struct('!' + codes))
+        src.emit(indent, f"parts.append({st}.pack({', '.join(args)}))")
+        if tail is None:
+            continue
+        if kind == STR:
+            src.emit(indent, f"parts.append({data})")
+        else:
+            item = src.bind('item', kind.schema.encode)
+            src.emit(indent, f"parts.extend([{item}(*_value) for _value in {name}])")
@@ -0,0 +1,142 @@
+"""
+Typed lobby events handed from the network threads to the pygame main loop
+"""
+import time
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+
+@dataclass(frozen=True)
+class StateChanged:
+    state: int  # ConnectionState
+    previous: int
+
+
+@dataclass(frozen=True)
+class Authenticated:
+    user_id: int
+    username: str
+
+
+@dataclass(frozen=True)
+class AuthFailed:
+    username: str
+
+
+@dataclass(frozen=True)
+class RoomsListed:
+    rooms: list  # List[Room], không dùng chung với luồng mạng
+
+
+@dataclass(frozen=True)
+class RoomUpdated:
+    room: object  # Room
+
+
+@dataclass(frozen=True)
+class MatchStarted:
+    room_id: int
+    match_id: int
+
+
+@dataclass(frozen=True)
+class Reconnecting:
+    attempt: int
+    delay: float  # giây chờ trước lần thử này
+
+
+@dataclass(frozen=True)
+class Reconnected:
+    downtime: float  # giây từ lúc mất kết nối đến khi khôi phục xong
+    attempts: int
+
+
+@dataclass(frozen=True)
+class ReconnectFailed:
+    attempts: int
+
+
+# Event chỉ mang thông tin, event sau thay cho event trước: được bỏ khi hàng đợi đầy.
+# Các event còn lại (StateChanged, Authenticated, MatchStarted...) là chuyển trạng thái, không bao giờ bỏ.
+DROPPABLE = (RoomsListed, RoomUpdated, Reconnecting)
+
+
+class EventBridge:
+    """Bounded queue of lobby events drained on the main thread.
+
+    Network handlers post() from any thread and never call UI code; the
+    main loop calls drain() once per frame, which dispatches to the
+    subscribers until the frame's time budget is spent and leaves the
+    rest for the next frame. When the queue is full the oldest DROPPABLE
+    event is dropped and counted; state transitions are always kept, so
+    the queue only grows past maxsize with transitions. Consecutive
+    StateChanged events that nobody has drained yet are merged into one,
+    which keeps that growth bounded. maxsize=0 means there is no
+    consumer: every event is counted as dropped and nothing is queued.
+    """
+
+    def __init__(self, maxsize: int = 256, clock=time.perf_counter):
+        self._events = deque()
+        self._lock = threading.Lock()
+        self._subscribers: Dict[type, List[Callable]] = {}
+        self.maxsize = maxsize
+        self.clock = clock
+        self.posted = 0
+        self.dispatched = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self._events)
+
+    def subscribe(self, event_type: type, callback: Callable):
+        self._subscribers.setdefault(event_type, []).append(callback)
+
+    def unsubscribe(self, event_type: type, callback: Callable):
+        callbacks = self._subscribers.get(event_type)
+        if callbacks and callback in callbacks:
+            callbacks.remove(callback)
+
+    def post(self, event):
+        with self._lock:
+            self.posted += 1
+            if not self.maxsize:
+                self.dropped += 1
+                return
+            if isinstance(event, StateChanged) and self._events and isinstance(self._events[-1], StateChanged):
+                # Hai lần đổi state liền nhau chưa được drain: giữ state mới, previous của lần trước
+                event = StateChanged(event.state, self._events.pop().previous)
+                self.coalesced += 1
+            if len(self._events) >= self.maxsize:
+                oldest = next((queued for queued in self._events if isinstance(queued, DROPPABLE)), None)
+                if oldest is not None:
+                    self._events.remove(oldest)
+                    self.dropped += 1
+                elif isinstance(event, DROPPABLE):
+                    self.dropped += 1
+                    return
+            self._events.append(event)
+
+    def drain(self, budget: Optional[float] = None) -> int:
+        """Dispatch queued events; stop once budget seconds have passed (None: all)"""
+        deadline = None if budget is None else self.clock() + budget
+        handled = 0
+        while self._events:
+            with self._lock:
+                if not self._events:
+                    break
+                event = self._events.popleft()
+            for callback in self._subscribers.get(type(event), ()):
+                callback(event)
+            handled += 1
+            # Luôn xử lý ít nhất một event để hàng đợi không bị kẹt
+            if deadline is not None and self.clock() >= deadline:
+                break
+        self.dispatched += handled
+        return handled
+
+    def clear(self):
+        with self._lock:
+            self._events.clear()
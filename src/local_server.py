@@ -0,0 +1,377 @@
+"""
+Local stand-in for the UDP match server, for development, tests and benchmarks
+
+Speaks the input datagrams built by TestUDPClient.flush (protocol 1 and 2)
+and answers with snapshots in the format parsed by TestUDPClient, at a
+fixed tick rate. Besides the connected clients it simulates a number of
+wandering bot players and ambient bullets.
+
+Run from the repository root (set Config.SERVER_IP to 127.0.0.1):
+    python -m src.local_server --tick-rate 30 --bots 8 --bullets 50 --protocol 2
+"""
+import argparse
+import logging
+import math
+import random
+import selectors
+import socket
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+from .config import Config
+from .server_connection import MSG_INPUT, MSG_INPUT_SEQ, MSG_TIME_SYNC, SNAPSHOT_ACK, InputHistory, Action
+from .snapshot import encode_snapshot, encode_delta, decode_snapshot
+from .fragments import split_snapshot
+from .interest import VIEWPORT, contains
+from .clock_sync import TIME_SYNC_MAGIC, TIME_SYNC_REQUEST, TIME_SYNC_REPLY
+
+logger = logging.getLogger(__name__)
+
+INPUT_HEADER = struct.Struct('!III')  # player_id, msg_type, match_id
+LEGACY_PAYLOAD = struct.Struct('!iiiiiiii')  # Payload.to_bytes
+
+BOT_ID_BASE = 1000
+
+
+class SimPlayer:
+    """Server-side state of one player, remote client or bot"""
+
+    def __init__(self, player_id, x, y):
+        self.player_id = player_id
+        self.x = float(x)
+        self.y = float(y)
+        self.health = Config.PLAYER_HEALTH
+
+        # Client UDP (None với bot)
+        self.addr = None
+        self.last_seen = 0.0
+        self.applied_input = 0  # sequence input mới nhất đã áp dụng (protocol 2)
+        self.ack_tick = 0       # tick snapshot client báo đã nhận
+        self.viewport = None    # (x, y, w, h) client gửi; None: gửi mọi entity
+        self.history = OrderedDict()  # tick -> Snapshot đã gửi, baseline cho delta
+
+        # Bot: hướng đi hiện tại và thời điểm đổi hướng
+        self.dx = 0
+        self.dy = 0
+        self.turn_at = 0.0
+
+    def move(self, left, right, up, down):
+        """One movement step, same rule as Player.move on the client"""
+        if left:
+            self.x -= Config.PLAYER_SPEED
+        if right:
+            self.x += Config.PLAYER_SPEED
+        if up:
+            self.y -= Config.PLAYER_SPEED
+        if down:
+            self.y += Config.PLAYER_SPEED
+
+
+class SimBullet:
+    __slots__ = ('bullet_id', 'x', 'y', 'vx', 'vy')
+
+    def __init__(self, bullet_id, x, y, vx, vy):
+        self.bullet_id = bullet_id
+        self.x = x
+        self.y = y
+        self.vx = vx
+        self.vy = vy
+
+    def update(self):
+        self.x += self.vx
+        self.y += self.vy
+        return 0 <= self.x <= Config.SCREEN_WIDTH and 0 <= self.y <= Config.SCREEN_HEIGHT
+
+
+class LocalMatchServer:
+    """Single-threaded UDP match server driven by a selector and a tick clock.
+
+    Input datagrams are applied as they arrive; every 1 / tick_rate seconds
+    bots and bullets advance and each client gets a snapshot. With protocol
+    2 the snapshot is a delta against the newest tick the client
+    acknowledged, if the server still has it. Clients that send a viewport
+    only get the players and bullets inside it, plus themselves.
+    """
+
+    def __init__(self, host='0.0.0.0', port=Config.SERVER_PORT_UDP, tick_rate=30,
+                 bots=0, bullets=0, protocol=Config.UDP_PROTOCOL_VERSION,
+                 match_id=Config.MATCHID, client_timeout=5.0, seed=None, mtu=Config.UDP_MTU):
+        self.host = host
+        self.port = port
+        self.tick_rate = tick_rate
+        self.bullet_target = bullets
+        self.protocol = protocol
+        self.match_id = match_id
+        self.client_timeout = client_timeout
+        self.mtu = mtu
+        self.random = random.Random(seed)
+
+        self.players: Dict[int, SimPlayer] = {}
+        self.bullets = []
+        self.next_bullet_id = 1
+        self.tick = 0
+        self.history_size = 32
+
+        self.sock: Optional[socket.socket] = None
+        self._selector: Optional[selectors.BaseSelector] = None
+        self._thread: Optional[threading.Thread] = None
+        self.running = False
+
+        self.datagrams_in = 0
+        self.datagrams_out = 0
+        self.bytes_out = 0
+        self.bad_datagrams = 0
+        self.fragmented = 0
+        self.oversized = 0
+
+        for i in range(bots):
+            self._spawn(BOT_ID_BASE + i)
+
+    def _spawn(self, player_id):
+        player = SimPlayer(player_id,
+                           self.random.uniform(0, Config.SCREEN_WIDTH - Config.PLAYER_SIZE[0]),
+                           self.random.uniform(0, Config.SCREEN_HEIGHT - Config.PLAYER_SIZE[1]))
+        self.players[player_id] = player
+        return player
+
+    def bind(self):
+        """Open the socket; returns the bound (host, port), useful with port 0"""
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.sock.setblocking(False)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self.sock, selectors.EVENT_READ)
+        self.port = self.sock.getsockname()[1]
+        return self.sock.getsockname()
+
+    def start(self):
+        """Bind and serve in a background thread"""
+        if not self.sock:
+            self.bind()
+        self.running = True
+        self._thread = threading.Thread(target=self.serve_forever, name="local-match-server", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self.running = False
+        if self._thread:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        if self._selector:
+            self._selector.close()
+            self._selector = None
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+
+    def serve_forever(self):
+        if not self.sock:
+            self.bind()
+        self.running = True
+        logger.info(f"Local match server on {self.host}:{self.port}, {self.tick_rate} Hz, protocol {self.protocol}")
+        interval = 1.0 / self.tick_rate
+        next_tick = time.monotonic()
+        while self.running:
+            timeout = max(next_tick - time.monotonic(), 0.0)
+            if self._selector.select(timeout):
+                self._drain()
+            now = time.monotonic()
+            if now >= next_tick:
+                self.step(now)
+                # Trễ quá một tick thì bỏ qua, không dồn nhiều tick liền nhau
+                next_tick = max(next_tick + interval, now)
+
+    def _drain(self):
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(2048)
+            except BlockingIOError:
+                return
+            except ConnectionResetError:
+                continue
+            self.datagrams_in += 1
+            try:
+                self.handle_datagram(data, addr, time.monotonic())
+            except struct.error:
+                self.bad_datagrams += 1
+
+    def handle_datagram(self, data, addr, now):
+        """Apply one input datagram from addr"""
+        player_id, msg_type, match_id = INPUT_HEADER.unpack_from(data, 0)
+        player = self.players.get(player_id)
+        if player is None:
+            player = self._spawn(player_id)
+            logger.info(f"Player {player_id} joined from {addr[0]}:{addr[1]}")
+        player.addr = addr
+        player.last_seen = now
+
+        offset = INPUT_HEADER.size
+        if msg_type == MSG_INPUT:
+            left, right, up, down, action, direction, target_x, target_y = LEGACY_PAYLOAD.unpack_from(data, offset)
+            player.move(left, right, up, down)
+            if action == Action.SHOOT.value:
+                self._shoot(player, target_x, target_y)
+        elif msg_type == MSG_TIME_SYNC:
+            t0 = TIME_SYNC_REQUEST.unpack_from(data, offset)[0]
+            self._send(TIME_SYNC_REPLY.pack(TIME_SYNC_MAGIC, t0, now, time.monotonic()), addr)
+        elif msg_type == MSG_INPUT_SEQ:
+            player.ack_tick = SNAPSHOT_ACK.unpack_from(data, offset)[0]
+            offset += SNAPSHOT_ACK.size
+            inputs, offset = InputHistory.decode(data, offset)
+            # Áp dụng từ cũ đến mới, bỏ sequence đã áp dụng
+            for sequence, buttons, direction, target_x, target_y in inputs:
+                ahead = (sequence - player.applied_input) & 0xFFFFFFFF
+                if ahead == 0 or ahead >= 0x80000000:
+                    continue
+                player.move(buttons & 1, buttons & 2, buttons & 4, buttons & 8)
+                if buttons >> 4 == Action.SHOOT.value:
+                    self._shoot(player, target_x, target_y)
+                player.applied_input = sequence
+            if len(data) >= offset + VIEWPORT.size:
+                player.viewport = VIEWPORT.unpack_from(data, offset)
+        else:
+            self.bad_datagrams += 1
+
+    def _shoot(self, player, target_x, target_y):
+        x = player.x + Config.PLAYER_SIZE[0] / 2
+        y = player.y + Config.PLAYER_SIZE[1] / 2
+        dx, dy = target_x - x, target_y - y
+        length = math.hypot(dx, dy) or 1.0
+        self.bullets.append(SimBullet(self._new_bullet_id(), x, y,
+                                      dx / length * Config.BULLET_SPEED, dy / length * Config.BULLET_SPEED))
+
+    def _new_bullet_id(self):
+        bullet_id = self.next_bullet_id
+        self.next_bullet_id = bullet_id + 1 if bullet_id < 0x7FFFFFFF else 1
+        return bullet_id
+
+    def _update_bots(self, now):
+        for player in self.players.values():
+            if player.addr is not None:
+                continue
+            if now >= player.turn_at:
+                player.dx = self.random.choice((-1, 0, 1))
+                player.dy = self.random.choice((-1, 0, 1))
+                player.turn_at = now + self.random.uniform(0.5, 2.0)
+            player.move(player.dx < 0, player.dx > 0, player.dy < 0, player.dy > 0)
+            # Dội lại ở mép màn hình
+            if not 0 <= player.x <= Config.SCREEN_WIDTH - Config.PLAYER_SIZE[0]:
+                player.dx = -player.dx
+                player.x = min(max(player.x, 0), Config.SCREEN_WIDTH - Config.PLAYER_SIZE[0])
+            if not 0 <= player.y <= Config.SCREEN_HEIGHT - Config.PLAYER_SIZE[1]:
+                player.dy = -player.dy
+                player.y = min(max(player.y, 0), Config.SCREEN_HEIGHT - Config.PLAYER_SIZE[1])
+
+    def _update_bullets(self):
+        self.bullets = [bullet for bullet in self.bullets if bullet.update()]
+        # Giữ đủ số đạn nền: bắn ra từ một cạnh màn hình theo hướng ngẫu nhiên
+        while len(self.bullets) < self.bullet_target:
+            angle = self.random.uniform(0, 2 * math.pi)
+            self.bullets.append(SimBullet(
+                self._new_bullet_id(),
+                self.random.uniform(0, Config.SCREEN_WIDTH), self.random.uniform(0, Config.SCREEN_HEIGHT),
+                math.cos(angle) * Config.BULLET_SPEED, math.sin(angle) * Config.BULLET_SPEED))
+
+    def _expire_clients(self, now):
+        for player_id in [pid for pid, player in self.players.items()
+                          if player.addr is not None and now - player.last_seen > self.client_timeout]:
+            logger.info(f"Player {player_id} timed out")
+            del self.players[player_id]
+
+    def step(self, now=None):
+        """Advance the simulation one tick and send a snapshot to every client"""
+        now = time.monotonic() if now is None else now
+        self.tick = (self.tick + 1) & 0xFFFFFFFF or 1
+        self._expire_clients(now)
+        self._update_bots(now)
+        self._update_bullets()
+
+        players = [(p.player_id, p.x, p.y, p.health) for p in self.players.values()]
+        bullets = [(b.bullet_id, b.x, b.y) for b in self.bullets]
+
+        legacy = encode_snapshot(self.match_id, players, bullets) if self.protocol < 2 else None
+        shared = None  # (full snapshot, baseline) cho các client không gửi viewport
+
+        for player in self.players.values():
+            if player.addr is None:
+                continue
+            if legacy is not None:
+                if len(legacy) > self.mtu:
+                    # Protocol 1 không có fragment: gửi nguyên, client sẽ bỏ vì bị cắt
+                    self.oversized += 1
+                self._send(legacy, player.addr)
+                continue
+
+            if player.viewport is None:
+                if shared is None:
+                    shared = self._full_state(players, bullets)
+                visible_players, visible_bullets, base = players, bullets, shared
+            else:
+                visible_players = [p for p in players if p[0] == player.player_id
+                                   or contains(player.viewport, p[1], p[2])]
+                visible_bullets = [b for b in bullets if contains(player.viewport, b[1], b[2])]
+                base = self._full_state(visible_players, visible_bullets)
+
+            # Entity ra khỏi vùng nằm trong danh sách removed của delta, vào vùng thì là changed
+            baseline = player.history.get(player.ack_tick)
+            if baseline is not None:
+                data = encode_delta(self.match_id, baseline, visible_players, visible_bullets,
+                                    player.applied_input, self.tick, now)
+            else:
+                data = encode_snapshot(self.match_id, visible_players, visible_bullets,
+                                       player.applied_input, self.tick, now)
+            datagrams = split_snapshot(data, self.tick, self.mtu)
+            if len(datagrams) > 1:
+                self.fragmented += 1
+            for datagram in datagrams:
+                self._send(datagram, player.addr)
+
+            player.history[self.tick] = base
+            while len(player.history) > self.history_size:
+                player.history.popitem(last=False)
+
+    def _full_state(self, players, bullets):
+        """The Snapshot a client holds after decoding this tick, kept as a delta baseline"""
+        return decode_snapshot(encode_snapshot(self.match_id, players, bullets, ack_input=0, tick=self.tick))
+
+    def _send(self, data, addr):
+        try:
+            self.sock.sendto(data, addr)
+        except OSError as e:
+            logger.warning(f"Send to {addr[0]}:{addr[1]} failed: {e}")
+            return
+        self.datagrams_out += 1
+        self.bytes_out += len(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in UDP match server")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=Config.SERVER_PORT_UDP)
+    parser.add_argument('--tick-rate', type=float, default=30)
+    parser.add_argument('--bots', type=int, default=4, help="simulated players besides the connected clients")
+    parser.add_argument('--bullets', type=int, default=20, help="ambient bullets kept in flight")
+    parser.add_argument('--protocol', type=int, choices=(1, 2), default=Config.UDP_PROTOCOL_VERSION)
+    parser.add_argument('--match-id', type=int, default=Config.MATCHID)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--mtu', type=int, default=Config.UDP_MTU, help="largest datagram; bigger snapshots are fragmented")
+    args = parser.parse_args()
+
+    server = LocalMatchServer(args.host, args.port, args.tick_rate, args.bots, args.bullets,
+                              args.protocol, args.match_id, seed=args.seed, mtu=args.mtu)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        logger.info(f"in {server.datagrams_in} out {server.datagrams_out} ({server.bytes_out} bytes)")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,339 @@
+"""
+Single asyncio event loop driving the lobby (TCP) and match (UDP) channels
+"""
+import asyncio
+import struct
+import threading
+import time
+import logging
+from typing import List, Optional
+from .config import Config
+from .tcp_connect import (
+    GameClient, ProtocolMessage, MessageFramer, MessageType, ConnectionState, Room,
+    build_credentials_payload, build_create_room_payload, build_room_id_payload,
+    response_succeeded,
+)
+from .net_recorder import TCP_IN, TCP_OUT
+from .lobby_events import EventBridge
+from .heartbeat import MIN_WAIT
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct('!IHH')  # length, type, sequence
+
+
+class NetworkCore:
+    """Owns one asyncio event loop running in a single background thread.
+
+    Lobby connections and match endpoints for any number of clients share
+    this loop, so the process needs one network thread instead of three
+    per client.
+    """
+
+    def __init__(self):
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread:
+            return
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.loop.call_soon(ready.set)
+            self.loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="network-core", daemon=True)
+        self._thread.start()
+        ready.wait()
+
+    def stop(self, timeout: float = 2.0):
+        """Cancel and await every task on the loop, then stop the thread and close the loop"""
+        if not self._thread:
+            return
+        try:
+            self.call(self._cancel_tasks(), timeout=timeout)
+        except Exception as e:
+            logger.warning(f"Network core tasks did not finish: {e!r}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=timeout)
+        if self._thread.is_alive():
+            # Loop còn chạy thì không close() được; để nguyên cho lần stop() sau
+            logger.error("Network core thread did not stop")
+            return
+        self._thread = None
+        self.loop.close()
+
+    async def _cancel_tasks(self):
+        current = asyncio.current_task()
+        tasks = [task for task in asyncio.all_tasks() if task is not current]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.loop.shutdown_asyncgens()
+
+    def on_loop_thread(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, coro):
+        """Schedule a coroutine on the loop; returns a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call(self, coro, timeout: Optional[float] = None):
+        """Run a coroutine on the loop and block the calling thread for its result"""
+        return self.submit(coro).result(timeout)
+
+    async def open_lobby(self, client: GameClient) -> 'LobbyConnection':
+        """Open the TCP lobby connection whose messages go to client's handlers"""
+        transport, protocol = await self.loop.create_connection(
+            lambda: LobbyConnection(client), client.host, client.tcp_port)
+        return protocol
+
+    async def open_match(self, udp_client) -> 'MatchProtocol':
+        """Open the UDP match endpoint for a TestUDPClient and start its keepalives"""
+        transport, protocol = await self.loop.create_datagram_endpoint(
+            lambda: MatchProtocol(udp_client), local_addr=('0.0.0.0', 0))
+        protocol.keepalive_task = self.loop.create_task(protocol.keepalive_loop())
+        return protocol
+
+
+class LobbyConnection(asyncio.BufferedProtocol):
+    """ProtocolMessage framing, request/response matching and heartbeat.
+
+    The transport reads straight into a MessageFramer buffer. Decoded
+    messages are handed to GameClient._handle_message so the client's
+    handlers keep owning the lobby state, and requests wait in the
+    client's PendingRequests like those of the threaded client.
+    """
+
+    def __init__(self, client: GameClient):
+        self.client = client
+        self.transport: Optional[asyncio.Transport] = None
+        self.framer = MessageFramer()
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self._heartbeat_task = asyncio.get_running_loop().create_task(self._heartbeat_loop())
+
+    def get_buffer(self, sizehint):
+        return self.framer.writable(max(sizehint, 4096))
+
+    def buffer_updated(self, nbytes):
+        self.framer.commit(nbytes)
+        try:
+            for msg in self.framer.messages():
+                if self.client.recorder:
+                    self.client.recorder.record(TCP_IN, msg.serialize())
+                self.client.stats.record_in(msg.length)
+                # Chạy handler rồi trả response cho request đang chờ (client.pending)
+                self.client._handle_message(msg)
+        except ValueError as e:
+            logger.error(f"{e}, closing connection")
+            self.transport.close()
+
+    def connection_lost(self, exc):
+        if exc:
+            logger.error(f"TCP receive error: {exc}")
+        else:
+            logger.warning("Server closed connection")
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+        # Sau reconnect client.lobby là kết nối mới: request đang chờ thuộc về kết nối đó
+        if self.client.lobby is None or self.client.lobby is self:
+            self.client.pending.cancel_all()
+        # client.running đã False nếu chính client gọi disconnect()
+        if self.client.running and self.client.lobby is self:
+            self.client._connection_lost()
+            return
+        self.client.running = False
+        self.client.state = ConnectionState.DISCONNECTED
+
+    def _write(self, msg_type: int, sequence: int, payload: bytes):
+        data = HEADER.pack(HEADER.size + len(payload), msg_type, sequence) + payload
+        self.transport.write(data)
+        self.client.stats.record_out(len(data))
+        if self.client.recorder:
+            self.client.recorder.record(TCP_OUT, data)
+
+    async def send(self, msg_type: int, payload: bytes = b'') -> int:
+        """Send without waiting for a response; returns the sequence number"""
+        if not self.transport or self.transport.is_closing():
+            raise ConnectionError("Not connected to server")
+        sequence = self.client._get_next_sequence()
+        self._write(msg_type, sequence, payload)
+        return sequence
+
+    async def request(self, msg_type: int, payload: bytes = b'', timeout: float = 10.0) -> Optional[ProtocolMessage]:
+        """Send a request and await the response with the same sequence (None on timeout)"""
+        if not self.transport or self.transport.is_closing():
+            logger.error("Not connected to server")
+            return None
+        sequence = self.client._get_next_sequence()
+        # Cùng bảng PendingRequests với client luồng: timeout trả None, cancel_all() khi mất kết nối
+        future = self.client.pending.register(sequence, timeout)
+        self._write(msg_type, sequence, payload)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            self.client.pending.discard(sequence)
+            raise
+
+    async def _heartbeat_loop(self):
+        # connection_lost() huỷ task nên đóng kết nối là thoát ngay
+        heartbeat = self.client.heartbeat
+        while not self.transport.is_closing():
+            now = time.monotonic()
+            if self.client.state != ConnectionState.DISCONNECTED and heartbeat.poll(now):
+                sequence = self.client._get_next_sequence()
+                heartbeat.on_sent(sequence, now)
+                self._write(MessageType.HEARTBEAT, sequence, heartbeat.payload(now))
+            elif heartbeat.dead:
+                logger.warning(f"No heartbeat reply for {heartbeat.missed} attempts, connection is dead")
+                self.transport.abort()
+                return
+            await asyncio.sleep(max(heartbeat.time_until_due(time.monotonic()), MIN_WAIT))
+
+    def close(self):
+        if self.transport:
+            self.transport.close()
+
+
+class MatchProtocol(asyncio.DatagramProtocol):
+    """UDP match channel of a TestUDPClient on the shared loop"""
+
+    def __init__(self, udp_client):
+        self.udp_client = udp_client
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.keepalive_task: Optional[asyncio.Task] = None
+        self.clock_sync_task: Optional[asyncio.Task] = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.udp_client._transport = transport
+
+    def datagram_received(self, data, addr):
+        self.udp_client._on_datagram(memoryview(data))
+
+    def error_received(self, exc):
+        # Windows báo ICMP port unreachable ở đây, bỏ qua như luồng nhận cũ
+        pass
+
+    def connection_lost(self, exc):
+        if self.keepalive_task:
+            self.keepalive_task.cancel()
+        if self.clock_sync_task:
+            self.clock_sync_task.cancel()
+
+    async def keepalive_loop(self):
+        """Keepalive input theo InputScheduler, thay cho timeout select() của luồng nhận"""
+        scheduler = self.udp_client.scheduler
+        while True:
+            wait = scheduler.time_until_due(time.monotonic())
+            await asyncio.sleep(scheduler.interval if wait is None else wait)
+            if scheduler.is_due(time.monotonic()):
+                scheduler.sent_keepalive += 1
+                self.udp_client.flush()
+
+    def start_clock_sync(self):
+        """TestUDPClient.begin_match(): bắt đầu ping đồng bộ đồng hồ"""
+        if self.clock_sync_task is None or self.clock_sync_task.done():
+            self.clock_sync_task = asyncio.get_running_loop().create_task(self.clock_sync_loop())
+
+    def stop_clock_sync(self):
+        if self.clock_sync_task:
+            self.clock_sync_task.cancel()
+            self.clock_sync_task = None
+
+    async def clock_sync_loop(self):
+        """Ping đồng bộ đồng hồ suốt trận để theo dõi drift"""
+        clock_sync = self.udp_client.clock_sync
+        while True:
+            await asyncio.sleep(clock_sync.time_until_due(time.monotonic()))
+            if clock_sync.is_due(time.monotonic()):
+                self.udp_client.send_time_sync()
+
+    async def close(self):
+        """Dừng keepalive và ping đồng bộ đồng hồ trước, rồi mới đóng transport"""
+        tasks = [task for task in (self.keepalive_task, self.clock_sync_task) if task]
+        self.keepalive_task = self.clock_sync_task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self.transport:
+            self.transport.close()
+
+
+class AsyncGameClient:
+    """Awaitable lobby API. State and message handlers come from GameClient."""
+
+    def __init__(self, core: NetworkCore, host: str = Config.SERVER_IP, tcp_port: int = Config.SERVER_PORT_TCP):
+        self.core = core
+        self.client = GameClient(host, tcp_port)
+        # Không có vòng lặp chính gọi drain(): bridge không giữ event nào
+        self.client.events = EventBridge(maxsize=0)
+        self.connection: Optional[LobbyConnection] = None
+
+    @property
+    def state(self) -> ConnectionState:
+        return self.client.state
+
+    @property
+    def user_id(self) -> int:
+        return self.client.user_id
+
+    async def connect(self) -> bool:
+        try:
+            self.connection = await self.core.open_lobby(self.client)
+        except OSError as e:
+            logger.error(f"Failed to connect: {e}")
+            return False
+        self.client.state = ConnectionState.CONNECTED
+        self.client.running = True
+        return True
+
+    async def close(self):
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+        self.client.running = False
+        self.client.state = ConnectionState.DISCONNECTED
+
+    async def request(self, msg_type: int, payload: bytes = b'', timeout: float = 10.0) -> Optional[ProtocolMessage]:
+        if not self.connection:
+            return None
+        return await self.connection.request(msg_type, payload, timeout)
+
+    async def login(self, username: str, password: str, timeout: float = 10.0) -> bool:
+        response = await self.request(MessageType.LOGIN_REQUEST, build_credentials_payload(username, password), timeout)
+        return self.client._finish_auth(response, username)
+
+    async def register(self, username: str, password: str, timeout: float = 10.0) -> bool:
+        response = await self.request(MessageType.REGISTER_REQUEST, build_credentials_payload(username, password), timeout)
+        return self.client._finish_auth(response, username)
+
+    async def logout(self, timeout: float = 5.0) -> bool:
+        return response_succeeded(await self.request(MessageType.LOGOUT_REQUEST, b'', timeout))
+
+    async def create_room(self, room_name: str, max_players: int = 4, timeout: float = 10.0) -> bool:
+        payload = build_create_room_payload(room_name, max_players)
+        return response_succeeded(await self.request(MessageType.CREATE_ROOM_REQUEST, payload, timeout))
+
+    async def join_room(self, room_id: int, timeout: float = 10.0) -> bool:
+        payload = build_room_id_payload(room_id)
+        return response_succeeded(await self.request(MessageType.JOIN_ROOM_REQUEST, payload, timeout))
+
+    async def leave_room(self, timeout: float = 5.0) -> bool:
+        return response_succeeded(await self.request(MessageType.LEAVE_ROOM_REQUEST, b'', timeout))
+
+    async def list_rooms(self, timeout: float = 10.0) -> List[Room]:
+        response = await self.request(MessageType.LIST_ROOMS_REQUEST, b'', timeout)
+        return self.client.rooms.copy() if response else []
+
+    async def start_game(self, timeout: float = 10.0) -> bool:
+        return response_succeeded(await self.request(MessageType.START_GAME_REQUEST, b'', timeout))
+
+    async def game_ready(self, timeout: float = 5.0) -> bool:
+        return response_succeeded(await self.request(MessageType.GAME_READY_REQUEST, b'', timeout))
@@ -0,0 +1,95 @@
+"""
+Recording of match and lobby traffic, for replay and profiling
+"""
+import struct
+import threading
+import time
+from typing import BinaryIO, Iterator, NamedTuple, Optional
+
+# File layout (network byte order):
+#   magic(4s) version(B)
+#   then records: timestamp(d) kind(B) length(I) data[length]
+# timestamp is time.monotonic() of the recording process; one file holds
+# exactly one session, so timestamps of different runs never mix.
+FILE_HEADER = struct.Struct('!4sB')
+RECORD_HEADER = struct.Struct('!dBI')
+FILE_MAGIC = b'ZREC'
+FILE_VERSION = 1
+
+UDP_IN = 1   # datagram snapshot nhận từ match server
+UDP_OUT = 2  # datagram input gửi đi
+TCP_IN = 3   # một ProtocolMessage đầy đủ nhận từ lobby server
+TCP_OUT = 4  # một ProtocolMessage đầy đủ gửi đi
+
+KIND_NAMES = {UDP_IN: 'udp_in', UDP_OUT: 'udp_out', TCP_IN: 'tcp_in', TCP_OUT: 'tcp_out'}
+
+
+class RecordError(ValueError):
+    pass
+
+
+class Record(NamedTuple):
+    timestamp: float
+    kind: int
+    data: bytes
+
+
+class TrafficRecorder:
+    """Writes every recorded datagram/message as one record.
+
+    record() is called from the game loop, the UDP receive thread and the
+    lobby thread (or the network core loop), so writes are serialized by a
+    lock. An existing file at path is replaced: time.monotonic() has no
+    common origin across processes, so a second session appended to the
+    same file would break the replayer's timing.
+    """
+
+    def __init__(self, path, buffering=1 << 16):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file: Optional[BinaryIO] = open(path, 'wb', buffering=buffering)
+        self._file.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION))
+        self.records = 0
+        self.bytes = 0
+
+    def record(self, kind, data, timestamp=None):
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        with self._lock:
+            if not self._file:
+                return
+            self._file.write(RECORD_HEADER.pack(timestamp, kind, len(data)))
+            self._file.write(data)
+            self.records += 1
+            self.bytes += len(data)
+
+    def flush(self):
+        with self._lock:
+            if self._file:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+
+def read_records(path) -> Iterator[Record]:
+    """Yield the records of a recording in file order"""
+    with open(path, 'rb') as f:
+        header = f.read(FILE_HEADER.size)
+        if len(header) < FILE_HEADER.size:
+            raise RecordError(f"{path}: not a traffic recording")
+        magic, version = FILE_HEADER.unpack(header)
+        if magic != FILE_MAGIC or version != FILE_VERSION:
+            raise RecordError(f"{path}: unsupported recording ({magic!r} v{version})")
+        while True:
+            head = f.read(RECORD_HEADER.size)
+            if len(head) < RECORD_HEADER.size:
+                # Bản ghi cuối có thể bị cắt dở nếu tiến trình bị kill giữa chừng
+                return
+            timestamp, kind, length = RECORD_HEADER.unpack(head)
+            data = f.read(length)
+            if len(data) < length:
+                return
+            yield Record(timestamp, kind, data)
@@ -0,0 +1,165 @@
+"""
+Replay a traffic recording through the real decoders and GameManager render path
+
+The game runs offline: recorded snapshots go through TestUDPClient's tick
+filter, decoder and handoff, lobby messages through GameClient's handlers,
+and frames are rendered on a fixed 1 / FPS schedule of recorded time. The
+clock the client stamps snapshots with is the recorded time, so snapshot
+timing and interpolation follow the recording; sprite animation still runs
+on pygame's own clock and is not reproduced exactly.
+
+Run from the repository root:
+    python -m src.net_replay match.rec            # recorded speed
+    python -m src.net_replay match.rec --max      # as fast as possible
+    python -m src.net_replay match.rec --max --headless --profile
+"""
+import argparse
+import os
+import struct
+import time
+from .config import Config
+from .net_recorder import UDP_IN, UDP_OUT, TCP_IN, KIND_NAMES, read_records
+from .server_connection import MSG_INPUT_SEQ, SNAPSHOT_ACK, InputHistory
+from .tcp_connect import ProtocolMessage
+
+INPUT_HEADER = struct.Struct('!III')  # player_id, msg_type, match_id
+
+
+class TrafficReplayer:
+    """Feeds recorded traffic into an offline GameManager.
+
+    speed is the playback rate relative to the recording; None replays
+    as fast as possible.
+    """
+
+    def __init__(self, game, records, speed=1.0):
+        self.game = game
+        self.records = records
+        self.speed = speed
+        self.frame_interval = 1.0 / Config.FPS
+
+        self.now = 0.0  # thời gian đã ghi hiện tại
+        self.game.udp_client.clock = lambda: self.now
+        self._last_input = None
+
+        self.counts = {kind: 0 for kind in KIND_NAMES}
+        self.frames = 0
+        self.render_time = 0.0
+        self.wall_time = 0.0
+        self.running = True
+
+    def run(self):
+        if not self.records:
+            return
+        import pygame
+        game = self.game
+        game.game_state.start_game = True
+
+        start = self.records[0].timestamp
+        wall_start = time.perf_counter()
+        next_frame = start
+        for record in self.records:
+            # Vẽ mọi frame đến hạn trước bản ghi này
+            while record.timestamp >= next_frame and self.running:
+                self.now = next_frame
+                self._wait_until(wall_start, next_frame - start)
+                self._render_frame(pygame)
+                next_frame += self.frame_interval
+            if not self.running:
+                break
+            self.now = record.timestamp
+            self._apply(record)
+            self.counts[record.kind] = self.counts.get(record.kind, 0) + 1
+        self.wall_time = time.perf_counter() - wall_start
+
+    def _wait_until(self, wall_start, offset):
+        if self.speed is None:
+            return
+        delay = wall_start + offset / self.speed - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _render_frame(self, pygame):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                self.running = False
+        # Input đến từ bản ghi UDP_OUT, không lấy từ bàn phím
+        self.game.input_submitted = True
+        started = time.perf_counter()
+        self.game.process_network_events()
+        self.game.render()
+        self.render_time += time.perf_counter() - started
+        self.frames += 1
+
+    def _apply(self, record):
+        if record.kind == UDP_IN:
+            self.game.udp_client._on_datagram(memoryview(record.data))
+        elif record.kind == TCP_IN:
+            msg = ProtocolMessage.deserialize(record.data)
+            if msg:
+                self.game.ui_manager.client_connect._handle_message(msg)
+        elif record.kind == UDP_OUT:
+            self._apply_input(record.data)
+
+    def _apply_input(self, data):
+        """Protocol 2: replay the inputs of the datagram the predictor has not seen, oldest first"""
+        if len(data) < INPUT_HEADER.size:
+            return
+        player_id, msg_type, match_id = INPUT_HEADER.unpack_from(data, 0)
+        if msg_type != MSG_INPUT_SEQ:
+            return
+        inputs, _ = InputHistory.decode(data, INPUT_HEADER.size + SNAPSHOT_ACK.size)
+        for sequence, buttons, direction, target_x, target_y in inputs:
+            # Datagram sau và keepalive gửi lại input cũ: mỗi sequence chỉ áp dụng một lần
+            if self._last_input is not None:
+                ahead = (sequence - self._last_input) & 0xFFFFFFFF
+                if ahead == 0 or ahead >= 0x80000000:
+                    continue
+            self._last_input = sequence
+            self.game.predictor.apply(self.game.player, sequence,
+                                      buttons & 1, buttons & 2, buttons & 4, buttons & 8)
+
+    def summary(self):
+        span = self.records[-1].timestamp - self.records[0].timestamp if self.records else 0.0
+        lines = [f"recorded {span:.2f}s, replayed in {self.wall_time:.2f}s"]
+        lines.append("records: " + ", ".join(f"{KIND_NAMES[kind]}={count}" for kind, count in self.counts.items()))
+        if self.frames:
+            lines.append(f"frames: {self.frames}, render {self.render_time / self.frames * 1000:.3f} ms/frame")
+        lines.append(f"snapshots: {self.game.udp_client.ticks.stats()}, "
+                     f"missing baseline {self.game.udp_client.decoder.missing_baseline}")
+        return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a traffic recording")
+    parser.add_argument('path')
+    parser.add_argument('--speed', type=float, default=1.0, help="playback rate relative to the recording")
+    parser.add_argument('--max', action='store_true', help="replay as fast as possible")
+    parser.add_argument('--headless', action='store_true', help="render to an offscreen surface")
+    parser.add_argument('--profile', action='store_true', help="print a cProfile report of the replay")
+    args = parser.parse_args()
+
+    if args.headless:
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+        os.environ['SDL_AUDIODRIVER'] = 'dummy'
+    import pygame
+    from .game_manager import GameManager
+
+    records = list(read_records(args.path))
+    pygame.init()
+    replayer = TrafficReplayer(GameManager(offline=True), records, None if args.max else args.speed)
+    if args.profile:
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        profiler.runcall(replayer.run)
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(25)
+    else:
+        replayer.run()
+    pygame.quit()
+    for line in replayer.summary():
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
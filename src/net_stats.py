@@ -0,0 +1,164 @@
+"""
+Live network statistics for the lobby (TCP) and match (UDP) channels
+"""
+import time
+
+
+class ChannelStats:
+    """Packet/byte counters, arrival jitter and RTT for one channel.
+
+    Counters are bumped from both the game and the network thread without
+    a lock; an occasional lost increment is acceptable for statistics.
+    Rates are computed over the last completed window of window seconds.
+    """
+
+    def __init__(self, name, window=1.0, smoothing=1 / 16):
+        self.name = name
+        self.window = window
+        self.smoothing = smoothing
+
+        self.packets_in = 0
+        self.packets_out = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+        self._window_start = time.monotonic()
+        self._window_counts = [0, 0, 0, 0]  # packets_in, bytes_in, packets_out, bytes_out
+        self.rates = (0.0, 0.0, 0.0, 0.0)
+
+        self.jitter = 0.0
+        self._last_arrival = None
+        self._interval = None
+
+        self.rtt = None
+        self.rtt_min = None
+        self.srtt = None
+
+    def _roll(self, now):
+        elapsed = now - self._window_start
+        if elapsed >= self.window:
+            self.rates = tuple(count / elapsed for count in self._window_counts)
+            self._window_counts = [0, 0, 0, 0]
+            self._window_start = now
+
+    def record_in(self, nbytes, now=None):
+        now = time.monotonic() if now is None else now
+        self._roll(now)
+        self.packets_in += 1
+        self.bytes_in += nbytes
+        self._window_counts[0] += 1
+        self._window_counts[1] += nbytes
+
+    def record_out(self, nbytes, now=None):
+        now = time.monotonic() if now is None else now
+        self._roll(now)
+        self.packets_out += 1
+        self.bytes_out += nbytes
+        self._window_counts[2] += 1
+        self._window_counts[3] += nbytes
+
+    def record_arrival(self, now):
+        """Inter-arrival jitter (RFC 3550 style smoothed deviation)"""
+        if self._last_arrival is not None:
+            gap = now - self._last_arrival
+            if self._interval is None:
+                self._interval = gap
+            self.jitter += (abs(gap - self._interval) - self.jitter) * self.smoothing
+            self._interval += (gap - self._interval) * self.smoothing
+        self._last_arrival = now
+
+    def record_rtt(self, rtt):
+        self.rtt = rtt
+        self.rtt_min = rtt if self.rtt_min is None else min(self.rtt_min, rtt)
+        self.srtt = rtt if self.srtt is None else self.srtt + (rtt - self.srtt) * 0.125
+
+    def snapshot(self, now=None):
+        now = time.monotonic() if now is None else now
+        self._roll(now)
+        pps_in, bps_in, pps_out, bps_out = self.rates
+        return {
+            'packets_in': self.packets_in,
+            'packets_out': self.packets_out,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'packets_in_per_sec': pps_in,
+            'bytes_in_per_sec': bps_in,
+            'packets_out_per_sec': pps_out,
+            'bytes_out_per_sec': bps_out,
+            'jitter': self.jitter,
+            'rtt': self.rtt,
+            'rtt_min': self.rtt_min,
+            'srtt': self.srtt,
+        }
+
+
+class NetworkStats:
+    """Aggregates the per-channel stats of a GameClient and a TestUDPClient"""
+
+    def __init__(self, tcp=None, udp=None, ticks=None, interest=None, clock=None, reconnect=None,
+                 heartbeat=None):
+        self.tcp = tcp
+        self.udp = udp
+        self.ticks = ticks  # snapshot.TickFilter của kênh UDP
+        self.interest = interest  # interest.InterestTracker
+        self.clock = clock  # clock_sync.ClockSync
+        self.reconnect = reconnect  # reconnect.ReconnectSupervisor
+        self.heartbeat = heartbeat  # heartbeat.HeartbeatMonitor của kênh TCP
+
+    def snapshot(self):
+        """Plain dict of current values, for tests, bots and the overlay"""
+        now = time.monotonic()
+        result = {}
+        if self.tcp:
+            result['tcp'] = self.tcp.snapshot(now)
+            if self.reconnect:
+                result['tcp']['reconnect'] = self.reconnect.snapshot()
+            if self.heartbeat:
+                result['tcp']['heartbeat'] = self.heartbeat.snapshot()
+        if self.udp:
+            udp = self.udp.snapshot(now)
+            if self.ticks:
+                expected = self.ticks.accepted + self.ticks.gaps
+                udp['loss_rate'] = self.ticks.lost / expected if expected else 0.0
+                udp['reorder_rate'] = self.ticks.reordered / self.ticks.received if self.ticks.received else 0.0
+                udp['duplicate_rate'] = self.ticks.duplicates / self.ticks.received if self.ticks.received else 0.0
+            if self.clock and self.clock.synchronized:
+                udp['clock_offset'] = self.clock.offset
+                udp['clock_rtt'] = self.clock.rtt
+                udp['clock_drift'] = self.clock.drift
+            if self.interest:
+                udp['visible_players'] = len(self.interest.visible)
+                udp['players_entered'] = self.interest.entered_total
+                udp['players_left'] = self.interest.left_total
+            result['udp'] = udp
+        return result
+
+    def lines(self):
+        """Short text lines for the in-game overlay"""
+        lines = []
+        for name, stats in self.snapshot().items():
+            rtt = f"{stats['srtt'] * 1000:.0f}ms" if stats['srtt'] is not None else "-"
+            lines.append(
+                f"{name.upper()} in {stats['packets_in_per_sec']:.0f}p/s {stats['bytes_in_per_sec'] / 1024:.1f}KB/s"
+                f" out {stats['packets_out_per_sec']:.0f}p/s {stats['bytes_out_per_sec'] / 1024:.1f}KB/s"
+            )
+            detail = f"    rtt {rtt} jitter {stats['jitter'] * 1000:.1f}ms"
+            if 'loss_rate' in stats:
+                detail += f" loss {stats['loss_rate'] * 100:.1f}% reorder {stats['reorder_rate'] * 100:.1f}%"
+            lines.append(detail)
+            if stats.get('heartbeat', {}).get('missed_total'):
+                heartbeat = stats['heartbeat']
+                lines.append(f"    heartbeats missed {heartbeat['missed']} now, {heartbeat['missed_total']} total"
+                             f" every {heartbeat['interval']:.0f}s")
+            if stats.get('reconnect', {}).get('outages'):
+                reconnect = stats['reconnect']
+                last = f"{reconnect['last_recovery']:.1f}s" if reconnect['last_recovery'] is not None else "-"
+                lines.append(f"    reconnects {reconnect['recoveries']}/{reconnect['outages']}"
+                             f" last {last} max {reconnect['max_recovery']:.1f}s")
+            if 'clock_offset' in stats:
+                lines.append(f"    clock offset {stats['clock_offset'] * 1000:.1f}ms"
+                             f" drift {stats['clock_drift'] * 1e6:.0f}ppm")
+            if 'visible_players' in stats:
+                lines.append(f"    players {stats['visible_players']} in view"
+                             f" (+{stats['players_entered']} / -{stats['players_left']})")
+        return lines
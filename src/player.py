@@ -3,6 +3,10 @@ import os
 from .config import Config
 
 class Player(pygame.sprite.Sprite):
+    # Frame animation và ảnh đứng yên dùng chung cho mọi Player, load lần đầu cần
+    _animations = None
+    _idle_image = None
+
     def __init__(self, x, y):
         pygame.sprite.Sprite.__init__(self)
         
@@ -15,13 +19,12 @@ class Player(pygame.sprite.Sprite):
         # Animation properties
         self.action = 0
         self.frame_index = 0
-        self.animation_list = []
         self.update_time = pygame.time.get_ticks()
         self.direction = 1
         self.flip = False
         
         # Load animations
-        self._load_animations()
+        self.animation_list = Player._load_animations()
         
         # Set initial image and rect
         self.image = self.animation_list[self.action][self.frame_index]
@@ -32,8 +35,12 @@ class Player(pygame.sprite.Sprite):
         self.width = self.image.get_width()
         self.height = self.image.get_height()
         
-    def _load_animations(self):
-        """Load all player animations"""
+    @classmethod
+    def _load_animations(cls):
+        """Load all player animations once; every Player shares the same surfaces"""
+        if cls._animations is not None:
+            return cls._animations
+        animation_list = []
         animation_types = ['left', 'right', 'up', 'down']
         
         for animation in animation_types:
@@ -49,7 +56,12 @@ class Player(pygame.sprite.Sprite):
                     img = pygame.transform.scale(img, Config.PLAYER_SIZE)
                     temp_list.append(img)
                     
-            self.animation_list.append(temp_list)
+            animation_list.append(temp_list)
+
+        default_img = pygame.image.load(Config.PLAYER_ANIMATIONS_PATH + 'down/down_2.png').convert_alpha()
+        cls._idle_image = pygame.transform.scale(default_img, Config.PLAYER_SIZE)
+        cls._animations = animation_list
+        return animation_list
             
     def update_animation(self):
         """Update player animation"""
@@ -138,9 +150,7 @@ class Player(pygame.sprite.Sprite):
             screen.blit(self.image, self.rect)
         else:
             # Draw default image when not moving
-            default_img = pygame.image.load(Config.PLAYER_ANIMATIONS_PATH + 'down/down_2.png').convert_alpha()
-            default_img = pygame.transform.scale(default_img, Config.PLAYER_SIZE)
-            screen.blit(default_img, self.rect)
+            screen.blit(Player._idle_image, self.rect)
             
     def reset(self):
         """Reset player to initial state"""
@@ -0,0 +1,52 @@
+"""
+Client-side prediction and server reconciliation for the local player
+"""
+from collections import deque
+
+from .snapshot import serial_ahead
+
+
+class InputPredictor:
+    """Moves the local player immediately on each input and replays the
+    inputs the server has not applied yet whenever a snapshot arrives.
+
+    The server applies each sequenced input as one Player.move step, so
+    replaying the unacknowledged inputs on top of the authoritative
+    position reproduces where the server will put the player.
+    """
+
+    def __init__(self, capacity=256, tolerance=0.5):
+        self.pending = deque(maxlen=capacity)  # (sequence, left, right, up, down)
+        self.tolerance = tolerance
+        self.last_acked = None  # None: chưa đối chiếu lần nào
+        self.corrections = 0
+        self.last_error = 0.0
+
+    def apply(self, player, sequence, left, right, up, down):
+        """Simulate one input locally and remember it until it is acknowledged"""
+        player.move(left, right, up, down)
+        self.pending.append((sequence, left, right, up, down))
+
+    def reconcile(self, player, x, y, acked):
+        """Rebase the player on the server position and replay pending inputs"""
+        # Sequence quay vòng ở 2**32: so sánh theo serial number, không dùng < trực tiếp
+        if self.last_acked is not None and serial_ahead(acked, self.last_acked) < 0:
+            return  # snapshot cũ hơn lần đối chiếu trước
+        self.last_acked = acked
+
+        while self.pending and serial_ahead(self.pending[0][0], acked) <= 0:
+            self.pending.popleft()
+
+        predicted_x, predicted_y = player.x, player.y
+        player.set_position(x, y)
+        for _, left, right, up, down in self.pending:
+            player.move(left, right, up, down)
+
+        self.last_error = abs(player.x - predicted_x) + abs(player.y - predicted_y)
+        if self.last_error > self.tolerance:
+            self.corrections += 1
+
+    def reset(self):
+        self.pending.clear()
+        self.last_acked = None
+        self.last_error = 0.0
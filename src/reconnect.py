@@ -0,0 +1,149 @@
+"""
+Reconnect the lobby after a dropped connection and resume the session, room and match
+"""
+import logging
+import random
+import threading
+import time
+from collections import namedtuple
+from .config import Config
+from .tcp_connect import ConnectionState
+from .lobby_events import Reconnecting, Reconnected, ReconnectFailed
+
+logger = logging.getLogger(__name__)
+
+# Những gì cần khôi phục, chụp lại lúc mất kết nối
+Session = namedtuple('Session', 'state room_id match_id lost_at')
+
+
+class Backoff:
+    """Exponential backoff with full jitter.
+
+    Attempt n (from 0) waits a uniform random time in
+    [0, min(max_delay, base_delay * 2**n)], so clients that lost the
+    server together do not all come back in the same instant.
+    """
+
+    def __init__(self, base_delay=0.5, max_delay=15.0, rng=random.random):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rng = rng
+
+    def delay(self, attempt):
+        return self.rng() * min(self.max_delay, self.base_delay * (2 ** min(attempt, 32)))
+
+
+class ReconnectSupervisor:
+    """Brings a GameClient back after its connection drops.
+
+    GameClient._connection_lost() calls reconnect() with the state the
+    client was in. A background thread then retries connect() with
+    Backoff delays. It re-authenticates with GameClient.resume_session(),
+    rejoins current_room_id, and for a match in progress restores
+    IN_GAME and re-attaches udp_client to the match. Progress goes to
+    the client's event bridge as Reconnecting / Reconnected /
+    ReconnectFailed, and the time-to-recover figures are kept for
+    NetworkStats.
+    """
+
+    def __init__(self, client, udp_client=None, base_delay=Config.RECONNECT_BASE_DELAY,
+                 max_delay=Config.RECONNECT_MAX_DELAY, max_attempts=Config.RECONNECT_MAX_ATTEMPTS,
+                 clock=time.monotonic, rng=random.random):
+        self.client = client
+        self.udp_client = udp_client
+        self.backoff = Backoff(base_delay, max_delay, rng)
+        self.max_attempts = max_attempts  # 0: không giới hạn
+        self.clock = clock
+        self._stop = threading.Event()
+        self._thread = None
+        client.supervisor = self
+
+        self.outages = 0
+        self.recoveries = 0
+        self.failures = 0  # lần mất kết nối bỏ cuộc sau max_attempts
+        self.attempts = 0  # tổng số lần thử connect
+        self.last_recovery = None  # giây
+        self.max_recovery = 0.0
+        self.total_recovery = 0.0
+        self.recovering_since = None
+
+    @property
+    def recovering(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def reconnect(self, state=ConnectionState.DISCONNECTED):
+        """Start recovering a connection that was in state; no-op if already recovering"""
+        if self.recovering or self._stop.is_set():
+            return False
+        client = self.client
+        session = Session(state, client.current_room_id, client.match_id, self.clock())
+        self.outages += 1
+        self.recovering_since = session.lost_at
+        self._thread = threading.Thread(target=self._run, args=(session,), daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self, session):
+        attempt = 0
+        while not self._stop.is_set():
+            delay = self.backoff.delay(attempt)
+            attempt += 1
+            self.client.events.post(Reconnecting(attempt, delay))
+            if self._stop.wait(delay):
+                break
+            self.attempts += 1
+            logger.info(f"Reconnect attempt {attempt}")
+            if self.client.connect():
+                if self._resume(session):
+                    self._recovered(session, attempt)
+                    return
+                self.client.disconnect()
+            if self.max_attempts and attempt >= self.max_attempts:
+                break
+        self.failures += 1
+        self.recovering_since = None
+        logger.error(f"Giving up reconnecting after {attempt} attempts")
+        self.client.events.post(ReconnectFailed(attempt))
+
+    def _resume(self, session):
+        client = self.client
+        if session.state < ConnectionState.AUTHENTICATED:
+            return True
+        if not client.resume_session():
+            logger.warning("Could not re-authenticate after reconnect")
+            return False
+        if session.state >= ConnectionState.IN_ROOM and session.room_id:
+            if not client.join_room(session.room_id):
+                # Phòng đã đóng hoặc server không cho vào lại giữa trận: trận UDP vẫn tiếp tục
+                logger.warning(f"Could not rejoin room {session.room_id}")
+        if session.state == ConnectionState.IN_GAME:
+            client.match_id = session.match_id
+            client.state = ConnectionState.IN_GAME
+            if self.udp_client:
+                self.udp_client.reattach(session.match_id)
+        return True
+
+    def _recovered(self, session, attempts):
+        downtime = self.clock() - session.lost_at
+        self.recoveries += 1
+        self.last_recovery = downtime
+        self.max_recovery = max(self.max_recovery, downtime)
+        self.total_recovery += downtime
+        self.recovering_since = None
+        logger.info(f"Reconnected after {downtime:.2f}s ({attempts} attempts)")
+        self.client.events.post(Reconnected(downtime, attempts))
+
+    def snapshot(self):
+        return {
+            'outages': self.outages,
+            'recoveries': self.recoveries,
+            'failures': self.failures,
+            'attempts': self.attempts,
+            'recovering': self.recovering,
+            'last_recovery': self.last_recovery,
+            'max_recovery': self.max_recovery,
+            'mean_recovery': self.total_recovery / self.recoveries if self.recoveries else None,
+        }
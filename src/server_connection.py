@@ -1,11 +1,26 @@
 import socket
 import time
 import struct
+import selectors
 import threading
+from collections import deque
 from enum import Enum
 from .config import Config
+from .snapshot import SnapshotDecoder, SnapshotError, SnapshotHandoff, TickFilter, read_header
+from .input_scheduler import InputScheduler
+from .net_stats import ChannelStats
+from .net_recorder import UDP_IN, UDP_OUT
+from .fragments import FragmentAssembler, is_fragment, FRAGMENT_HEADER
+from .interest import VIEWPORT
+from .clock_sync import ClockSync, is_time_sync_reply
 from typing import override
 
+# msg_type trong header !III của datagram input
+MSG_INPUT = 1
+MSG_INPUT_SEQ = 2  # Config.UDP_PROTOCOL_VERSION >= 2: ack_tick(I) + InputHistory
+MSG_TIME_SYNC = 3  # protocol 2: ping đồng bộ đồng hồ, xem clock_sync
+SNAPSHOT_ACK = struct.Struct('!I')  # tick snapshot mới nhất client đã giải mã đủ
+
 class Action(Enum):
     NONE = 0
     SHOOT = 1
@@ -25,38 +40,139 @@ class Move:
 
 
 class Payload:
-    def __init__(self,move,action=Action.NONE,action_direction=1,target_x=0,target_y=0):
+    def __init__(self,move,action=Action.NONE,action_direction=1,target_x=0,target_y=0,sequence=0):
         self.move=move
         self.action=action
         self.action_direction=action_direction
         self.target_x=target_x
         self.target_y=target_y
+        self.sequence=sequence
 
     def to_bytes(self):
         return struct.pack('!iiiiiiii', self.move.left, self.move.right, self.move.up, self.move.down, self.action.value, self.action_direction,self.target_x,self.target_y)
 
+    def to_record(self):
+        """Bản ghi gọn 6 byte dùng trong InputHistory"""
+        buttons = (self.move.left | self.move.right << 1 | self.move.up << 2 | self.move.down << 3
+                   | self.action.value << 4)
+        return InputHistory.RECORD.pack(buttons, _clamp(self.action_direction, -128, 127),
+                                        _clamp(self.target_x, -32768, 32767),
+                                        _clamp(self.target_y, -32768, 32767))
+
     @override
     def __str__(self) -> str:
-        return f"Payload(move={self.move}, action={self.action}, action_direction={self.action_direction}, target_x={self.target_x}, target_y={self.target_y})"
+        return f"Payload(sequence={self.sequence}, move={self.move}, action={self.action}, action_direction={self.action_direction}, target_x={self.target_x}, target_y={self.target_y})"
+
+def _clamp(value, low, high):
+    return max(low, min(high, int(value)))
+
+
+class InputHistory:
+    """N input gần nhất, gửi lại trong mọi datagram.
+
+    Layout: newest_sequence(I) count(B) rồi count bản ghi RECORD, mới nhất
+    trước; bản ghi thứ i có sequence newest_sequence - i. Server bỏ qua các
+    sequence đã áp dụng, nên mất vài datagram liên tiếp không làm mất input
+    (kể cả Action.SHOOT).
+    """
+    HEADER = struct.Struct('!IB')
+    RECORD = struct.Struct('!Bbhh')  # buttons, action_direction, target_x, target_y
+
+    def __init__(self, size=Config.INPUT_HISTORY_SIZE):
+        self._records = deque(maxlen=size)
+        self.newest = 0
+
+    def push(self, sequence, payload):
+        self._records.appendleft(payload.to_record())
+        self.newest = sequence
+
+    def acknowledge(self, sequence):
+        """Bỏ các input server đã áp dụng (sequence <= sequence)"""
+        keep = self.newest - sequence
+        while len(self._records) > max(keep, 0):
+            self._records.pop()
+
+    def to_bytes(self):
+        return self.HEADER.pack(self.newest, len(self._records)) + b''.join(self._records)
+
+    @classmethod
+    def decode(cls, data, offset=0):
+        """Ngược của to_bytes: ([(sequence, buttons, action_direction, target_x, target_y)], offset sau cùng).
+
+        Danh sách theo thứ tự áp dụng, cũ nhất trước.
+        """
+        newest, count = cls.HEADER.unpack_from(data, offset)
+        offset += cls.HEADER.size
+        inputs = []
+        for i in range(count - 1, -1, -1):
+            record = cls.RECORD.unpack_from(data, offset + i * cls.RECORD.size)
+            inputs.append(((newest - i) & 0xFFFFFFFF,) + record)
+        return inputs, offset + count * cls.RECORD.size
+
+    def clear(self):
+        self._records.clear()
+
 
 class TestUDPClient:
     id=1
-    def __init__(self, server_ip=Config.SERVER_IP, server_port=Config.SERVER_PORT_UDP):
+    def __init__(self, server_ip=Config.SERVER_IP, server_port=Config.SERVER_PORT_UDP, core=None,
+                 player_id=None, match_id=None):
         self.server_ip = server_ip
         self.server_port = server_port
+        # None: dùng Config.PLAYERID / Config.MATCHID (client game); bot đặt riêng cho từng instance
+        self.player_id = player_id
+        self.match_id = match_id
         self.client_socket = None
+        # Khi có core (net_core.NetworkCore), kênh UDP chạy trên event loop chung, không có luồng nhận riêng
+        self.core = core
+        self._match = None
+        self._transport = None
         self.running = False
-        self.BUFFER_SIZE = 1000
+        # Thêm 1 byte để nhận ra datagram lớn hơn MTU (bị cắt) thay vì giải mã sai
+        self.BUFFER_SIZE = Config.UDP_MTU + 1
+        self.RECV_TIMEOUT = 0.1  # giây, chỉ để kiểm tra lại self.running
         self.payload = Payload(Move(0,0,0,0),Action.SHOOT,1,0,0)
-
-        self.lock = threading.Lock()
-
-        self.game_state = {}
+        self.input_sequence = 0
+        self.input_history = InputHistory()
+        self.acked_input = 0  # ghi bởi luồng nhận, đọc khi gửi
+        self.viewport = None  # (x, y, w, h) vùng quan tâm, protocol 2; None: nhận mọi entity
+
+        self._send_lock = threading.Lock()
+        self.scheduler = InputScheduler()
+
+        self.handoff = SnapshotHandoff()
+        self.decoder = SnapshotDecoder()
+
+        # Hai buffer nhận cấp phát sẵn: một giữ snapshot mới nhất, một để đọc tiếp
+        self._recv_buffer = bytearray(self.BUFFER_SIZE)
+        self._spare_buffer = bytearray(self.BUFFER_SIZE)
+        self.ticks = TickFilter()
+        self.fragments = FragmentAssembler(timeout=Config.FRAGMENT_TIMEOUT)
+        self.truncated_snapshots = 0
+        self.stats = ChannelStats('udp')
+        self.recorder = None  # net_recorder.TrafficRecorder khi bật ghi traffic
+        # Đồng hồ gắn cho snapshot nhận được; replay thay bằng thời gian đã ghi
+        self.clock = time.monotonic
+        self.clock_sync = ClockSync(interval=Config.CLOCK_SYNC_INTERVAL)
+        self.in_match = False  # ping đồng bộ đồng hồ chỉ gửi giữa begin_match() và end_match()
+        self._selector = None
+        self.dropped_snapshots = 0
+        self._reattach_pending = False  # luồng nhận reset trạng thái trận trước datagram kế tiếp
+        self.reattached = 0
 
     def initialize(self):
+        if self.core:
+            try:
+                self._match = self.core.call(self.core.open_match(self), timeout=5.0)
+                return True
+            except Exception as e:
+                print(f"Không thể khởi tạo client: {e}")
+                return False
         try:
             self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
             self.client_socket.setblocking(False)
+            self._selector = selectors.DefaultSelector()
+            self._selector.register(self.client_socket, selectors.EVENT_READ)
             print("Client khởi tạo")
             return True
         except Exception as e:
@@ -65,123 +181,311 @@ class TestUDPClient:
 
     def start(self):
         self.running = True
+        if self.core:
+            return None
         recv_thread = threading.Thread(target=self.receive_thread, daemon=True)
         recv_thread.start()
         return recv_thread
 
     def stop(self):
         self.running = False
+        if self._match:
+            match, self._match = self._match, None
+            if self.core.on_loop_thread():
+                self.core.loop.create_task(match.close())
+            else:
+                try:
+                    self.core.call(match.close(), timeout=2.0)
+                except Exception as e:
+                    print(f"Không đóng được kênh UDP: {e!r}")
+            self._transport = None
+        if self._selector:
+            self._selector.close()
+            self._selector = None
         if self.client_socket:
             self.client_socket.close()
         print("Client dừng")
 
+    def reattach(self, match_id=None):
+        """Gắn lại kênh trận sau khi kết nối lobby được khôi phục.
+
+        Luồng nhận bỏ trạng thái của phiên cũ (tick, baseline delta,
+        fragment, đồng bộ đồng hồ) trước datagram kế tiếp; gửi input ngay
+        để server biết lại địa chỉ của client nếu nó đã đổi.
+        """
+        if match_id is not None and self.match_id is not None:
+            self.match_id = match_id
+        self._reattach_pending = True
+        self.reattached += 1
+        self.flush()
+
+    def begin_match(self):
+        """Trận bắt đầu: bật ping đồng bộ đồng hồ (chỉ protocol 2)"""
+        if self.in_match:
+            return
+        self.clock_sync.reset()
+        self.in_match = True
+        if self._match and Config.UDP_PROTOCOL_VERSION >= 2:
+            self.core.loop.call_soon_threadsafe(self._match.start_clock_sync)
+
+    def end_match(self):
+        """Trận kết thúc: tắt ping đồng bộ đồng hồ, giữa hai trận không gửi gì tới server trận"""
+        if not self.in_match:
+            return
+        self.in_match = False
+        if self._match:
+            self.core.loop.call_soon_threadsafe(self._match.stop_clock_sync)
+
+    def _reset_match_state(self):
+        self._reattach_pending = False
+        self.ticks.reset()
+        self.decoder.reset()
+        self.fragments.reset()
+        self.clock_sync.reset()
+
     def send_thread(self,left=False,right=False,up=False,down=False,action=Action.NONE,action_direction=1,target_x=-1,target_y=-1):
-        if left:
-            left=1
-        else:
-            left=0
-        if right:
-            right=1
-        else:
-            right=0
-        if up:
-            up=1
-        else:
-            up=0
-        if down:
-            down=1
+        """Ghi nhận input rồi gửi ngay; trả về sequence của input (None với protocol 1)"""
+        sequence = self.queue_input(left, right, up, down, action, action_direction, target_x, target_y)
+        self.flush()
+        return sequence
+
+    def queue_input(self,left=False,right=False,up=False,down=False,action=Action.NONE,action_direction=1,target_x=-1,target_y=-1):
+        """Ghi nhận input của frame hiện tại, chưa gửi.
+
+        Protocol 2: mỗi lần gọi là một lệnh di chuyển có sequence riêng, được
+        đưa vào InputHistory; trả về sequence đó (None với protocol 1).
+        """
+        sequence = None
+        with self._send_lock:
+            if Config.UDP_PROTOCOL_VERSION >= 2:
+                self.input_sequence = (self.input_sequence + 1) & 0xFFFFFFFF
+                sequence = self.input_sequence
+                self.payload.sequence = sequence
+            self.payload.move.left=int(bool(left))
+            self.payload.move.right=int(bool(right))
+            self.payload.move.up=int(bool(up))
+            self.payload.move.down=int(bool(down))
+
+            self.payload.action=action
+            self.payload.action_direction=action_direction
+            self.payload.target_x=target_x
+            self.payload.target_y=target_y
+
+            if sequence is not None:
+                self.input_history.acknowledge(self.acked_input)
+                self.input_history.push(sequence, self.payload)
+            self.scheduler.active = True
+        return sequence
+
+    def input_changed(self):
+        """Input vừa thay đổi: gửi ngay, không chờ keepalive"""
+        self.scheduler.sent_on_change += 1
+        self.flush()
+        self.scheduler.restart_ticks(time.monotonic())
+
+    def send_held_input(self,left=False,right=False,up=False,down=False,target_x=-1,target_y=-1,now=None):
+        """Input không đổi: mỗi tick mô phỏng đến hạn gửi một lệnh trong một datagram.
+
+        Không giữ phím di chuyển thì không gửi gì, keepalive do luồng nhận lo.
+        Trả về danh sách sequence đã gửi (None với protocol 1).
+        """
+        if not (left or right or up or down):
+            self.scheduler.stop_ticks()
+            return []
+        now = time.monotonic() if now is None else now
+        sequences = []
+        for _ in range(self.scheduler.ticks_due(now)):
+            sequences.append(self.queue_input(left, right, up, down, Action.NONE, 1, target_x, target_y))
+            self.flush()
+        return sequences
+
+    def flush(self):
+        """Gửi một datagram input với trạng thái hiện tại"""
+        with self._send_lock:
+            try:
+                if TestUDPClient.id>-1:
+                    player_id = Config.PLAYERID if self.player_id is None else self.player_id
+                    match_id = Config.MATCHID if self.match_id is None else self.match_id
+                    if Config.UDP_PROTOCOL_VERSION >= 2:
+                        msg_type = MSG_INPUT_SEQ
+                        body = SNAPSHOT_ACK.pack(self.decoder.latest_tick) + self.input_history.to_bytes()
+                        if self.viewport is not None:
+                            body += VIEWPORT.pack(*self.viewport)
+                    else:
+                        msg_type = MSG_INPUT
+                        body = self.payload.to_bytes()
+                    buffer = struct.pack('!III', player_id, msg_type, match_id) + body
+                    self._sendto(buffer)
+                    TestUDPClient.id += 1
+            except Exception as e:
+                print(f"Lỗi gửi dữ liệu: {e}")
+            # Action.SHOOT chỉ gửi một lần, keepalive sau đó không bắn lại
+            self.payload.action = Action.NONE
+            self.scheduler.mark_sent(time.monotonic())
+
+    def send_time_sync(self):
+        """Gửi một ping đồng bộ đồng hồ (chỉ protocol 2, server cũ không hiểu)"""
+        with self._send_lock:
+            player_id = Config.PLAYERID if self.player_id is None else self.player_id
+            match_id = Config.MATCHID if self.match_id is None else self.match_id
+            body = self.clock_sync.request(self.clock())
+            try:
+                self._sendto(struct.pack('!III', player_id, MSG_TIME_SYNC, match_id) + body)
+            except Exception as e:
+                if self.running:
+                    print(f"Lỗi gửi dữ liệu: {e}")
+
+    def _clock_sync_active(self):
+        return self.in_match and Config.UDP_PROTOCOL_VERSION >= 2
+
+    def _time_sync_due(self, now):
+        return self._clock_sync_active() and self.clock_sync.is_due(now)
+
+    def _sendto(self, buffer):
+        self.stats.record_out(len(buffer))
+        if self.recorder:
+            self.recorder.record(UDP_OUT, buffer)
+        if self._transport:
+            if self.core.on_loop_thread():
+                self._send_on_loop(buffer)
+            else:
+                # Transport asyncio không thread-safe: chuyển lệnh gửi về event loop
+                self.core.loop.call_soon_threadsafe(self._send_on_loop, buffer)
         else:
-            down=0
-        msg_type = 1  # Join message
-        self.payload.move.left=left
-        self.payload.move.right=right
-        self.payload.move.up=up
-        self.payload.move.down=down
-
-        self.payload.action=action
-        self.payload.action_direction=action_direction
-        self.payload.target_x=target_x
-        self.payload.target_y=target_y
-
-        try:
-            if TestUDPClient.id>-1:
-                player_id = Config.PLAYERID
-                timestamp = int(time.time() * 1000) & 0xFFFFFFFF  # uint32 ms timestamp
-                match_id = Config.MATCHID
-                buffer = struct.pack('!III', player_id, msg_type, match_id) + self.payload.to_bytes()
-                self.client_socket.sendto(buffer, (self.server_ip, self.server_port))
-                #print(f"Gửi tin nhắn tới server, player_id: {player_id}, msg_type: {msg_type}, timestamp: {match_id}, payload: {self.payload}")
-                TestUDPClient.id += 1
-        except Exception as e:
-            print(f"Lỗi gửi dữ liệu: {e}")
+            self.client_socket.sendto(buffer, (self.server_ip, self.server_port))
 
+    def _send_on_loop(self, buffer):
+        # Lệnh gửi đã xếp hàng có thể chạy sau khi kênh đã đóng
+        transport = self._transport
+        if transport is not None and not transport.is_closing():
+            transport.sendto(buffer, (self.server_ip, self.server_port))
 
     def receive_thread(self):
+        """Chờ socket sẵn sàng rồi xử lý snapshot mới nhất; gửi keepalive input khi tới hạn"""
         while self.running:
             try:
-                data, addr = self.client_socket.recvfrom(self.BUFFER_SIZE)
-
-                offset = 0
-                if len(data) < 8:
-                    print(f"[WARN] Dữ liệu quá ngắn")
-                    continue
-                
-                match_id = struct.unpack_from("!i", data, offset)[0]
-                offset += 4
-
-                player_count = struct.unpack_from("!i", data, offset)[0]
-                offset += 4
-
-                print(f"[RECV] Match ID: {match_id}, Players: {player_count}")
-
-                players = {}
-                for _ in range(player_count):
-                    id = struct.unpack_from("!i", data, offset)[0]
-                    offset += 4
-                    x = struct.unpack_from("!f", data, offset)[0]
-                    offset += 4
-                    y = struct.unpack_from("!f", data, offset)[0]
-                    offset += 4
-                    health = struct.unpack_from("!i", data, offset)[0]
-                    offset += 4
-
-                    players[id] = {
-                        "x": x,
-                        "y": y,
-                        "health": health,
-                        "new": True
-                    }
-
-                bullet_count = struct.unpack_from("!i", data, offset)[0]
-                offset += 4
-
-                bullets = []
-                for _ in range(bullet_count):
-                    x = struct.unpack_from("!f", data, offset)[0]
-                    offset += 4
-                    y = struct.unpack_from("!f", data, offset)[0]
-                    offset += 4
-                    bullets.append((x, y))
-
-                # In ra thông tin (hoặc cập nhật self.game_state)
-                print("[GAME STATE]")
-                for pid, p in players.items():
-                    print(f" - Player {pid}: x={p['x']:.2f}, y={p['y']:.2f}, hp={p['health']}")
-
-                print(f" - Bullets ({len(bullets)}):")
-                for b in bullets:
-                    print(f"    • Bullet at x={b[0]:.2f}, y={b[1]:.2f}")
-
-                with self.lock:
-                    self.game_state["match_id"] = match_id
-                    self.game_state["players"] = players
-                    self.game_state["bullets"] = bullets
-                
-            except BlockingIOError:
-                pass
+                timeout = self.RECV_TIMEOUT
+                now = time.monotonic()
+                wait = self.scheduler.time_until_due(now)
+                if wait is not None:
+                    timeout = min(timeout, wait)
+                if self._clock_sync_active():
+                    timeout = min(timeout, self.clock_sync.time_until_due(now))
+                if self._selector.select(timeout):
+                    data = self._drain_socket()
+                    if data is not None:
+                        self._process_snapshot(data)
+                now = time.monotonic()
+                if self.scheduler.is_due(now):
+                    self.scheduler.sent_keepalive += 1
+                    self.flush()
+                if self._time_sync_due(now):
+                    self.send_time_sync()
             except Exception as e:
-                print(f"[ERROR] {e}")
-            time.sleep(0.02)
+                if self.running:
+                    print(f"[ERROR] {e}")
+
+    def _drain_socket(self):
+        """Đọc hết các datagram đang chờ, chỉ giữ lại snapshot mới nhất.
+
+        Với protocol 2 "mới nhất" theo tick server chứ không theo thứ tự đến:
+        datagram đến trễ hoặc trùng bị bỏ và được đếm trong self.ticks.
+        Snapshot chia nhiều fragment được ghép lại trước khi so tick.
+        Trả về snapshot giữ lại (view vào self._recv_buffer hoặc bytes đã ghép),
+        None nếu không có.
+        """
+        if self._reattach_pending:
+            self._reset_match_state()
+        latest = None
+        received = 0
+        while True:
+            try:
+                size, addr = self.client_socket.recvfrom_into(self._spare_buffer)
+            except BlockingIOError:
+                break
+            except ConnectionResetError:
+                # Windows báo ICMP port unreachable bằng lỗi này, bỏ qua
+                continue
+            self.stats.record_in(size)
+            data = memoryview(self._spare_buffer)[:size]
+            if self.recorder:
+                self.recorder.record(UDP_IN, data)
+            if size == self.BUFFER_SIZE:
+                self.truncated_snapshots += 1
+                continue
+            if is_time_sync_reply(data):
+                self._on_time_sync(data)
+                continue
+            if is_fragment(data):
+                data = self._add_fragment(data)
+                if data is not None:
+                    latest = data
+                    received += 1
+                continue
+            ack_input, tick, baseline, offset, server_time = read_header(data)
+            if ack_input is not None and not self.ticks.accept(tick):
+                continue
+            self._recv_buffer, self._spare_buffer = self._spare_buffer, self._recv_buffer
+            latest = memoryview(self._recv_buffer)[:size]
+            received += 1
+        if received > 1:
+            self.dropped_snapshots += received - 1
+        return latest
+
+    def _add_fragment(self, data):
+        """Ghép fragment; trả về snapshot đầy đủ khi đủ mảnh và tick còn mới, ngược lại None"""
+        tick = FRAGMENT_HEADER.unpack_from(data, 0)[1]
+        if self.ticks.is_stale(tick):
+            return None
+        complete = self.fragments.add(data, self.clock())
+        if complete is None:
+            return None
+        tick, snapshot = complete
+        if not self.ticks.accept(tick):
+            return None
+        return snapshot
+
+    def _on_datagram(self, data):
+        """Một datagram từ MatchProtocol (đường asyncio)"""
+        if self._reattach_pending:
+            self._reset_match_state()
+        self.stats.record_in(len(data))
+        if self.recorder:
+            self.recorder.record(UDP_IN, data)
+        if is_time_sync_reply(data):
+            self._on_time_sync(data)
+            return
+        if is_fragment(data):
+            data = self._add_fragment(data)
+            if data is not None:
+                self._process_snapshot(data)
+            return
+        ack_input, tick, baseline, offset, server_time = read_header(data)
+        if ack_input is not None and not self.ticks.accept(tick):
+            return
+        self._process_snapshot(data)
+
+    def _on_time_sync(self, data):
+        if self.clock_sync.handle_reply(data, self.clock()):
+            self.stats.record_rtt(self.clock_sync.rtt)
+
+    def _process_snapshot(self, data):
+        try:
+            snapshot = self.decoder.decode(data)
+        except SnapshotError as e:
+            print(f"[WARN] Snapshot lỗi: {e}")
+            return
+
+        if snapshot.ack_input is not None:
+            self.acked_input = snapshot.ack_input
+        now = self.clock()
+        self.stats.record_arrival(now)
+        self.handoff.publish(snapshot, now)
+
+    @property
+    def snapshot(self):
+        """Snapshot mới nhất (None nếu chưa nhận được)"""
+        return self.handoff.latest.snapshot
 
 
 # test=TestUDPClient()
@@ -0,0 +1,431 @@
+"""
+Decode/encode UDP world snapshots sent by the match server
+"""
+import struct
+import sys
+from array import array
+from collections import OrderedDict, deque
+from typing import NamedTuple
+
+# Layout (network byte order):
+#   match_id(i) player_count(i) [id(i) x(f) y(f) health(i)]*player_count
+#   bullet_count(i) [x(f) y(f)]*bullet_count
+#
+# Protocol 2 prefixes the body with magic(I) ack_input(I) tick(I) baseline(I) server_time(d):
+#   ack_input    last input sequence the server applied for this client
+#   tick         server tick of this snapshot
+#   baseline     tick the body is a delta against, 0 for a full body
+#   server_time  server clock (seconds) when the tick was simulated, see clock_sync
+# and its bullet records carry a stable id: [id(i) x(f) y(f)]*bullet_count
+# (protocol 1 bullets get their index as id).
+#
+# Delta body:
+#   match_id(i)
+#   changed(H) [id(i) mask(B) x(f)? y(f)? health(i)?]   mask bits: 1=x 2=y 4=health
+#   removed(H) [id(i)]
+#   bullet_changed(H) [id(i) x(f) y(f)]
+#   bullet_removed(H) [id(i)]
+# Players and bullets that are not listed keep their baseline value.
+SNAPSHOT_MAGIC = 0x5A534E32  # 'ZSN2'
+EXT_HEADER = struct.Struct('!IIIId')
+HEADER = struct.Struct('!ii')
+COUNT = struct.Struct('!i')
+PLAYER_RECORD = struct.Struct('!iffi')
+BULLET_RECORD = struct.Struct('!ff')
+BULLET_ID_RECORD = struct.Struct('!iff')
+
+DELTA_COUNT = struct.Struct('!H')
+DELTA_PLAYER = struct.Struct('!iB')
+ID = struct.Struct('!i')
+FLOAT = struct.Struct('!f')
+INT = struct.Struct('!i')
+
+MASK_X = 1
+MASK_Y = 2
+MASK_HEALTH = 4
+
+_SWAP = sys.byteorder == 'little'
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def serial_ahead(a, b):
+    """How far 32-bit serial number a is ahead of b; negative when a is older (wraps at 2**32)"""
+    ahead = (a - b) & 0xFFFFFFFF
+    return ahead - 0x100000000 if ahead >= 0x80000000 else ahead
+
+
+class Snapshot(NamedTuple):
+    """One decoded snapshot; a NamedTuple because building it is on the per-datagram path"""
+
+    match_id: int
+    player_ids: array
+    player_x: array
+    player_y: array
+    player_health: array
+    bullet_ids: array
+    bullet_x: array
+    bullet_y: array
+    ack_input: int = None  # None với snapshot protocol 1
+    tick: int = 0
+    server_time: float = 0.0  # 0.0 với snapshot protocol 1
+
+    @property
+    def player_count(self):
+        return len(self.player_ids)
+
+    @property
+    def bullet_count(self):
+        return len(self.bullet_x)
+
+    def players(self):
+        """Iterate (id, x, y, health) tuples"""
+        return zip(self.player_ids, self.player_x, self.player_y, self.player_health)
+
+    def bullets(self):
+        """Iterate (id, x, y) tuples"""
+        return zip(self.bullet_ids, self.bullet_x, self.bullet_y)
+
+
+def _read_block(typecode, data, offset, nbytes):
+    """Copy a big-endian block straight from the datagram into a native array"""
+    block = array(typecode)
+    block.frombytes(data[offset:offset + nbytes])
+    if _SWAP:
+        block.byteswap()
+    return block
+
+
+def read_header(data):
+    """Return (ack_input, tick, baseline, body_offset, server_time); ack_input is None for protocol 1"""
+    if len(data) >= EXT_HEADER.size:
+        magic, ack_input, tick, baseline, server_time = EXT_HEADER.unpack_from(data, 0)
+        if magic == SNAPSHOT_MAGIC:
+            return ack_input, tick, baseline, EXT_HEADER.size, server_time
+    return None, 0, 0, 0, 0.0
+
+
+def decode_snapshot(data):
+    """Decode one full snapshot datagram (bytes, bytearray or memoryview)"""
+    ack_input, tick, baseline, offset, server_time = read_header(data)
+    if baseline:
+        raise SnapshotError(f"tick {tick} is a delta against {baseline}")
+    return _decode_full(data, offset, ack_input, tick, server_time)
+
+
+def _decode_full(data, offset, ack_input, tick, server_time=0.0):
+    size = len(data)
+    if size < offset + HEADER.size + COUNT.size:
+        raise SnapshotError(f"snapshot too short ({size} bytes)")
+
+    match_id, player_count = HEADER.unpack_from(data, offset)
+    offset += HEADER.size
+    players_size = player_count * PLAYER_RECORD.size
+    if player_count < 0 or offset + players_size + COUNT.size > size:
+        raise SnapshotError(f"bad player count {player_count}")
+
+    if player_count:
+        # Một lần iter_unpack cho cả khối player, zip(*) tách thành từng cột
+        ids, xs, ys, healths = zip(*PLAYER_RECORD.iter_unpack(data[offset:offset + players_size]))
+        player_ids, player_x, player_y = array('i', ids), array('f', xs), array('f', ys)
+        player_health = array('i', healths)
+    else:
+        player_ids, player_x, player_y, player_health = array('i'), array('f'), array('f'), array('i')
+    offset += players_size
+
+    bullet_count = COUNT.unpack_from(data, offset)[0]
+    offset += COUNT.size
+    record = BULLET_RECORD if ack_input is None else BULLET_ID_RECORD
+    bullets_size = bullet_count * record.size
+    if bullet_count < 0 or offset + bullets_size > size:
+        raise SnapshotError(f"bad bullet count {bullet_count}")
+    if not bullet_count:
+        bullet_ids, bullet_x, bullet_y = array('i'), array('f'), array('f')
+    elif ack_input is None:
+        coords = _read_block('f', data, offset, bullets_size)
+        bullet_ids = _index_ids(bullet_count)
+        bullet_x, bullet_y = coords[0::2], coords[1::2]
+    else:
+        # Bullet có thể lên tới hàng nghìn: đọc cả khối vào array nhanh hơn iter_unpack
+        coords = _read_block('f', data, offset, bullets_size)
+        bullet_ids = _read_block('i', data, offset, bullets_size)[0::3]
+        bullet_x, bullet_y = coords[1::3], coords[2::3]
+
+    return Snapshot(
+        match_id=match_id,
+        player_ids=player_ids,
+        player_x=player_x,
+        player_y=player_y,
+        player_health=player_health,
+        bullet_ids=bullet_ids,
+        bullet_x=bullet_x,
+        bullet_y=bullet_y,
+        ack_input=ack_input,
+        tick=tick,
+        server_time=server_time,
+    )
+
+
+_INDEX_IDS = array('i')
+
+
+def _index_ids(count):
+    """0..count-1 as an array, sliced from a cached one (protocol 1 bullet ids)"""
+    global _INDEX_IDS
+    if len(_INDEX_IDS) < count:
+        _INDEX_IDS = array('i', range(max(count, 2 * len(_INDEX_IDS))))
+    return _INDEX_IDS[:count]
+
+
+def _decode_delta(data, offset, base, ack_input, tick, server_time):
+    """Rebuild a full Snapshot from base plus the delta body at offset"""
+    try:
+        match_id = INT.unpack_from(data, offset)[0]
+        offset += INT.size
+
+        players = OrderedDict((pid, [x, y, health]) for pid, x, y, health in base.players())
+        changed = DELTA_COUNT.unpack_from(data, offset)[0]
+        offset += DELTA_COUNT.size
+        for _ in range(changed):
+            pid, mask = DELTA_PLAYER.unpack_from(data, offset)
+            offset += DELTA_PLAYER.size
+            player = players.get(pid)
+            if player is None:
+                player = players[pid] = [0.0, 0.0, 0]
+            if mask & MASK_X:
+                player[0] = FLOAT.unpack_from(data, offset)[0]
+                offset += FLOAT.size
+            if mask & MASK_Y:
+                player[1] = FLOAT.unpack_from(data, offset)[0]
+                offset += FLOAT.size
+            if mask & MASK_HEALTH:
+                player[2] = INT.unpack_from(data, offset)[0]
+                offset += INT.size
+
+        removed = DELTA_COUNT.unpack_from(data, offset)[0]
+        offset += DELTA_COUNT.size
+        for _ in range(removed):
+            players.pop(ID.unpack_from(data, offset)[0], None)
+            offset += ID.size
+
+        bullets = OrderedDict((bid, (x, y)) for bid, x, y in base.bullets())
+        changed = DELTA_COUNT.unpack_from(data, offset)[0]
+        offset += DELTA_COUNT.size
+        end = offset + changed * BULLET_ID_RECORD.size
+        if end > len(data):
+            raise SnapshotError("truncated bullet delta")
+        for bid, x, y in BULLET_ID_RECORD.iter_unpack(data[offset:end]):
+            bullets[bid] = (x, y)
+        offset = end
+
+        removed = DELTA_COUNT.unpack_from(data, offset)[0]
+        offset += DELTA_COUNT.size
+        for _ in range(removed):
+            bullets.pop(ID.unpack_from(data, offset)[0], None)
+            offset += ID.size
+    except struct.error as e:
+        raise SnapshotError(f"truncated delta: {e}") from None
+
+    return Snapshot(
+        match_id=match_id,
+        player_ids=array('i', players.keys()),
+        player_x=array('f', (p[0] for p in players.values())),
+        player_y=array('f', (p[1] for p in players.values())),
+        player_health=array('i', (p[2] for p in players.values())),
+        bullet_ids=array('i', bullets.keys()),
+        bullet_x=array('f', (b[0] for b in bullets.values())),
+        bullet_y=array('f', (b[1] for b in bullets.values())),
+        ack_input=ack_input,
+        tick=tick,
+        server_time=server_time,
+    )
+
+
+class SnapshotDecoder:
+    """Decoder that keeps recent full snapshots as delta baselines.
+
+    The client acknowledges latest_tick to the server, which may encode a
+    later snapshot against that or an older acknowledged tick, so a few
+    baselines are kept.
+    """
+
+    def __init__(self, history=32):
+        self.history = history
+        self._baselines = OrderedDict()  # tick -> Snapshot
+        self.latest_tick = 0
+        self.missing_baseline = 0
+
+    def decode(self, data):
+        ack_input, tick, baseline, offset, server_time = read_header(data)
+        if not baseline:
+            snapshot = _decode_full(data, offset, ack_input, tick, server_time)
+        else:
+            base = self._baselines.get(baseline)
+            if base is None:
+                self.missing_baseline += 1
+                raise SnapshotError(f"missing baseline {baseline} for tick {tick}")
+            snapshot = _decode_delta(data, offset, base, ack_input, tick, server_time)
+
+        if ack_input is not None:
+            self._remember(snapshot)
+        return snapshot
+
+    def _remember(self, snapshot):
+        self._baselines[snapshot.tick] = snapshot
+        while len(self._baselines) > self.history:
+            self._baselines.popitem(last=False)
+        # Tick 0 không bao giờ được server dùng: latest_tick == 0 là chưa có snapshot
+        if not self.latest_tick or serial_ahead(snapshot.tick, self.latest_tick) > 0:
+            self.latest_tick = snapshot.tick
+
+    def reset(self):
+        self._baselines.clear()
+        self.latest_tick = 0
+
+
+class TickFilter:
+    """Rejects stale and duplicate protocol 2 snapshots by server tick.
+
+    Keeps running counters: gaps counts ticks skipped over when a newer
+    tick arrives, reordered counts late arrivals older than the newest
+    tick, duplicates counts ticks already seen. lost is the part of the
+    gaps that never showed up later.
+    """
+
+    def __init__(self, window=64):
+        self.latest = None
+        self._seen = deque(maxlen=window)
+        self.received = 0
+        self.accepted = 0
+        self.duplicates = 0
+        self.reordered = 0
+        self.gaps = 0
+
+    def accept(self, tick):
+        """True if tick is newer than every tick accepted so far"""
+        self.received += 1
+        if tick in self._seen:
+            self.duplicates += 1
+            return False
+        self._seen.append(tick)
+        if self.latest is not None:
+            ahead = serial_ahead(tick, self.latest)
+            if ahead < 0:
+                self.reordered += 1
+                return False
+            self.gaps += ahead - 1
+        self.latest = tick
+        self.accepted += 1
+        return True
+
+    def is_stale(self, tick):
+        """True if tick is not newer than the newest accepted tick (no counters touched)"""
+        if self.latest is None:
+            return False
+        return serial_ahead(tick, self.latest) <= 0
+
+    @property
+    def lost(self):
+        return max(self.gaps - self.reordered, 0)
+
+    def stats(self):
+        return {
+            'received': self.received,
+            'accepted': self.accepted,
+            'duplicates': self.duplicates,
+            'reordered': self.reordered,
+            'gaps': self.gaps,
+            'lost': self.lost,
+        }
+
+    def reset(self):
+        self.__init__(self._seen.maxlen)
+
+
+class Published(NamedTuple):
+    version: int
+    received_at: float
+    snapshot: Snapshot
+
+
+class SnapshotHandoff:
+    """Hands the newest snapshot from the network thread to the game loop.
+
+    publish() rebinds latest to a new immutable Published tuple, which is
+    atomic under the GIL, so neither side takes a lock or waits for the
+    other. The game loop compares latest.version with the version it last
+    rendered.
+    """
+
+    def __init__(self):
+        self.latest = Published(0, 0.0, None)
+
+    def publish(self, snapshot, received_at):
+        self.latest = Published(self.latest.version + 1, received_at, snapshot)
+
+
+def encode_snapshot(match_id, players, bullets, ack_input=None, tick=0, server_time=0.0):
+    """Encode a full snapshot; players are (id, x, y, health), bullets are (id, x, y).
+
+    Passing ack_input produces a protocol 2 snapshot. Protocol 1 has no
+    bullet ids, so they are dropped.
+    """
+    parts = []
+    if ack_input is not None:
+        parts.append(EXT_HEADER.pack(SNAPSHOT_MAGIC, ack_input, tick, 0, server_time))
+    parts.append(HEADER.pack(match_id, len(players)))
+    parts.extend(PLAYER_RECORD.pack(*player) for player in players)
+    parts.append(COUNT.pack(len(bullets)))
+    if ack_input is None:
+        parts.extend(BULLET_RECORD.pack(x, y) for bid, x, y in bullets)
+    else:
+        parts.extend(BULLET_ID_RECORD.pack(*bullet) for bullet in bullets)
+    return b''.join(parts)
+
+
+def encode_delta(match_id, base, players, bullets, ack_input, tick, server_time=0.0):
+    """Encode players/bullets as a protocol 2 delta against the Snapshot base"""
+    parts = [EXT_HEADER.pack(SNAPSHOT_MAGIC, ack_input, tick, base.tick, server_time), INT.pack(match_id)]
+
+    # So sánh trên float32 để khớp với giá trị client giữ trong baseline
+    before = {pid: (x, y, health) for pid, x, y, health in base.players()}
+    changed = []
+    for pid, x, y, health in players:
+        x, y = _f32(x), _f32(y)
+        old = before.pop(pid, None)
+        mask = MASK_X | MASK_Y | MASK_HEALTH
+        if old is not None:
+            mask = ((MASK_X if old[0] != x else 0) | (MASK_Y if old[1] != y else 0)
+                    | (MASK_HEALTH if old[2] != health else 0))
+            if not mask:
+                continue
+        record = [DELTA_PLAYER.pack(pid, mask)]
+        if mask & MASK_X:
+            record.append(FLOAT.pack(x))
+        if mask & MASK_Y:
+            record.append(FLOAT.pack(y))
+        if mask & MASK_HEALTH:
+            record.append(INT.pack(health))
+        changed.append(b''.join(record))
+    parts.append(DELTA_COUNT.pack(len(changed)))
+    parts.extend(changed)
+    parts.append(DELTA_COUNT.pack(len(before)))
+    parts.extend(ID.pack(pid) for pid in before)
+
+    before = {bid: (x, y) for bid, x, y in base.bullets()}
+    bullet_changes = []
+    for bid, x, y in bullets:
+        x, y = _f32(x), _f32(y)
+        if before.pop(bid, None) != (x, y):
+            bullet_changes.append(BULLET_ID_RECORD.pack(bid, x, y))
+    parts.append(DELTA_COUNT.pack(len(bullet_changes)))
+    parts.extend(bullet_changes)
+    parts.append(DELTA_COUNT.pack(len(before)))
+    parts.extend(ID.pack(bid) for bid in before)
+    return b''.join(parts)
+
+
+def _f32(value):
+    return FLOAT.unpack(FLOAT.pack(value))[0]
@@ -3,11 +3,20 @@ import struct
 import threading
 import time
 import json
+import heapq
+from concurrent.futures import Future
 from enum import IntEnum
 from dataclasses import dataclass
 from typing import Optional, List, Dict, Callable
 import logging
 from .config import Config
+from .net_stats import ChannelStats
+from .net_recorder import TCP_IN, TCP_OUT
+from .lobby_codec import Schema, ListOf, STR, U8, U32
+from .heartbeat import HeartbeatMonitor, MIN_WAIT
+from .lobby_events import (
+    EventBridge, StateChanged, Authenticated, AuthFailed, RoomsListed, RoomUpdated, MatchStarted,
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -21,6 +30,8 @@ class MessageType(IntEnum):
     REGISTER_RESPONSE = 1004
     LOGOUT_REQUEST = 1005
     LOGOUT_RESPONSE = 1006
+    RESUME_SESSION_REQUEST = 1007
+    RESUME_SESSION_RESPONSE = 1008
     
     # Room Management
     CREATE_ROOM_REQUEST = 2001
@@ -84,6 +95,124 @@ class ProtocolMessage:
         
         return cls(length=length, type=msg_type, sequence=sequence, payload=payload)
 
+    def detached(self) -> 'ProtocolMessage':
+        """Copy whose payload no longer points into a MessageFramer buffer"""
+        if isinstance(self.payload, bytes):
+            return self
+        return ProtocolMessage(self.length, self.type, self.sequence, bytes(self.payload))
+
+
+class MessageFramer:
+    """Splits the lobby TCP stream into length-prefixed frames without copying.
+
+    Received bytes go straight into one growable bytearray (recv_into /
+    writable + commit) and frames() yields memoryview slices of it, so
+    the ProtocolMessage objects from messages() have a payload view, not
+    a copy. Consumed bytes are reclaimed by moving the unfinished tail to
+    the front, which only ever copies less than one message. A frame view
+    is valid until the next receive: handlers that keep a message past
+    that must use ProtocolMessage.detached().
+    """
+
+    HEADER = struct.Struct('!IHH')  # length, type, sequence
+
+    def __init__(self, initial_size: int = 65536, max_message: int = 64 * 1024 * 1024):
+        self.max_message = max_message
+        self._buffer = bytearray(initial_size)
+        self._view = memoryview(self._buffer)
+        self._start = 0  # byte đầu tiên chưa xử lý
+        self._end = 0    # hết dữ liệu đã nhận
+        self._need = self.HEADER.size  # số byte cần có từ _start cho frame kế tiếp
+        self.frames_total = 0
+        self.bytes_total = 0
+
+    @property
+    def pending(self) -> int:
+        return self._end - self._start
+
+    def writable(self, min_size: int = 4096) -> memoryview:
+        """Free space after the received data, at least min_size bytes"""
+        want = max(min_size, self._need - self.pending)
+        if len(self._buffer) - self._end < want:
+            self._make_room(want)
+        return self._view[self._end:]
+
+    def commit(self, n: int):
+        self._end += n
+        self.bytes_total += n
+
+    def recv_from(self, sock: socket.socket) -> int:
+        """recv_into the buffer; returns the byte count (0 = peer closed)"""
+        n = sock.recv_into(self.writable())
+        self.commit(n)
+        return n
+
+    def feed(self, data):
+        n = len(data)
+        self.writable(n)[:n] = data
+        self.commit(n)
+
+    def frames(self):
+        """Yield every complete frame received so far as a memoryview"""
+        view = self._view
+        unpack_from = self.HEADER.unpack_from
+        while self._end - self._start >= self.HEADER.size:
+            start = self._start
+            length = unpack_from(view, start)[0]
+            if length < self.HEADER.size or length > self.max_message:
+                raise ValueError(f"invalid message length {length}")
+            if self._end - start < length:
+                self._need = length
+                return
+            self._start = start + length
+            self.frames_total += 1
+            yield view[start:start + length]
+        self._need = self.HEADER.size
+        if self._start == self._end:
+            self._start = self._end = 0
+
+    def messages(self):
+        """Yield every complete frame received so far as a ProtocolMessage.
+
+        Same framing as frames(), but the header unpacked here is reused
+        and the payload is the only slice taken, which is what matters on
+        streams of many small messages.
+        """
+        view = self._view
+        unpack_from = self.HEADER.unpack_from
+        header_size = self.HEADER.size
+        while self._end - self._start >= header_size:
+            start = self._start
+            length, msg_type, sequence = unpack_from(view, start)
+            if length < header_size or length > self.max_message:
+                raise ValueError(f"invalid message length {length}")
+            if self._end - start < length:
+                self._need = length
+                return
+            self._start = start + length
+            self.frames_total += 1
+            yield ProtocolMessage(length, msg_type, sequence, view[start + header_size:start + length])
+        self._need = header_size
+        if self._start == self._end:
+            self._start = self._end = 0
+
+    def _make_room(self, want: int):
+        pending = self.pending
+        if self._start and pending + want <= len(self._buffer):
+            # Dời phần chưa xử lý (ít hơn một message) về đầu buffer
+            self._buffer[:pending] = self._view[self._start:self._end]
+        else:
+            size = len(self._buffer)
+            while size < pending + want:
+                size *= 2
+            # Frame view cũ vẫn giữ buffer cũ, không cấp phát lại tại chỗ được
+            buffer = bytearray(size)
+            buffer[:pending] = self._view[self._start:self._end]
+            self._buffer = buffer
+            self._view = memoryview(buffer)
+        self._start = 0
+        self._end = pending
+
 @dataclass
 class Room:
     room_id: int
@@ -98,30 +227,181 @@ class Room:
         if self.players is None:
             self.players = []
 
+# Payload layout của từng MessageType; các message không có ở đây có payload rỗng
+ROOM_ENTRY = Schema(('room_id', U32), ('room_name', STR), ('current_players', U32),
+                    ('max_players', U32), ('state', U8), factory=Room)
+ROOM_PLAYER = Schema(('player_id', U32), ('username', STR))
+CREDENTIALS = Schema(('username', STR), ('password', STR))
+# detail: thông báo lỗi khi thất bại; khi thành công là session token để resume (nếu server cấp)
+AUTH_RESPONSE = Schema(('success', U8), ('user_id', U32), optional=(('detail', STR),))
+ROOM_RESPONSE = Schema(('success', U8), ('room_id', U32))
+SUCCESS_RESPONSE = Schema(('success', U8))
+ROOM_ID = Schema(('room_id', U32))
+
+LOBBY_SCHEMAS = {
+    MessageType.LOGIN_REQUEST: CREDENTIALS,
+    MessageType.LOGIN_RESPONSE: AUTH_RESPONSE,
+    MessageType.REGISTER_REQUEST: CREDENTIALS,
+    MessageType.REGISTER_RESPONSE: AUTH_RESPONSE,
+    MessageType.RESUME_SESSION_REQUEST: Schema(('user_id', U32), ('session_token', STR)),
+    MessageType.RESUME_SESSION_RESPONSE: AUTH_RESPONSE,
+    MessageType.CREATE_ROOM_REQUEST: Schema(('room_name', STR), ('max_players', U32)),
+    MessageType.CREATE_ROOM_RESPONSE: ROOM_RESPONSE,
+    MessageType.JOIN_ROOM_REQUEST: ROOM_ID,
+    MessageType.JOIN_ROOM_RESPONSE: ROOM_RESPONSE,
+    MessageType.LEAVE_ROOM_RESPONSE: SUCCESS_RESPONSE,
+    MessageType.LIST_ROOMS_RESPONSE: Schema(('rooms', ListOf(ROOM_ENTRY))),
+    MessageType.ROOM_STATE_UPDATE: Schema(('room_id', U32), ('room_name', STR), ('current_players', U32),
+                                          ('max_players', U32), ('owner_id', U32), ('state', U8),
+                                          ('players', ListOf(ROOM_PLAYER))),
+    # Client gửi START_GAME_REQUEST rỗng; server đẩy cùng type kèm room_id + match_id khi trận bắt đầu
+    MessageType.START_GAME_REQUEST: Schema(('room_id', U32), ('match_id', U32)),
+    MessageType.START_GAME_RESPONSE: SUCCESS_RESPONSE,
+    MessageType.GAME_READY_RESPONSE: SUCCESS_RESPONSE,
+    MessageType.ERROR_RESPONSE: Schema(('message', STR)),
+}
+
+def build_credentials_payload(username: str, password: str) -> bytes:
+    """username_len(4) + username + password_len(4) + password"""
+    return CREDENTIALS.encode(username, password)
+
+def build_create_room_payload(room_name: str, max_players: int) -> bytes:
+    """room_name_len(4) + room_name + max_players(4)"""
+    return LOBBY_SCHEMAS[MessageType.CREATE_ROOM_REQUEST].encode(room_name, max_players)
+
+def build_room_id_payload(room_id: int) -> bytes:
+    """room_id(4)"""
+    return ROOM_ID.encode(room_id)
+
+def response_succeeded(response: Optional[ProtocolMessage]) -> bool:
+    """Byte đầu của payload phản hồi là cờ thành công"""
+    return bool(response and len(response.payload) >= 1 and response.payload[0] == 1)
+
+def _chain(future: Future, transform: Callable) -> Future:
+    """Future of transform(result) once future completes"""
+    chained = Future()
+    def done(source):
+        try:
+            chained.set_result(transform(source.result()))
+        except Exception as e:
+            chained.set_exception(e)
+    future.add_done_callback(done)
+    return chained
+
+class PendingRequests:
+    """In-flight requests of the threaded client, keyed by sequence.
+
+    A request's Future is registered before its bytes are written, so a
+    response can never arrive ahead of its waiter. Timeouts come from one
+    deadline heap served by a single timer thread; an expired request
+    resolves to None, like the network core's requests.
+    """
+
+    def __init__(self):
+        self._futures: Dict[int, Future] = {}
+        self._deadlines = []  # heap (deadline, sequence, future); future đã xong thì bỏ qua
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self.timeouts = 0
+
+    def __len__(self):
+        return len(self._futures)
+
+    def register(self, sequence: int, timeout: float) -> Future:
+        future = Future()
+        with self._cond:
+            self._futures[sequence] = future
+            heapq.heappush(self._deadlines, (time.monotonic() + timeout, sequence, future))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._expire_loop, daemon=True)
+                self._thread.start()
+            elif self._deadlines[0][2] is future:
+                self._cond.notify()
+        return future
+
+    def resolve(self, msg: ProtocolMessage) -> bool:
+        with self._cond:
+            future = self._futures.pop(msg.sequence, None)
+        if future is None or future.done():
+            return False
+        # Người chờ đọc response sau lần recv kế tiếp nên phải copy payload
+        future.set_result(msg.detached())
+        return True
+
+    def discard(self, sequence: int):
+        with self._cond:
+            self._futures.pop(sequence, None)
+
+    def cancel_all(self):
+        """Resolve every pending request to None (connection lost)"""
+        with self._cond:
+            futures = list(self._futures.values())
+            self._futures.clear()
+            self._deadlines.clear()
+        for future in futures:
+            if not future.done():
+                future.set_result(None)
+
+    def _expire_loop(self):
+        while True:
+            expired = []
+            with self._cond:
+                now = time.monotonic()
+                while self._deadlines and (self._deadlines[0][2].done() or self._deadlines[0][0] <= now):
+                    deadline, sequence, future = heapq.heappop(self._deadlines)
+                    if not future.done() and self._futures.get(sequence) is future:
+                        del self._futures[sequence]
+                        expired.append((sequence, future))
+                if not expired:
+                    self._cond.wait(self._deadlines[0][0] - now if self._deadlines else None)
+                    continue
+            for sequence, future in expired:
+                self.timeouts += 1
+                logger.warning(f"Timeout waiting for response to sequence {sequence}")
+                future.set_result(None)
+
 class GameClient:
-    def __init__(self, host: str = Config.SERVER_IP, tcp_port: int = Config.SERVER_PORT_TCP):
+    def __init__(self, host: str = Config.SERVER_IP, tcp_port: int = Config.SERVER_PORT_TCP, core=None):
         self.host = host
         self.tcp_port = tcp_port
         
         # Network components
         self.tcp_socket: Optional[socket.socket] = None
+        # Khi có core (net_core.NetworkCore), kết nối chạy trên event loop chung thay vì 2 thread riêng
+        self.core = core
+        self.lobby = None
+        
+        # Handler chạy trên luồng mạng chỉ post event; luồng chính drain() mỗi frame
+        self.events = EventBridge(Config.LOBBY_EVENT_QUEUE_SIZE)
         
         # State
-        self.state = ConnectionState.DISCONNECTED
+        self._state = ConnectionState.DISCONNECTED
         self.user_id = 0
         self.username = ""
         self.current_room_id = 0
+        self.match_id = 0
         self.sequence_counter = 1
+        # Dùng để đăng nhập lại sau khi mất kết nối (reconnect.ReconnectSupervisor)
+        self.session_token: Optional[str] = None
+        self._credentials = None
+        self.supervisor = None
+        
+        # Statistics
+        self.stats = ChannelStats('tcp')
+        self.heartbeat = HeartbeatMonitor(Config.HEARTBEAT_INTERVAL, Config.HEARTBEAT_MIN_INTERVAL,
+                                          Config.HEARTBEAT_TIMEOUT, Config.HEARTBEAT_MAX_MISSED)
+        self.recorder = None  # net_recorder.TrafficRecorder khi bật ghi traffic
         
         # Threading
         self.running = False
         self.tcp_receive_thread: Optional[threading.Thread] = None
         self.heartbeat_thread: Optional[threading.Thread] = None
+        self._heartbeat_wake = threading.Event()  # disconnect() đánh thức luồng heartbeat ngay
         
         # Message handling
         self.message_handlers: Dict[int, Callable] = {}
-        self.pending_responses: Dict[int, threading.Event] = {}
-        self.response_data: Dict[int, ProtocolMessage] = {}
+        self.pending = PendingRequests()
+        self._send_lock = threading.Lock()
         
         # Data storage
         self.rooms: List[Room] = []
@@ -129,12 +409,24 @@ class GameClient:
         
         self._setup_message_handlers()
     
+    @property
+    def state(self) -> ConnectionState:
+        return self._state
+    
+    @state.setter
+    def state(self, state: ConnectionState):
+        previous = self._state
+        self._state = state
+        if state != previous:
+            self.events.post(StateChanged(state, previous))
+    
     def _setup_message_handlers(self):
         """Setup message type handlers"""
         self.message_handlers = {
             MessageType.LOGIN_RESPONSE: self._handle_login_response,
             MessageType.REGISTER_RESPONSE: self._handle_register_response,
             MessageType.LOGOUT_RESPONSE: self._handle_logout_response,
+            MessageType.RESUME_SESSION_RESPONSE: self._handle_resume_session_response,
             MessageType.CREATE_ROOM_RESPONSE: self._handle_create_room_response,
             MessageType.JOIN_ROOM_RESPONSE: self._handle_join_room_response,
             MessageType.LEAVE_ROOM_RESPONSE: self._handle_leave_room_response,
@@ -149,6 +441,8 @@ class GameClient:
     
     def connect(self) -> bool:
         """Connect to the game server"""
+        if self.core:
+            return self._connect_on_core()
         try:
             # Create TCP socket
             self.tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -157,13 +451,16 @@ class GameClient:
             
             self.state = ConnectionState.CONNECTED
             self.running = True
+            self.heartbeat.reset()
             
             # Start receive thread
             self.tcp_receive_thread = threading.Thread(target=self._tcp_receive_loop, daemon=True)
             self.tcp_receive_thread.start()
             
             # Start heartbeat thread
-            self.heartbeat_thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
+            self._heartbeat_wake = threading.Event()
+            self.heartbeat_thread = threading.Thread(target=self._heartbeat_loop,
+                                                     args=(self.tcp_socket, self._heartbeat_wake), daemon=True)
             self.heartbeat_thread.start()
             
             logger.info(f"Connected to server at {self.host}:{self.tcp_port}")
@@ -175,10 +472,29 @@ class GameClient:
             self.disconnect()
             return False
     
+    def _connect_on_core(self) -> bool:
+        """Connect through the shared asyncio NetworkCore"""
+        try:
+            self.heartbeat.reset()
+            self.lobby = self.core.call(self.core.open_lobby(self), timeout=10.0)
+            self.state = ConnectionState.CONNECTED
+            self.running = True
+            logger.info(f"Connected to server at {self.host}:{self.tcp_port} (network core)")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to connect: {e}")
+            self.disconnect()
+            return False
+    
     def disconnect(self):
         """Disconnect from server"""
         self.running = False
         self.state = ConnectionState.DISCONNECTED
+        self._heartbeat_wake.set()
+        
+        if self.lobby:
+            self.core.loop.call_soon_threadsafe(self.lobby.close)
+            self.lobby = None
         
         if self.tcp_socket:
             try:
@@ -186,6 +502,7 @@ class GameClient:
             except:
                 pass
             self.tcp_socket = None
+        self.pending.cancel_all()
         
         logger.info("Disconnected from server")
     
@@ -197,83 +514,96 @@ class GameClient:
     
     def _send_message(self, msg_type: MessageType, payload: bytes = b'') -> int:
         """Send a message and return sequence number"""
-        if not self.tcp_socket or self.state == ConnectionState.DISCONNECTED:
-            raise ConnectionError("Not connected to server")
-        
-        sequence = self._get_next_sequence()
-        msg = ProtocolMessage(type=msg_type, sequence=sequence, payload=payload)
-        
+        if self.lobby:
+            return self.core.call(self.lobby.send(msg_type, payload))
+        return self._write_message(msg_type, payload)[0]
+    
+    def request(self, msg_type: MessageType, payload: bytes = b'', timeout: float = 10.0) -> Future:
+        """Send a request without blocking; the Future gives the response, or None on timeout
+        or when the message could not be sent.
+        
+        Several requests can be in flight at once (login, list_rooms and
+        join_room back to back): the server answers in order and every
+        response carries the sequence of its request.
+        """
+        if self.lobby:
+            return self.core.submit(self.lobby.request(msg_type, payload, timeout))
         try:
-            data = msg.serialize()
-            self.tcp_socket.sendall(data)
-            return sequence
+            return self._write_message(msg_type, payload, timeout)[1]
         except Exception as e:
-            logger.error(f"Failed to send message: {e}")
-            raise
+            # Như LobbyConnection.request: lỗi gửi cũng trả về None
+            logger.error(f"Request {msg_type} not sent: {e}")
+            future = Future()
+            future.set_result(None)
+            return future
     
-    def _send_message_and_wait(self, msg_type: MessageType, payload: bytes = b'', timeout: float = 10.0) -> Optional[ProtocolMessage]:
-        """Send message and wait for response"""
-        sequence = self._send_message(msg_type, payload)
+    def _write_message(self, msg_type: MessageType, payload: bytes, timeout: Optional[float] = None,
+                       before_send: Optional[Callable[[int], None]] = None):
+        """Write one message; with a timeout its response future is registered first.
         
-        # Create event for this sequence
-        event = threading.Event()
-        self.pending_responses[sequence] = event
+        before_send(sequence) runs under the send lock, before any byte is written.
+        """
+        if not self.tcp_socket or self.state == ConnectionState.DISCONNECTED:
+            raise ConnectionError("Not connected to server")
         
-        try:
-            if event.wait(timeout):
-                return self.response_data.pop(sequence, None)
-            else:
-                logger.warning(f"Timeout waiting for response to sequence {sequence}")
-                return None
-        finally:
-            self.pending_responses.pop(sequence, None)
+        # Luồng chính và luồng heartbeat cùng gửi: sequence và sendall phải đi cùng nhau
+        with self._send_lock:
+            sequence = self._get_next_sequence()
+            future = self.pending.register(sequence, timeout) if timeout is not None else None
+            if before_send:
+                before_send(sequence)
+            data = ProtocolMessage(type=msg_type, sequence=sequence, payload=payload).serialize()
+            try:
+                self.tcp_socket.sendall(data)
+            except Exception as e:
+                logger.error(f"Failed to send message: {e}")
+                if future:
+                    self.pending.discard(sequence)
+                raise
+        self.stats.record_out(len(data))
+        if self.recorder:
+            self.recorder.record(TCP_OUT, data)
+        return sequence, future
     
     def _tcp_receive_loop(self):
         """TCP receive loop"""
-        buffer = b''
+        framer = MessageFramer()
+        sock = self.tcp_socket
         
-        while self.running:
+        # Sau reconnect self.tcp_socket là socket mới: luồng của socket cũ thoát lặng lẽ
+        while self.running and self.tcp_socket is sock:
             try:
-                data = self.tcp_socket.recv(8192)
-                if not data:
+                if not framer.recv_from(sock):
                     logger.warning("Server closed connection")
                     break
                 
-                buffer += data
-                
-                # Process complete messages
-                while len(buffer) >= 8:
-                    # Read message length
-                    msg_length = struct.unpack('!I', buffer[:4])[0]
-                    
-                    if len(buffer) < msg_length:
-                        break  # Wait for more data
-                    
-                    # Extract complete message
-                    msg_data = buffer[:msg_length]
-                    buffer = buffer[msg_length:]
-                    
-                    # Parse message
-                    msg = ProtocolMessage.deserialize(msg_data)
-                    if msg:
-                        self._handle_message(msg)
+                # Process complete messages; payload là view vào buffer của framer
+                for msg in framer.messages():
+                    if self.recorder:
+                        self.recorder.record(TCP_IN, msg.serialize())
+                    self.stats.record_in(msg.length)
+                    self._handle_message(msg)
                 
             except socket.timeout:
                 continue
             except Exception as e:
-                if self.running:
+                if self.running and self.tcp_socket is sock:
                     logger.error(f"TCP receive error: {e}")
                 break
         
+        # running đã False khi disconnect() chủ động đóng socket
+        if self.running and self.tcp_socket is sock:
+            self._connection_lost()
+    
+    def _connection_lost(self):
+        """The server or the network dropped the connection; hand over to the supervisor"""
+        state = self.state
         self.disconnect()
+        if self.supervisor:
+            self.supervisor.reconnect(state)
     
     def _handle_message(self, msg: ProtocolMessage):
         """Handle received message"""
-        # Check if this is a response to a pending request
-        if msg.sequence in self.pending_responses:
-            self.response_data[msg.sequence] = msg
-            self.pending_responses[msg.sequence].set()
-        
         # Handle message by type
         handler = self.message_handlers.get(msg.type)
         if handler:
@@ -283,98 +613,125 @@ class GameClient:
                 logger.error(f"Error handling message type {msg.type}: {e}")
         else:
             logger.warning(f"No handler for message type {msg.type}")
+        
+        # Handler chạy trước để state của client đã cập nhật khi request trả về
+        self.pending.resolve(msg)
     
-    def _heartbeat_loop(self):
-        """Send heartbeat messages"""
-        while self.running:
+    def _heartbeat_loop(self, sock, wake: threading.Event):
+        """Send heartbeat messages when HeartbeatMonitor says so; declare the peer dead after too many misses"""
+        # Sau reconnect luồng của socket cũ tự dừng
+        while self.running and self.tcp_socket is sock:
             try:
+                now = time.monotonic()
                 if self.state in [ConnectionState.CONNECTED, ConnectionState.AUTHENTICATED, 
-                                ConnectionState.IN_ROOM, ConnectionState.IN_GAME]:
-                    self._send_message(MessageType.HEARTBEAT)
-                time.sleep(15)  # Send heartbeat every 15 seconds
+                                ConnectionState.IN_ROOM, ConnectionState.IN_GAME] and self.heartbeat.poll(now):
+                    self._send_heartbeat(now)
+                elif self.heartbeat.dead:
+                    logger.warning(f"No heartbeat reply for {self.heartbeat.missed} attempts, connection is dead")
+                    self._connection_lost()
+                    break
+                # disconnect() set wake: thoát ngay, không chờ hết chu kỳ
+                # Probe vừa quá hạn thì time_until_due là 0: thử lại ngay, không chờ hết interval
+                if wake.wait(max(self.heartbeat.time_until_due(time.monotonic()), MIN_WAIT)):
+                    break
             except Exception as e:
                 if self.running:
                     logger.error(f"Heartbeat error: {e}")
                 break
     
+    def _send_heartbeat(self, now: float):
+        """Send a timestamped heartbeat, registered before it is written so the echo can't beat it"""
+        self._write_message(MessageType.HEARTBEAT, self.heartbeat.payload(now),
+                            before_send=lambda sequence: self.heartbeat.on_sent(sequence, now))
+        
+    def _record_heartbeat_echo(self, sequence: int, payload=b''):
+        rtt = self.heartbeat.on_echo(sequence, payload, time.monotonic())
+        if rtt is not None:
+            self.stats.record_rtt(rtt)
+    
     # Message handlers
+    def _decode(self, msg: ProtocolMessage):
+        """Decode msg.payload with its LOBBY_SCHEMAS entry; None if it is malformed"""
+        try:
+            return LOBBY_SCHEMAS[msg.type].decode(msg.payload)
+        except ValueError as e:
+            logger.error(f"Malformed {MessageType(msg.type).name} payload: {e}")
+            return None
+
     def _handle_login_response(self, msg: ProtocolMessage):
         """Handle login response"""
-        if len(msg.payload) < 5:
+        reply = self._decode(msg)
+        if reply is None:
             return
         
-        success = msg.payload[0] == 1
-        user_id = struct.unpack('!I', msg.payload[1:5])[0]
-        
-        if success:
-            self.user_id = user_id
-            Config.PLAYERID=user_id
+        if reply.success == 1:
+            self.user_id = reply.user_id
+            self.session_token = reply.detail
             self.state = ConnectionState.AUTHENTICATED
-            logger.info(f"Login successful, user ID: {user_id}")
-        else:
-            # Extract error message
-            if len(msg.payload) > 9:
-                msg_len = struct.unpack('!I', msg.payload[5:9])[0]
-                error_msg = msg.payload[9:9+msg_len].decode('utf-8', errors='ignore')
-                logger.error(f"Login failed: {error_msg}")
+            logger.info(f"Login successful, user ID: {reply.user_id}")
+        elif reply.detail is not None:
+            logger.error(f"Login failed: {reply.detail}")
     
     def _handle_register_response(self, msg: ProtocolMessage):
         """Handle register response"""
-        if len(msg.payload) < 5:
+        reply = self._decode(msg)
+        if reply is None:
             return
         
-        success = msg.payload[0] == 1
-        user_id = struct.unpack('!I', msg.payload[1:5])[0]
+        if reply.success == 1:
+            self.user_id = reply.user_id
+            self.session_token = reply.detail
+            self.state = ConnectionState.AUTHENTICATED
+            logger.info(f"Registration successful, user ID: {reply.user_id}")
+        elif reply.detail is not None:
+            logger.error(f"Registration failed: {reply.detail}")
+    
+    def _handle_resume_session_response(self, msg: ProtocolMessage):
+        """Handle resume session response"""
+        reply = self._decode(msg)
+        if reply is None:
+            return
         
-        if success:
-            self.user_id = user_id
+        if reply.success == 1:
+            self.user_id = reply.user_id
+            if reply.detail is not None:
+                self.session_token = reply.detail
             self.state = ConnectionState.AUTHENTICATED
-            logger.info(f"Registration successful, user ID: {user_id}")
+            logger.info(f"Session resumed, user ID: {reply.user_id}")
         else:
-            if len(msg.payload) > 9:
-                msg_len = struct.unpack('!I', msg.payload[5:9])[0]
-                error_msg = msg.payload[9:9+msg_len].decode('utf-8', errors='ignore')
-                logger.error(f"Registration failed: {error_msg}")
+            # Token hết hạn: lần sau đăng nhập lại bằng credentials
+            self.session_token = None
+            logger.warning(f"Session resume rejected: {reply.detail}")
     
     def _handle_logout_response(self, msg: ProtocolMessage):
         """Handle logout response"""
         self.state = ConnectionState.CONNECTED
         self.user_id = 0
         self.username = ""
+        self.session_token = None
+        self._credentials = None
         self.current_room_id = 0
         logger.info("Logged out successfully")
     
     def _handle_create_room_response(self, msg: ProtocolMessage):
         """Handle create room response"""
-        if len(msg.payload) < 5:
-            return
-        
-        success = msg.payload[0] == 1
-        room_id = struct.unpack('!I', msg.payload[1:5])[0]
-        
-        if success:
-            self.current_room_id = room_id
+        reply = self._decode(msg)
+        if reply and reply.success == 1:
+            self.current_room_id = reply.room_id
             self.state = ConnectionState.IN_ROOM
-            logger.info(f"Room created successfully, room ID: {room_id}")
+            logger.info(f"Room created successfully, room ID: {reply.room_id}")
     
     def _handle_join_room_response(self, msg: ProtocolMessage):
         """Handle join room response"""
-        if len(msg.payload) < 5:
-            return
-        
-        success = msg.payload[0] == 1
-        room_id = struct.unpack('!I', msg.payload[1:5])[0]
-        
-        if success:
-            self.current_room_id = room_id
+        reply = self._decode(msg)
+        if reply and reply.success == 1:
+            self.current_room_id = reply.room_id
             self.state = ConnectionState.IN_ROOM
-            logger.info(f"Joined room successfully, room ID: {room_id}")
+            logger.info(f"Joined room successfully, room ID: {reply.room_id}")
     
     def _handle_leave_room_response(self, msg: ProtocolMessage):
         """Handle leave room response"""
-        success = msg.payload[0] == 1 if msg.payload else False
-        
-        if success:
+        if response_succeeded(msg):
             self.current_room_id = 0
             self.current_room = None
             self.state = ConnectionState.AUTHENTICATED
@@ -382,294 +739,188 @@ class GameClient:
     
     def _handle_list_rooms_response(self, msg: ProtocolMessage):
         """Handle list rooms response"""
-        if len(msg.payload) < 4:
+        reply = self._decode(msg)
+        if reply is None:
             return
         
-        self.rooms.clear()
-        ptr = 0
-        
-        # Read room count
-        room_count = struct.unpack('!I', msg.payload[ptr:ptr+4])[0]
-        ptr += 4
-        
-        # Read room data
-        for _ in range(room_count):
-            if ptr + 4 > len(msg.payload):
-                break
-            
-            # Room ID
-            room_id = struct.unpack('!I', msg.payload[ptr:ptr+4])[0]
-            ptr += 4
-            
-            # Room name
-            if ptr + 4 > len(msg.payload):
-                break
-            name_len = struct.unpack('!I', msg.payload[ptr:ptr+4])[0]
-            ptr += 4
-            
-            if ptr + name_len > len(msg.payload):
-                break
-            room_name = msg.payload[ptr:ptr+name_len].decode('utf-8', errors='ignore')
-            ptr += name_len
-            
-            # Player counts and state
-            if ptr + 9 > len(msg.payload):
-                break
-            current_players = struct.unpack('!I', msg.payload[ptr:ptr+4])[0]
-            ptr += 4
-            max_players = struct.unpack('!I', msg.payload[ptr:ptr+4])[0]
-            ptr += 4
-            state = msg.payload[ptr]
-            ptr += 1
-            
-            room = Room(room_id, room_name, current_players, max_players, state)
-            self.rooms.append(room)
-        
+        # ROOM_ENTRY giải mã thẳng ra Room
+        self.rooms[:] = reply.rooms
+        self.events.post(RoomsListed(reply.rooms))
         logger.info(f"Received {len(self.rooms)} rooms")
     
     def _handle_start_game_response(self, msg: ProtocolMessage):
         """Handle start game response"""
-        success = msg.payload[0] == 1 if msg.payload else False
-        if success:
+        if response_succeeded(msg):
             logger.info("Game started successfully")
 
     def _handle_start_game_request(self, msg: ProtocolMessage):#after owner send start game request
         """Handle start game request"""
-        if len(msg.payload) < 4:
-            return
-        ptr=0
-        room_id = struct.unpack('!I', msg.payload[ptr:ptr+4])[0]
-        ptr+=4
-        
-        if room_id != self.current_room_id:
+        request = self._decode(msg)
+        if request is None or request.room_id != self.current_room_id:
             return
-        
-        match_id=struct.unpack('!I', msg.payload[ptr:ptr+4])[0]
-        ptr+=4
 
-        Config.MATCHID = match_id
+        self.match_id = request.match_id
+        # Config.MATCHID được đặt trên luồng chính khi xử lý MatchStarted
+        self.events.post(MatchStarted(request.room_id, request.match_id))
         
         self.state = ConnectionState.IN_GAME
-        print("Match started with match id: ",match_id)
+        print("Match started with match id: ",request.match_id)
         logger.info("Match started successfully")
     
     def _handle_game_ready_response(self, msg: ProtocolMessage):
         """Handle game ready response"""
-        success = msg.payload[0] == 1 if msg.payload else False
-        if success:
+        if response_succeeded(msg):
             self.state = ConnectionState.IN_GAME
             logger.info("Ready for game")
     
     def _handle_room_state_update(self, msg: ProtocolMessage):
         """Handle room state update"""
-        if len(msg.payload) < 4:
-            return
-        
-        ptr = 0
-        
-        # Room ID
-        room_id = struct.unpack('!I', msg.payload[ptr:ptr+4])[0]
-        ptr += 4
-        
-        # Room name
-        if ptr + 4 > len(msg.payload):
+        update = self._decode(msg)
+        if update is None:
             return
-        name_len = struct.unpack('!I', msg.payload[ptr:ptr+4])[0]
-        ptr += 4
-        
-        if ptr + name_len > len(msg.payload):
-            return
-        room_name = msg.payload[ptr:ptr+name_len].decode('utf-8', errors='ignore')
-        ptr += name_len
-        
-        # Player counts and state
-        if ptr + 13 > len(msg.payload):
-            return
-        current_players = struct.unpack('!I', msg.payload[ptr:ptr+4])[0]
-        ptr += 4
-        max_players = struct.unpack('!I', msg.payload[ptr:ptr+4])[0]
-        ptr += 4
-        owner_id = struct.unpack('!I', msg.payload[ptr:ptr+4])[0]
-        ptr += 4
-        state = msg.payload[ptr]
-        ptr += 1
-        
-        # Player list
-        player_count = struct.unpack('!I', msg.payload[ptr:ptr+4])[0]
-        ptr += 4
-        
-        players = []
-        for _ in range(player_count):
-            if ptr + 8 > len(msg.payload):
-                break
-            
-            player_id = struct.unpack('!I', msg.payload[ptr:ptr+4])[0]
-            ptr += 4
-            
-            username_len = struct.unpack('!I', msg.payload[ptr:ptr+4])[0]
-            ptr += 4
-            
-            if ptr + username_len > len(msg.payload):
-                break
-            
-            username = msg.payload[ptr:ptr+username_len].decode('utf-8', errors='ignore')
-            ptr += username_len
-            
-            players.append(username)
         
         # Update current room if it's the same
-        if room_id == self.current_room_id:
-            print("Update room",room_id)
-            self.current_room = Room(room_id, room_name, current_players, max_players, state, players,owner_id)
-            logger.info(f"Room {room_name} updated: {current_players}/{max_players} players, owner_id: {owner_id}")
+        if update.room_id == self.current_room_id:
+            print("Update room",update.room_id)
+            players = [player.username for player in update.players]
+            self.current_room = Room(update.room_id, update.room_name, update.current_players,
+                                     update.max_players, update.state, players, update.owner_id)
+            self.events.post(RoomUpdated(self.current_room))
+            logger.info(f"Room {update.room_name} updated: {update.current_players}/{update.max_players} players, owner_id: {update.owner_id}")
             logger.info(f"Players: {', '.join(players)}")
     
     def _handle_heartbeat(self, msg: ProtocolMessage):
         """Handle heartbeat response"""
-        pass  # Just acknowledge
+        self._record_heartbeat_echo(msg.sequence, msg.payload)
     
     def _handle_error_response(self, msg: ProtocolMessage):
         """Handle error response"""
-        if len(msg.payload) >= 4:
-            msg_len = struct.unpack('!I', msg.payload[:4])[0]
-            if len(msg.payload) >= 4 + msg_len:
-                error_msg = msg.payload[4:4+msg_len].decode('utf-8', errors='ignore')
-                logger.error(f"Server error: {error_msg}")
+        error = self._decode(msg)
+        if error is not None:
+            logger.error(f"Server error: {error.message}")
     
     # Public API methods
-    def login(self, username: str, password: str, timeout: float = 10.0) -> bool:
+    # wait=False trả về Future của cùng kết quả thay vì chặn, để gửi liên tiếp
+    # nhiều request (vd. login, list_rooms, join_room) mà không chờ từng round
+    # trip. Khi đó bỏ qua kiểm tra state phía client: server xử lý theo thứ tự.
+    def _finish(self, future: Future, transform: Callable, wait: bool):
+        future = _chain(future, transform)
+        return future.result() if wait else future
+
+    def login(self, username: str, password: str, timeout: float = 10.0, wait: bool = True):
         """Login to server"""
-        if self.state != ConnectionState.CONNECTED:
+        if wait and self.state != ConnectionState.CONNECTED:
             logger.error("Not connected to server")
             return False
         
-        # Build payload: username_len(4) + username + password_len(4) + password
-        username_bytes = username.encode('utf-8')
-        password_bytes = password.encode('utf-8')
-        
-        payload = struct.pack('!I', len(username_bytes)) + username_bytes
-        payload += struct.pack('!I', len(password_bytes)) + password_bytes
-        
-        response = self._send_message_and_wait(MessageType.LOGIN_REQUEST, payload, timeout)
-        if response and len(response.payload) >= 1:
-            success = response.payload[0] == 1
-            if success:
-                self.username = username
-                self.state = ConnectionState.AUTHENTICATED
-            return success
-        
+        payload = build_credentials_payload(username, password)
+        future = self.request(MessageType.LOGIN_REQUEST, payload, timeout)
+        return self._finish(future, lambda response: self._finish_auth(response, username, password), wait)
+    
+    def _finish_auth(self, response: Optional[ProtocolMessage], username: str, password: Optional[str] = None) -> bool:
+        """Apply a login/register response"""
+        success = response_succeeded(response)
+        if success:
+            self.username = username
+            if password is not None:
+                # Chỉ giữ trong bộ nhớ, để đăng nhập lại khi server không cấp session token
+                self._credentials = (username, password)
+            self.state = ConnectionState.AUTHENTICATED
+            self.events.post(Authenticated(self.user_id, username))
+        else:
+            self.events.post(AuthFailed(username))
+        return success
+    
+    def resume_session(self, timeout: float = 10.0) -> bool:
+        """Authenticate a new connection as the previous session's user.
+        
+        Uses the session token from the login response when the server
+        issued one, otherwise (or if the server rejects it) logs in again
+        with the credentials of the last successful login.
+        """
+        if self.session_token and self.user_id:
+            payload = LOBBY_SCHEMAS[MessageType.RESUME_SESSION_REQUEST].encode(self.user_id, self.session_token)
+            response = self.request(MessageType.RESUME_SESSION_REQUEST, payload, timeout).result()
+            if response_succeeded(response):
+                return self._finish_auth(response, self.username)
+        if self._credentials:
+            return self.login(*self._credentials, timeout=timeout)
         return False
     
-    def register(self, username: str, password: str, timeout: float = 10.0) -> bool:
+    def register(self, username: str, password: str, timeout: float = 10.0, wait: bool = True):
         """Register new user"""
-        if self.state != ConnectionState.CONNECTED:
+        if wait and self.state != ConnectionState.CONNECTED:
             logger.error("Not connected to server")
             return False
         
-        username_bytes = username.encode('utf-8')
-        password_bytes = password.encode('utf-8')
-        
-        payload = struct.pack('!I', len(username_bytes)) + username_bytes
-        payload += struct.pack('!I', len(password_bytes)) + password_bytes
-        
-        response = self._send_message_and_wait(MessageType.REGISTER_REQUEST, payload, timeout)
-        if response and len(response.payload) >= 1:
-            success = response.payload[0] == 1
-            if success:
-                self.username = username
-                self.state = ConnectionState.AUTHENTICATED
-            return success
-        
-        return False
+        payload = build_credentials_payload(username, password)
+        future = self.request(MessageType.REGISTER_REQUEST, payload, timeout)
+        return self._finish(future, lambda response: self._finish_auth(response, username, password), wait)
     
-    def logout(self, timeout: float = 5.0) -> bool:
+    def logout(self, timeout: float = 5.0, wait: bool = True):
         """Logout from server"""
-        if self.state not in [ConnectionState.AUTHENTICATED, ConnectionState.IN_ROOM]:
+        if wait and self.state not in [ConnectionState.AUTHENTICATED, ConnectionState.IN_ROOM]:
             return False
         
-        response = self._send_message_and_wait(MessageType.LOGOUT_REQUEST, b'', timeout)
-        if response and len(response.payload) >= 1:
-            return response.payload[0] == 1
-        
-        return False
+        future = self.request(MessageType.LOGOUT_REQUEST, b'', timeout)
+        return self._finish(future, response_succeeded, wait)
     
-    def create_room(self, room_name: str, max_players: int = 4, timeout: float = 10.0) -> bool:
+    def create_room(self, room_name: str, max_players: int = 4, timeout: float = 10.0, wait: bool = True):
         """Create a new room"""
-        if self.state != ConnectionState.AUTHENTICATED:
+        if wait and self.state != ConnectionState.AUTHENTICATED:
             logger.error("Must be authenticated to create room")
             return False
         
-        room_name_bytes = room_name.encode('utf-8')
-        payload = struct.pack('!I', len(room_name_bytes)) + room_name_bytes
-        payload += struct.pack('!I', max_players)
-        
-        response = self._send_message_and_wait(MessageType.CREATE_ROOM_REQUEST, payload, timeout)
-        if response and len(response.payload) >= 1:
-            return response.payload[0] == 1
-        
-        return False
+        payload = build_create_room_payload(room_name, max_players)
+        future = self.request(MessageType.CREATE_ROOM_REQUEST, payload, timeout)
+        return self._finish(future, response_succeeded, wait)
     
-    def join_room(self, room_id: int, timeout: float = 10.0) -> bool:
+    def join_room(self, room_id: int, timeout: float = 10.0, wait: bool = True):
         """Join an existing room"""
-        if self.state != ConnectionState.AUTHENTICATED:
+        if wait and self.state != ConnectionState.AUTHENTICATED:
             logger.error("Must be authenticated to join room")
             return False
         
-        payload = struct.pack('!I', room_id)
-        
-        response = self._send_message_and_wait(MessageType.JOIN_ROOM_REQUEST, payload, timeout)
-        if response and len(response.payload) >= 1:
-            return response.payload[0] == 1
-        
-        return False
+        payload = build_room_id_payload(room_id)
+        future = self.request(MessageType.JOIN_ROOM_REQUEST, payload, timeout)
+        return self._finish(future, response_succeeded, wait)
     
-    def leave_room(self, timeout: float = 5.0) -> bool:
+    def leave_room(self, timeout: float = 5.0, wait: bool = True):
         """Leave current room"""
-        if self.state != ConnectionState.IN_ROOM:
+        if wait and self.state != ConnectionState.IN_ROOM:
             return False
         
-        response = self._send_message_and_wait(MessageType.LEAVE_ROOM_REQUEST, b'', timeout)
-        if response and len(response.payload) >= 1:
-            return response.payload[0] == 1
-        
-        return False
+        future = self.request(MessageType.LEAVE_ROOM_REQUEST, b'', timeout)
+        return self._finish(future, response_succeeded, wait)
     
-    def list_rooms(self, timeout: float = 10.0) -> List[Room]:
+    def list_rooms(self, timeout: float = 10.0, wait: bool = True):
         """Get list of available rooms"""
         # if self.state != ConnectionState.AUTHENTICATED:
         #     logger.error("Must be authenticated to list rooms")
         #     return []
         
-        response = self._send_message_and_wait(MessageType.LIST_ROOMS_REQUEST, b'', timeout)
-        if response:
-            # Rooms are parsed in the handler and stored in self.rooms
-            return self.rooms.copy()
-        return []
+        future = self.request(MessageType.LIST_ROOMS_REQUEST, b'', timeout)
+        # Rooms are parsed in the handler and stored in self.rooms
+        return self._finish(future, lambda response: self.rooms.copy() if response else [], wait)
     
-    def start_game(self, timeout: float = 10.0) -> bool:
+    def start_game(self, timeout: float = 10.0, wait: bool = True):
         """Start game (room owner only)"""
-        if self.state != ConnectionState.IN_ROOM:
+        if wait and self.state != ConnectionState.IN_ROOM:
             print("start game state",self.state.name)
             logger.error("Must be in room to start game")
             return False
         
-        response = self._send_message_and_wait(MessageType.START_GAME_REQUEST, b'', timeout)
-        if response and len(response.payload) >= 1:
-            return response.payload[0] == 1
-        
-        return False
+        future = self.request(MessageType.START_GAME_REQUEST, b'', timeout)
+        return self._finish(future, response_succeeded, wait)
     
-    def game_ready(self, timeout: float = 5.0) -> bool:
+    def game_ready(self, timeout: float = 5.0, wait: bool = True):
         """Mark as ready for game"""
-        if self.state != ConnectionState.IN_ROOM:
+        if wait and self.state != ConnectionState.IN_ROOM:
             logger.error("Must be in room to mark ready")
             return False
         
-        response = self._send_message_and_wait(MessageType.GAME_READY_REQUEST, b'', timeout)
-        if response and len(response.payload) >= 1:
-            return response.payload[0] == 1
-        
-        return False
+        future = self.request(MessageType.GAME_READY_REQUEST, b'', timeout)
+        return self._finish(future, response_succeeded, wait)
     
     # def send_udp_packet(self, data: bytes) -> bool:
     #     """Send UDP packet for real-time game data"""
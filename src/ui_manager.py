@@ -2,7 +2,6 @@
 UI management for menus, HUD and buttons
 """
 import pygame
-import sys
 from .config import Config
 from .button import Button
 from .game_state import GameState
@@ -10,8 +9,13 @@ from .TextInputBox import TextInputBox
 from .tcp_connect import ConnectionState
 from .tcp_connect import Room
 from .tcp_connect import GameClient
+from .lobby_events import (
+    StateChanged, Authenticated, AuthFailed, RoomsListed, RoomUpdated, MatchStarted,
+    Reconnecting, Reconnected, ReconnectFailed,
+)
+from .reconnect import ReconnectSupervisor
 class UIManager:
-    def __init__(self, screen):
+    def __init__(self, screen, network=None, connect=True):
         self.screen = screen
         self.game_state= GameState()
         self._load_assets()
@@ -20,6 +24,7 @@ class UIManager:
         self.password_box = TextInputBox(450, 320, 300, 40, self.font_24, is_password=True)
         self.login_button = Button(450, 400, self.button_images['start'], 1)
         self.login_error = ''
+        self.rooms = []
         # if len(sys.argv) != 3:
         #     print("Usage: python client.py <server_host> <tcp_port>")
         #     sys.exit(1)
@@ -28,11 +33,69 @@ class UIManager:
         # tcp_port = int(sys.argv[2])
         # udp_port = tcp_port + 1  # Assume UDP port is TCP port + 1
     
-        self.client_connect= GameClient(Config.SERVER_IP, Config.SERVER_PORT_TCP)
+        self.client_connect= GameClient(Config.SERVER_IP, Config.SERVER_PORT_TCP, core=network)
+        # Mất kết nối (kể cả lần connect đầu) thì thử lại nền, game không thoát
+        self.supervisor = ReconnectSupervisor(self.client_connect)
+        self.connection_notice = None
 
-        if not self.client_connect.connect():
+        if connect and not self.client_connect.connect():
             print("Failed to connect to server")
-            sys.exit(1)
+            self.supervisor.reconnect()
+
+        # Handler mạng không đụng vào UI: UI cập nhật khi GameManager drain event mỗi frame
+        events = self.client_connect.events
+        events.subscribe(StateChanged, self._on_state_changed)
+        events.subscribe(Authenticated, self._on_authenticated)
+        events.subscribe(AuthFailed, self._on_auth_failed)
+        events.subscribe(RoomsListed, self._on_rooms_listed)
+        events.subscribe(RoomUpdated, self._on_room_updated)
+        events.subscribe(MatchStarted, self._on_match_started)
+        events.subscribe(Reconnecting, self._on_reconnecting)
+        events.subscribe(Reconnected, self._on_reconnected)
+        events.subscribe(ReconnectFailed, self._on_reconnect_failed)
+
+    def shutdown(self):
+        """Close the lobby connection for good; the supervisor must not bring it back"""
+        self.supervisor.stop()
+        self.client_connect.disconnect()
+
+    def _on_state_changed(self, event):
+        if event.state == ConnectionState.IN_GAME:
+            self.game_state.start_game = True
+        elif event.state in (ConnectionState.AUTHENTICATED, ConnectionState.IN_ROOM):
+            self.game_state.state = event.state
+        elif event.state in (ConnectionState.CONNECTED, ConnectionState.DISCONNECTED):
+            # Logout hoặc mất kết nối: quay về màn hình đăng nhập, không để màn hình phòng treo lại
+            self.game_state.state = event.state
+            self.game_state.current_room = None
+            self.game_state.current_room_id = 0
+            self.rooms = []
+
+    def _on_authenticated(self, event):
+        print(f"Logged in as {event.username}")
+        Config.PLAYERID = event.user_id
+        self.login_error = ''
+
+    def _on_auth_failed(self, event):
+        self.login_error = "Invalid credentials"
+
+    def _on_rooms_listed(self, event):
+        self.rooms = event.rooms
+
+    def _on_room_updated(self, event):
+        self.game_state.current_room = event.room
+
+    def _on_match_started(self, event):
+        Config.MATCHID = event.match_id
+
+    def _on_reconnecting(self, event):
+        self.connection_notice = f"Mất kết nối, đang kết nối lại (lần {event.attempt})..."
+
+    def _on_reconnected(self, event):
+        self.connection_notice = None
+
+    def _on_reconnect_failed(self, event):
+        self.connection_notice = "Không thể kết nối tới server"
         
     def _load_assets(self):
         """Load UI assets"""
@@ -161,15 +224,14 @@ class UIManager:
         """Render main menu"""
         pygame.mouse.set_visible(True)
         self.screen.blit(self.bg_menu, (0, 0))
-        if self.game_state.state == ConnectionState.CONNECTED:
+        # game_state chỉ đổi theo thao tác UI hoặc event lobby, không đọc state của luồng mạng
+        if self.game_state.state in (ConnectionState.CONNECTED, ConnectionState.DISCONNECTED):
             self.render_login_screen()
             return 
         elif self.game_state.state == ConnectionState.AUTHENTICATED:
             self.render_list_room()
-        elif self.client_connect.state == ConnectionState.IN_ROOM:
+        elif self.game_state.state == ConnectionState.IN_ROOM:
             self.render_room()
-        elif self.client_connect.state == ConnectionState.IN_GAME:
-            self.game_state.start_game=True
 
     def render_list_room(self):
         """Render danh sách phòng chơi"""
@@ -198,7 +260,8 @@ class UIManager:
                 print(f"Tham gia phòng: {room.room_name}")
                 self.game_state.current_room = room
                 self.game_state.current_room_id = room.room_id
-                self.client_connect.join_room(room.room_id)
+                # Không chặn vòng lặp pygame chờ response
+                self.client_connect.join_room(room.room_id, wait=False)
                 self.game_state.state = ConnectionState.IN_ROOM
                 self.client_connect.state = ConnectionState.IN_ROOM
                 break  # Chỉ xử lý 1 lần
@@ -228,6 +291,12 @@ class UIManager:
         self.screen.fill(Config.BLACK)
         self.screen.blit(self.win_text, self.win_rect)
         
+    def render_connection_notice(self):
+        """Reconnect status line on top of whatever screen is shown"""
+        if self.connection_notice:
+            surface = self.font_24.render(self.connection_notice, True, (255, 200, 0))
+            self.screen.blit(surface, (Config.SCREEN_WIDTH // 2 - surface.get_width() // 2, 10))
+        
     def render_hud(self, player_health, kill_count):
         """Render game HUD (health, score, etc.)"""
         # Draw health hearts
@@ -255,6 +324,14 @@ class UIManager:
         score_rect = score_surface.get_rect(topright=(Config.SCREEN_WIDTH - 30, 10))
         self.screen.blit(score_surface, score_rect)
         
+    def render_net_stats(self, lines):
+        """Draw the network stats overlay in the bottom-left corner"""
+        y = Config.SCREEN_HEIGHT - 10 - len(lines) * 26
+        for line in lines:
+            surface = self.font_24.render(line, True, Config.WHITE)
+            self.screen.blit(surface, (10, y))
+            y += 26
+        
     def draw_background(self, portal_rect=None, is_win=False):
         """Draw game background"""
         self.screen.fill(Config.BG_COLOR)
@@ -286,15 +363,9 @@ class UIManager:
         if self.login_button.draw(self.screen):
             username = self.username_box.text
             password = self.password_box.text
-            if self.client_connect.login(username, password):
-                self.game_state.state = ConnectionState.AUTHENTICATED
-                print(f"Logged in as {username}")
-                Config.PLAYERID=self.client_connect.user_id
-                self.client_connect.list_rooms()
-                
-                self.rooms=self.client_connect.rooms
-            else:
-                self.login_error = "Invalid credentials"
+            # Gửi list_rooms ngay sau login, không chờ: kết quả về qua Authenticated/AuthFailed và RoomsListed
+            self.client_connect.login(username, password, wait=False)
+            self.client_connect.list_rooms(wait=False)
 
         # Show error (if any)
         if self.login_error:
@@ -306,7 +377,7 @@ class UIManager:
         self.screen.blit(self.bg_menu, (0, 0))
         pygame.mouse.set_visible(True)
 
-        room = self.client_connect.current_room
+        room = self.game_state.current_room
 
         if room is None:
             return
@@ -333,7 +404,7 @@ class UIManager:
 
             if self.handle_start_button():
                 print("Game bắt đầu!")
-                self.client_connect.start_game()
+                self.client_connect.start_game(wait=False)
         else:
             waiting_surface = self.font_24.render("Chờ chủ phòng bắt đầu...", True, (255, 255, 0))
             self.screen.blit(waiting_surface, (Config.SCREEN_WIDTH // 2 - waiting_surface.get_width() // 2, 180))
@@ -344,5 +415,5 @@ class UIManager:
         if back_button.draw(self.screen):
             print("Thoát phòng.")
             self.game_state.state = ConnectionState.AUTHENTICATED
-            self.client_connect.list_rooms()
-            self.rooms = self.client_connect.rooms
+            # Danh sách mới về qua RoomsListed
+            self.client_connect.list_rooms(wait=False)
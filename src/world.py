@@ -25,6 +25,7 @@ class World():
 
         # Scroll
         self.screen_scroll = 0
+        self.bg_scroll = 0  # camera x trong toạ độ thế giới
 
         self.process_data()
 
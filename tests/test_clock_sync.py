@@ -0,0 +1,81 @@
+import random
+
+import pytest
+
+from src.clock_sync import TIME_SYNC_MAGIC, TIME_SYNC_REPLY, TIME_SYNC_REQUEST, ClockSync, is_time_sync_reply
+
+
+def _exchange(clock, t0, server, up, down, processing=0.001):
+    """One ping: server(local) maps local time to the server clock; returns t3"""
+    clock.request(t0)
+    t1 = server(t0 + up)
+    t2 = t1 + processing
+    t3 = t0 + up + processing + down
+    reply = TIME_SYNC_REPLY.pack(TIME_SYNC_MAGIC, t0, t1, t2)
+    assert is_time_sync_reply(reply)
+    assert clock.handle_reply(reply, t3)
+    return t3
+
+
+def test_symmetric_delay_gives_exact_offset_and_rtt():
+    clock = ClockSync()
+    _exchange(clock, 10.0, lambda local: local + 5.0, up=0.02, down=0.02)
+    assert clock.synchronized
+    assert clock.offset == pytest.approx(5.0)
+    assert clock.rtt == pytest.approx(0.04)
+    assert clock.server_time(11.0) == pytest.approx(16.0)
+    assert clock.local_time(16.0) == pytest.approx(11.0)
+
+
+def test_minimum_rtt_sample_filters_queueing_delay():
+    clock = ClockSync(window=8)
+    t = 0.0
+    # Hàng đợi chỉ làm chậm chiều về: offset của mẫu đó bị lệch
+    for down in (0.2, 0.01, 0.3, 0.15):
+        t = _exchange(clock, t, lambda local: local + 5.0, up=0.01, down=down) + 1.0
+    assert clock.rtt == pytest.approx(0.02)
+    assert clock.offset == pytest.approx(5.0)
+
+
+def test_drift_is_tracked_over_time():
+    clock = ClockSync()
+    rnd = random.Random(1)
+    server = lambda local: local * 1.0001 + 5.0  # server chạy nhanh hơn 100 ppm
+    t = 100.0
+    for _ in range(200):
+        t = _exchange(clock, t, server, up=0.01 + rnd.expovariate(100), down=0.01 + rnd.expovariate(100)) + 2.0
+    assert clock.drift == pytest.approx(0.0001, rel=0.05)
+    assert clock.offset_at(t) == pytest.approx(server(t) - t, abs=0.005)
+    assert clock.local_time(clock.server_time(t)) == pytest.approx(t, abs=1e-6)
+
+
+def test_reply_that_matches_no_request_is_rejected():
+    clock = ClockSync()
+    clock.request(10.0)
+    # t0 sau thời điểm nhận: reply của một đồng hồ khác hoặc bị sửa
+    reply = TIME_SYNC_REPLY.pack(TIME_SYNC_MAGIC, 12.0, 20.0, 20.0)
+    assert not clock.handle_reply(reply, 11.0)
+    assert (clock.rejected, clock.samples) == (1, 0)
+    assert not clock.synchronized
+
+
+def test_burst_then_steady_interval():
+    clock = ClockSync(interval=2.0, burst=3, burst_interval=0.1)
+    assert clock.is_due(0.0)
+    assert TIME_SYNC_REQUEST.unpack(clock.request(0.0)) == (0.0,)
+    assert clock.time_until_due(0.0) == pytest.approx(0.1)
+    clock.request(0.1)
+    clock.request(0.2)
+    assert clock.time_until_due(0.2) == pytest.approx(2.0)
+    assert not clock.is_due(1.0)
+    assert clock.is_due(2.2)
+
+
+def test_reset_forgets_samples_and_restarts_burst():
+    clock = ClockSync(burst=2)
+    _exchange(clock, 1.0, lambda local: local + 5.0, up=0.01, down=0.01)
+    clock.request(2.0)
+    clock.reset()
+    assert not clock.synchronized
+    assert (clock.offset, clock.rtt, clock.drift) == (0.0, None, 0.0)
+    assert clock.is_due(2.0)
@@ -0,0 +1,86 @@
+import random
+
+from src.fragments import FRAGMENT_HEADER, FRAGMENT_MAGIC, FragmentAssembler, is_fragment, split_snapshot
+
+MTU = 100
+
+
+def _snapshot(size, seed=0):
+    return bytes(random.Random(seed).randrange(256) for _ in range(size))
+
+
+def test_small_snapshot_is_not_fragmented():
+    data = _snapshot(MTU)
+    assert split_snapshot(data, 7, MTU) == [data]
+
+
+def test_fragments_respect_mtu_and_reassemble_in_any_order():
+    data = _snapshot(1000)
+    fragments = split_snapshot(data, 7, MTU)
+    assert len(fragments) == -(-len(data) // (MTU - FRAGMENT_HEADER.size))
+    assert all(len(fragment) <= MTU and is_fragment(fragment) for fragment in fragments)
+
+    random.Random(1).shuffle(fragments)
+    assembler = FragmentAssembler()
+    results = [assembler.add(memoryview(fragment), now=0.0) for fragment in fragments]
+    assert results[:-1] == [None] * (len(fragments) - 1)
+    assert results[-1] == (7, data)
+    assert (assembler.completed, assembler.pending) == (1, 0)
+
+
+def test_duplicate_fragment_is_counted_once():
+    data = _snapshot(300)
+    first, *rest = split_snapshot(data, 7, MTU)
+    assembler = FragmentAssembler()
+    assert assembler.add(first, 0.0) is None
+    assert assembler.add(first, 0.0) is None
+    results = [assembler.add(fragment, 0.0) for fragment in rest]
+    assert results[-1] == (7, data)
+
+
+def test_fragment_payload_is_copied_out_of_the_receive_buffer():
+    data = _snapshot(300)
+    first, *rest = split_snapshot(data, 7, MTU)
+    buffer = bytearray(first)
+    assembler = FragmentAssembler()
+    assembler.add(memoryview(buffer), 0.0)
+    # Luồng nhận ghi datagram kế tiếp vào cùng buffer
+    buffer[FRAGMENT_HEADER.size:] = bytes(len(buffer) - FRAGMENT_HEADER.size)
+    results = [assembler.add(fragment, 0.0) for fragment in rest]
+    assert results[-1] == (7, data)
+
+
+def test_incomplete_tick_expires_after_timeout():
+    fragments = split_snapshot(_snapshot(300), 7, MTU)
+    assembler = FragmentAssembler(timeout=0.25)
+    assembler.add(fragments[0], now=0.0)
+    other = split_snapshot(_snapshot(300, seed=1), 8, MTU)
+    assembler.add(other[0], now=0.3)
+    assert assembler.expired == 1
+    # Fragment còn lại của tick 7 mở lại một tick mới, không hoàn tất được
+    assert assembler.add(fragments[1], now=0.3) is None
+    assert assembler.add(fragments[2], now=0.3) is None
+    assert assembler.completed == 0
+
+
+def test_completed_tick_drops_older_incomplete_ticks_across_wrap():
+    old = split_snapshot(_snapshot(300), 0xFFFFFFFF, MTU)
+    new_data = _snapshot(300, seed=1)
+    new = split_snapshot(new_data, 1, MTU)
+    assembler = FragmentAssembler()
+    assembler.add(old[0], 0.0)
+    results = [assembler.add(fragment, 0.0) for fragment in new]
+    assert results[-1] == (1, new_data)
+    assert (assembler.pending, assembler.expired) == (0, 1)
+
+
+def test_malformed_fragment_is_rejected():
+    assembler = FragmentAssembler()
+    bad_index = FRAGMENT_HEADER.pack(FRAGMENT_MAGIC, 7, 3, 3) + b'x'
+    assert assembler.add(bad_index, 0.0) is None
+    first = split_snapshot(_snapshot(300), 7, MTU)[0]
+    assembler.add(first, 0.0)
+    # Cùng tick nhưng số fragment khác
+    mismatched = FRAGMENT_HEADER.pack(FRAGMENT_MAGIC, 7, 0, 2) + b'x'
+    assert assembler.add(mismatched, 0.0) is None
+    assert assembler.malformed == 2
@@ -0,0 +1,109 @@
+import threading
+import time
+
+from src.heartbeat import HeartbeatMonitor
+from src.tcp_connect import ConnectionState, GameClient
+
+
+def test_first_heartbeat_is_due_immediately():
+    monitor = HeartbeatMonitor(interval=15.0)
+    assert monitor.time_until_due(100.0) == 0.0
+    assert monitor.poll(100.0)
+
+
+def test_echo_measures_rtt_and_waits_full_interval():
+    monitor = HeartbeatMonitor(interval=15.0, min_interval=1.0, timeout=3.0)
+    monitor.on_sent(7, 100.0)
+    assert monitor.on_echo(7, monitor.payload(100.0), 100.25) == 0.25
+    assert monitor.healthy
+    assert not monitor.poll(110.0)
+    assert monitor.time_until_due(110.0) == 5.0
+
+
+def test_echo_without_payload_is_matched_by_sequence():
+    monitor = HeartbeatMonitor()
+    monitor.on_sent(7, 100.0)
+    assert monitor.on_echo(7, b'', 100.5) == 0.5
+    assert monitor.on_echo(8, b'', 100.5) is None
+
+
+def test_timed_out_probe_is_retried_at_once_then_every_min_interval():
+    monitor = HeartbeatMonitor(interval=15.0, min_interval=1.0, timeout=3.0, max_missed=3)
+    monitor.on_sent(1, 100.0)
+    assert not monitor.poll(102.9)
+    assert monitor.time_until_due(103.0) == 0.0
+    assert monitor.poll(103.0)
+    assert monitor.missed == 1
+    assert not monitor.healthy
+    assert monitor.current_interval() == 1.0
+
+    monitor.on_sent(2, 103.0)
+    monitor.on_echo(2, b'', 103.1)
+    assert monitor.missed == 0
+    assert monitor.healthy
+    assert monitor.current_interval() == 15.0
+
+
+def test_max_missed_in_a_row_marks_peer_dead():
+    monitor = HeartbeatMonitor(timeout=3.0, max_missed=3)
+    now = 100.0
+    for sequence in (1, 2):
+        monitor.on_sent(sequence, now)
+        now += 3.0
+        assert monitor.poll(now)
+        assert not monitor.dead
+    monitor.on_sent(3, now)
+    now += 3.0
+    assert not monitor.poll(now)
+    assert monitor.dead
+    assert monitor.missed_total == 3
+
+    monitor.reset()
+    assert not monitor.dead
+    assert monitor.missed_total == 3
+
+
+def _run_loop(client):
+    sent = []
+
+    def send(now):
+        sent.append(now)
+        client.heartbeat.on_sent(len(sent), now)
+
+    client._send_heartbeat = send
+    client.running = True
+    client.state = ConnectionState.CONNECTED
+    client.tcp_socket = sock = object()
+    wake = threading.Event()
+    thread = threading.Thread(target=client._heartbeat_loop, args=(sock, wake), daemon=True)
+    thread.start()
+    return sent, wake, thread
+
+
+def test_loop_retries_timed_out_probe_within_min_interval_until_dead():
+    client = GameClient('127.0.0.1', 0)
+    client.heartbeat = HeartbeatMonitor(interval=5.0, min_interval=0.2, timeout=0.05, max_missed=3)
+    lost = threading.Event()
+    client._connection_lost = lost.set
+    sent, wake, thread = _run_loop(client)
+
+    assert lost.wait(2.0)
+    thread.join(1.0)
+    assert not thread.is_alive()
+    assert len(sent) == 3
+    for earlier, later in zip(sent, sent[1:]):
+        assert later - earlier < 0.05 + 0.2
+
+
+def test_loop_wakes_immediately_on_disconnect():
+    client = GameClient('127.0.0.1', 0)
+    client.heartbeat = HeartbeatMonitor(interval=30.0, timeout=30.0)
+    sent, wake, thread = _run_loop(client)
+    while not sent:
+        time.sleep(0.01)
+
+    started = time.monotonic()
+    wake.set()
+    thread.join(1.0)
+    assert not thread.is_alive()
+    assert time.monotonic() - started < 0.5
@@ -0,0 +1,45 @@
+from src.server_connection import Action, InputHistory, Move, Payload
+
+
+def _push(history, sequence, left=0, right=0, up=0, down=0, action=Action.NONE, direction=1, x=0, y=0):
+    history.push(sequence, Payload(Move(left, right, up, down), action, direction, x, y))
+
+
+def test_encode_decode_round_trip_oldest_first():
+    history = InputHistory(size=8)
+    _push(history, 1, left=1)
+    _push(history, 2, up=1, action=Action.SHOOT, direction=-1, x=320, y=-40)
+    _push(history, 3, right=1, down=1)
+    data = b'prefix' + history.to_bytes()
+
+    inputs, end = InputHistory.decode(data, len(b'prefix'))
+    assert end == len(data)
+    assert inputs == [
+        (1, 0b0001, 1, 0, 0),
+        (2, 0b0100 | Action.SHOOT.value << 4, -1, 320, -40),
+        (3, 0b1010, 1, 0, 0),
+    ]
+
+
+def test_acknowledged_inputs_are_not_resent():
+    history = InputHistory(size=8)
+    for sequence in range(1, 6):
+        _push(history, sequence, left=sequence % 2)
+    history.acknowledge(3)
+    inputs, _ = InputHistory.decode(history.to_bytes())
+    assert [sequence for sequence, *_ in inputs] == [4, 5]
+
+
+def test_history_keeps_newest_records_and_wraps_sequence():
+    history = InputHistory(size=3)
+    for sequence in (0xFFFFFFFE, 0xFFFFFFFF, 0, 1):
+        _push(history, sequence)
+    inputs, _ = InputHistory.decode(history.to_bytes())
+    assert [sequence for sequence, *_ in inputs] == [0xFFFFFFFF, 0, 1]
+
+
+def test_out_of_range_fields_are_clamped():
+    history = InputHistory()
+    _push(history, 1, direction=500, x=100000, y=-100000)
+    (record,), _ = InputHistory.decode(history.to_bytes())
+    assert record[2:] == (127, 32767, -32768)
@@ -0,0 +1,92 @@
+import socket
+
+import pytest
+
+from src.config import Config
+from src.input_scheduler import InputScheduler
+from src import server_connection
+from src.server_connection import Action, InputHistory, MSG_INPUT_SEQ, SNAPSHOT_ACK
+
+HEADER_SIZE = 12  # player_id, msg_type, match_id
+
+
+@pytest.fixture
+def server():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    sock.settimeout(1.0)
+    yield sock
+    sock.close()
+
+
+@pytest.fixture
+def client(server, monkeypatch):
+    monkeypatch.setattr(Config, 'UDP_PROTOCOL_VERSION', 2)
+    client = server_connection.TestUDPClient(*server.getsockname(), player_id=1, match_id=1)
+    assert client.initialize()
+    yield client
+    client.stop()
+
+
+def _receive_all(server, expected):
+    datagrams = []
+    for _ in range(expected):
+        data, _ = server.recvfrom(2048)
+        datagrams.append(data)
+    server.settimeout(0.05)
+    with pytest.raises(socket.timeout):
+        server.recvfrom(2048)
+    return datagrams
+
+
+@pytest.mark.parametrize('fps', [20, 30, 60, 144])
+def test_held_ticks_follow_tick_rate_not_fps(fps):
+    scheduler = InputScheduler(tick_rate=30)
+    scheduler.restart_ticks(0.0)
+    ticks = sum(scheduler.ticks_due(frame / fps) for frame in range(1, fps * 2 + 1))
+    # Sai số dấu phẩy động ở biên tick cuối
+    assert 59 <= ticks <= 60
+
+
+def test_stalled_frame_drops_missing_ticks():
+    scheduler = InputScheduler(tick_rate=30)
+    scheduler.restart_ticks(0.0)
+    assert scheduler.ticks_due(1.0, limit=4) == 4
+    # Lịch tick bắt đầu lại từ lúc frame bị treo, không dồn thêm lệnh
+    assert scheduler.ticks_due(1.01) == 0
+    assert scheduler.ticks_due(1.0 + scheduler.tick_interval) == 1
+
+
+@pytest.mark.parametrize('fps', [30, 144])
+def test_held_input_sends_one_new_sequence_per_datagram(server, client, fps):
+    client.queue_input(right=True, action=Action.SHOOT, target_x=10, target_y=20)
+    client.input_changed()
+    start = client.scheduler.next_tick - client.scheduler.tick_interval
+    sent = [None]
+    for frame in range(1, fps + 1):
+        # Nửa frame lệch khỏi biên tick để sai số dấu phẩy động không đổi kết quả
+        now = start + (frame + 0.5) / fps
+        sent += client.send_held_input(right=True, target_x=10, target_y=20, now=now)
+
+    # Giữ phím một giây: số datagram theo INPUT_TICK_RATE, không theo FPS
+    assert len(sent) == Config.INPUT_TICK_RATE + 1
+    datagrams = _receive_all(server, len(sent))
+    newest = []
+    for data in datagrams:
+        assert int.from_bytes(data[4:8], 'big') == MSG_INPUT_SEQ
+        inputs, end = InputHistory.decode(data, HEADER_SIZE + SNAPSHOT_ACK.size)
+        assert end == len(data)
+        newest.append(inputs[-1][0])
+    # Mỗi datagram mang đúng một sequence mới
+    assert newest == list(range(1, len(datagrams) + 1))
+    assert sent[1:] == newest[1:]
+
+
+def test_no_datagrams_while_idle(server, client):
+    client.queue_input()
+    client.input_changed()
+    start = client.scheduler.next_tick
+    for frame in range(1, 31):
+        assert client.send_held_input(now=start + frame / 30) == []
+    assert len(_receive_all(server, 1)) == 1
+    assert client.input_sequence == 1
@@ -0,0 +1,41 @@
+import pytest
+
+from src.lobby_codec import STR, U8, U32, ListOf, Schema
+from src.tcp_connect import LOBBY_SCHEMAS, MessageType, Room
+
+
+def test_room_list_round_trip():
+    schema = LOBBY_SCHEMAS[MessageType.LIST_ROOMS_RESPONSE]
+    rooms = [(1, "phòng 1", 2, 4, 0), (2, "", 0, 8, 1)]
+    decoded = schema.decode(memoryview(schema.encode(rooms))).rooms
+    assert decoded == [Room(*room) for room in rooms]
+
+
+def test_optional_field_is_none_when_absent():
+    schema = LOBBY_SCHEMAS[MessageType.LOGIN_RESPONSE]
+    assert schema.decode(schema.encode(1, 42, None)) == (1, 42, None)
+    assert schema.decode(schema.encode(1, 42, 'token')) == (1, 42, 'token')
+
+
+@pytest.mark.parametrize('cut', [1, 4, 6, 10, 13])
+def test_truncated_payload_raises_value_error(cut):
+    schema = LOBBY_SCHEMAS[MessageType.LIST_ROOMS_RESPONSE]
+    payload = schema.encode([(1, "room", 2, 4, 0)])
+    with pytest.raises(ValueError):
+        schema.decode(payload[:cut])
+
+
+def test_string_length_past_payload_raises_value_error():
+    schema = Schema(('name', STR))
+    with pytest.raises(ValueError):
+        schema.decode(b'\x00\x00\x00\x09abc')
+
+
+def test_field_names_do_not_clash_with_codec_locals():
+    item = Schema(('offset', U32))
+    schema = Schema(('buf', U32), ('offset', STR), ('size', U8), ('parts', ListOf(item)),
+                    optional=(('encode', STR),))
+    values = (1, 'x', 3, [(5,), (6,)], 'e')
+    decoded = schema.decode(schema.encode(*values))
+    assert (decoded.buf, decoded.offset, decoded.size, decoded.encode) == (1, 'x', 3, 'e')
+    assert [entry.offset for entry in decoded.parts] == [5, 6]
@@ -0,0 +1,51 @@
+from src.lobby_events import (
+    Authenticated, EventBridge, MatchStarted, Reconnecting, RoomsListed, RoomUpdated, StateChanged,
+)
+
+
+def test_full_queue_drops_oldest_informational_event():
+    bridge = EventBridge(maxsize=3)
+    bridge.post(StateChanged(1, 0))
+    bridge.post(RoomsListed([]))
+    bridge.post(Authenticated(1, 'a'))
+    bridge.post(RoomUpdated(None))
+    assert list(bridge._events) == [StateChanged(1, 0), Authenticated(1, 'a'), RoomUpdated(None)]
+    assert bridge.dropped == 1
+
+
+def test_state_transitions_are_never_dropped():
+    bridge = EventBridge(maxsize=2)
+    transitions = [StateChanged(1, 0), Authenticated(1, 'a'), StateChanged(3, 2), MatchStarted(7, 9)]
+    for event in transitions:
+        bridge.post(event)
+    bridge.post(Reconnecting(1, 0.5))
+    assert list(bridge._events) == transitions
+    assert bridge.dropped == 1
+
+    seen = []
+    bridge.subscribe(StateChanged, seen.append)
+    bridge.subscribe(MatchStarted, seen.append)
+    assert bridge.drain() == 4
+    assert seen == [StateChanged(1, 0), StateChanged(3, 2), MatchStarted(7, 9)]
+
+
+def test_consecutive_state_changes_are_merged():
+    bridge = EventBridge(maxsize=2)
+    for state in range(1, 1001):
+        bridge.post(StateChanged(state, state - 1))
+    assert list(bridge._events) == [StateChanged(1000, 0)]
+    assert bridge.coalesced == 999
+
+    # Event khác ở giữa thì hai lần đổi state được giữ riêng
+    bridge.post(Authenticated(1, 'a'))
+    bridge.post(StateChanged(1001, 1000))
+    assert list(bridge._events) == [StateChanged(1000, 0), Authenticated(1, 'a'), StateChanged(1001, 1000)]
+
+
+def test_bridge_without_consumer_keeps_nothing():
+    bridge = EventBridge(maxsize=0)
+    bridge.post(StateChanged(1, 0))
+    bridge.post(MatchStarted(7, 9))
+    bridge.post(RoomsListed([]))
+    assert len(bridge) == 0
+    assert (bridge.posted, bridge.dropped) == (3, 3)
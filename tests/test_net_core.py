@@ -0,0 +1,89 @@
+import asyncio
+import socket
+import time
+
+from src.net_core import AsyncGameClient, NetworkCore
+from src.tcp_connect import MessageType
+
+
+def test_call_runs_coroutines_on_the_loop_thread():
+    core = NetworkCore()
+    core.start()
+    try:
+        async def name():
+            import threading
+            return threading.current_thread().name
+        assert core.call(name(), timeout=2.0) == "network-core"
+    finally:
+        core.stop()
+
+
+def test_stop_cancels_and_awaits_pending_tasks_then_closes_loop():
+    core = NetworkCore()
+    core.start()
+    cleaned_up = []
+
+    async def forever():
+        try:
+            await asyncio.sleep(3600)
+        finally:
+            cleaned_up.append(True)
+
+    async def spawn():
+        return asyncio.get_running_loop().create_task(forever())
+
+    task = core.call(spawn(), timeout=2.0)
+    loop = core.loop
+    core.stop()
+
+    assert task.cancelled()
+    assert cleaned_up == [True]
+    assert loop.is_closed()
+    assert core._thread is None
+
+
+def test_stop_is_idempotent_and_core_can_restart():
+    core = NetworkCore()
+    core.stop()
+    core.start()
+    core.stop()
+    core.stop()
+    core.start()
+    try:
+        async def answer():
+            return 42
+        assert core.call(answer(), timeout=2.0) == 42
+    finally:
+        core.stop()
+
+
+def test_lobby_requests_share_pending_requests_timeout_and_cancel():
+    # Server nhận kết nối nhưng không bao giờ trả lời
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen()
+    core = NetworkCore()
+    core.start()
+    try:
+        lobby = AsyncGameClient(core, *server.getsockname())
+        assert core.call(lobby.connect(), timeout=2.0)
+        peer, _ = server.accept()
+
+        started = time.monotonic()
+        assert core.call(lobby.request(MessageType.LIST_ROOMS_REQUEST, timeout=0.05), timeout=2.0) is None
+        assert time.monotonic() - started < 1.0
+        assert lobby.client.pending.timeouts == 1
+        assert len(lobby.client.pending) == 0
+
+        waiting = core.submit(lobby.request(MessageType.LIST_ROOMS_REQUEST, timeout=30.0))
+        deadline = time.monotonic() + 2.0
+        while not len(lobby.client.pending) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert len(lobby.client.pending) == 1
+        # Mất kết nối: request đang chờ trả None ngay, không đợi hết timeout
+        peer.close()
+        assert waiting.result(timeout=2.0) is None
+        assert len(lobby.client.pending) == 0
+    finally:
+        core.stop()
+        server.close()
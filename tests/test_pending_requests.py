@@ -0,0 +1,37 @@
+import time
+
+from src.tcp_connect import MessageType, PendingRequests, ProtocolMessage
+
+
+def _response(sequence, payload=b''):
+    return ProtocolMessage(type=MessageType.LOGIN_RESPONSE, sequence=sequence, payload=memoryview(payload))
+
+
+def test_unanswered_request_times_out_to_none():
+    pending = PendingRequests()
+    started = time.monotonic()
+    future = pending.register(1, 0.05)
+    assert future.result(timeout=2.0) is None
+    assert time.monotonic() - started >= 0.05
+    assert pending.timeouts == 1
+    assert len(pending) == 0
+
+
+def test_earlier_deadline_registered_later_expires_first():
+    pending = PendingRequests()
+    slow = pending.register(1, 5.0)
+    fast = pending.register(2, 0.05)
+    assert fast.result(timeout=2.0) is None
+    assert not slow.done()
+    pending.cancel_all()
+    assert slow.result(timeout=0) is None
+
+
+def test_response_resolves_with_detached_payload():
+    pending = PendingRequests()
+    future = pending.register(3, 5.0)
+    assert pending.resolve(_response(3, b'\x01'))
+    msg = future.result(timeout=0)
+    assert isinstance(msg.payload, bytes) and msg.payload == b'\x01'
+    assert not pending.resolve(_response(3))
+    assert pending.timeouts == 0
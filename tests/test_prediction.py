@@ -0,0 +1,71 @@
+from src.prediction import InputPredictor
+
+
+class _Player:
+    """Một bước move() dịch 1 đơn vị mỗi hướng, như Player.move với tốc độ 1"""
+
+    def __init__(self, x=0.0, y=0.0):
+        self.x, self.y = x, y
+
+    def move(self, left, right, up, down):
+        self.x += right - left
+        self.y += down - up
+
+    def set_position(self, x, y):
+        self.x, self.y = x, y
+
+
+def test_apply_moves_immediately_and_keeps_input():
+    player, predictor = _Player(), InputPredictor()
+    predictor.apply(player, 1, False, True, False, False)
+    predictor.apply(player, 2, False, True, False, True)
+    assert (player.x, player.y) == (2, 1)
+    assert [sequence for sequence, *_ in predictor.pending] == [1, 2]
+
+
+def test_reconcile_replays_unacknowledged_inputs():
+    player, predictor = _Player(), InputPredictor()
+    for sequence in (1, 2, 3):
+        predictor.apply(player, sequence, False, True, False, False)
+    # Server đã áp dụng input 1 và đặt player ở x=10
+    predictor.reconcile(player, 10.0, 0.0, acked=1)
+    assert (player.x, player.y) == (12, 0)
+    assert [sequence for sequence, *_ in predictor.pending] == [2, 3]
+    assert predictor.corrections == 1
+
+
+def test_matching_server_position_is_not_a_correction():
+    player, predictor = _Player(), InputPredictor()
+    for sequence in (1, 2):
+        predictor.apply(player, sequence, False, True, False, False)
+    predictor.reconcile(player, 1.0, 0.0, acked=1)
+    assert player.x == 2
+    assert predictor.corrections == 0
+
+
+def test_stale_ack_is_ignored():
+    player, predictor = _Player(), InputPredictor()
+    for sequence in (1, 2, 3):
+        predictor.apply(player, sequence, False, True, False, False)
+    predictor.reconcile(player, 2.0, 0.0, acked=2)
+    predictor.reconcile(player, 0.0, 0.0, acked=1)
+    assert player.x == 3
+    assert predictor.last_acked == 2
+
+
+def test_reconcile_across_sequence_wrap():
+    player, predictor = _Player(), InputPredictor()
+    for sequence in (0xFFFFFFFE, 0xFFFFFFFF, 0, 1):
+        predictor.apply(player, sequence, False, True, False, False)
+    predictor.reconcile(player, 0.0, 0.0, acked=0xFFFFFFFE)
+
+    # Ack sau mốc wrap: chỉ input 1 còn chờ
+    predictor.reconcile(player, 3.0, 0.0, acked=0)
+    assert [sequence for sequence, *_ in predictor.pending] == [1]
+    assert player.x == 4
+    assert predictor.last_acked == 0
+
+    # Snapshot trễ từ trước mốc wrap bị bỏ qua
+    predictor.reconcile(player, 0.0, 0.0, acked=0xFFFFFFFF)
+    assert player.x == 4
+    assert predictor.last_acked == 0
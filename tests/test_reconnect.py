@@ -0,0 +1,21 @@
+import random
+
+import pytest
+
+from src.reconnect import Backoff
+
+
+@pytest.mark.parametrize('attempt', [0, 1, 3, 6, 20, 100])
+def test_backoff_delay_stays_within_jitter_bounds(attempt):
+    backoff = Backoff(base_delay=0.5, max_delay=15.0, rng=random.Random(attempt).random)
+    cap = min(15.0, 0.5 * 2 ** attempt)
+    delays = [backoff.delay(attempt) for _ in range(500)]
+    assert all(0.0 <= delay <= cap for delay in delays)
+    # Full jitter: trải đều trên [0, cap], không dồn về một giá trị
+    assert max(delays) - min(delays) > cap / 2
+
+
+def test_backoff_bounds_follow_rng_extremes():
+    assert Backoff(0.5, 15.0, rng=lambda: 0.0).delay(4) == 0.0
+    assert Backoff(0.5, 15.0, rng=lambda: 1.0).delay(4) == 8.0
+    assert Backoff(0.5, 15.0, rng=lambda: 1.0).delay(10) == 15.0
@@ -0,0 +1,100 @@
+import pytest
+
+from src.snapshot import (SnapshotDecoder, SnapshotError, TickFilter, encode_delta, encode_snapshot,
+                          serial_ahead)
+
+PLAYERS = [(1, 10.5, 20.25, 100), (2, 30.0, 40.0, 80), (3, -5.0, 7.5, 60)]
+BULLETS = [(11, 1.5, 2.5), (12, 3.0, 4.0)]
+
+
+def _players(snapshot):
+    return list(snapshot.players())
+
+
+def _bullets(snapshot):
+    return list(snapshot.bullets())
+
+
+def test_protocol_1_full_snapshot_round_trip():
+    snapshot = SnapshotDecoder().decode(encode_snapshot(7, PLAYERS, BULLETS))
+    assert snapshot.match_id == 7
+    assert snapshot.ack_input is None
+    assert _players(snapshot) == PLAYERS
+    # Protocol 1 không có id đạn: id là chỉ số
+    assert _bullets(snapshot) == [(0, 1.5, 2.5), (1, 3.0, 4.0)]
+
+
+def test_protocol_2_full_snapshot_round_trip():
+    data = encode_snapshot(7, PLAYERS, BULLETS, ack_input=42, tick=100, server_time=12.5)
+    snapshot = SnapshotDecoder().decode(memoryview(data))
+    assert (snapshot.ack_input, snapshot.tick, snapshot.server_time) == (42, 100, 12.5)
+    assert _players(snapshot) == PLAYERS
+    assert _bullets(snapshot) == BULLETS
+
+
+def test_delta_round_trip_against_baseline():
+    decoder = SnapshotDecoder()
+    base = decoder.decode(encode_snapshot(7, PLAYERS, BULLETS, ack_input=1, tick=100))
+
+    players = [(1, 11.0, 20.25, 100), (3, -5.0, 7.5, 55), (4, 0.0, 0.0, 100)]
+    bullets = [(12, 3.5, 4.0), (13, 9.0, 9.0)]
+    snapshot = decoder.decode(encode_delta(7, base, players, bullets, ack_input=2, tick=101))
+
+    assert snapshot.tick == 101
+    assert sorted(_players(snapshot)) == sorted(players)
+    assert sorted(_bullets(snapshot)) == sorted(bullets)
+    assert decoder.latest_tick == 101
+
+
+def test_unchanged_delta_reproduces_baseline():
+    decoder = SnapshotDecoder()
+    base = decoder.decode(encode_snapshot(7, PLAYERS, BULLETS, ack_input=1, tick=100))
+    snapshot = decoder.decode(encode_delta(7, base, PLAYERS, BULLETS, ack_input=1, tick=101))
+    assert sorted(_players(snapshot)) == sorted(PLAYERS)
+    assert sorted(_bullets(snapshot)) == sorted(BULLETS)
+
+
+def test_delta_without_baseline_is_rejected():
+    base = SnapshotDecoder().decode(encode_snapshot(7, PLAYERS, BULLETS, ack_input=1, tick=100))
+    decoder = SnapshotDecoder()
+    with pytest.raises(SnapshotError):
+        decoder.decode(encode_delta(7, base, PLAYERS, BULLETS, ack_input=1, tick=101))
+    assert decoder.missing_baseline == 1
+
+
+def test_tick_filter_rejects_stale_and_duplicate_ticks():
+    ticks = TickFilter()
+    assert ticks.accept(10)
+    assert ticks.accept(13)
+    assert not ticks.accept(13)
+    assert not ticks.accept(12)
+    assert ticks.stats() == {'received': 4, 'accepted': 2, 'duplicates': 1,
+                             'reordered': 1, 'gaps': 2, 'lost': 1}
+
+
+def test_tick_filter_wraps_around():
+    ticks = TickFilter()
+    assert ticks.accept(0xFFFFFFFE)
+    assert ticks.accept(0xFFFFFFFF)
+    assert ticks.accept(1)
+    assert ticks.gaps == 1
+    assert not ticks.accept(0xFFFFFFFF)
+    assert ticks.is_stale(0xFFFFFFF0)
+    assert not ticks.is_stale(2)
+
+
+def test_serial_ahead_wraps_around():
+    assert serial_ahead(5, 3) == 2
+    assert serial_ahead(3, 5) == -2
+    assert serial_ahead(1, 0xFFFFFFFF) == 2
+    assert serial_ahead(0xFFFFFFFF, 1) == -2
+
+
+def test_decoder_latest_tick_wraps_around():
+    decoder = SnapshotDecoder()
+    decoder.decode(encode_snapshot(7, PLAYERS, BULLETS, ack_input=1, tick=0xFFFFFFFE))
+    decoder.decode(encode_snapshot(7, PLAYERS, BULLETS, ack_input=2, tick=1))
+    assert decoder.latest_tick == 1
+    # Snapshot đến trễ từ trước mốc wrap không kéo latest_tick lùi lại
+    decoder.decode(encode_snapshot(7, PLAYERS, BULLETS, ack_input=1, tick=0xFFFFFFFF))
+    assert decoder.latest_tick == 1
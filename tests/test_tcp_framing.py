@@ -0,0 +1,66 @@
+import pytest
+
+from src.tcp_connect import MessageFramer, MessageType, ProtocolMessage
+
+
+def _message(sequence, payload):
+    return ProtocolMessage(type=MessageType.HEARTBEAT, sequence=sequence, payload=payload).serialize()
+
+
+def _payloads(framer):
+    return [bytes(ProtocolMessage.deserialize(frame).payload) for frame in framer.frames()]
+
+
+def test_frames_split_at_every_byte():
+    stream = _message(1, b'hello') + _message(2, b'') + _message(3, b'x' * 300)
+    framer = MessageFramer(initial_size=16)
+    received = []
+    for i in range(len(stream)):
+        framer.feed(stream[i:i + 1])
+        received += _payloads(framer)
+    assert received == [b'hello', b'', b'x' * 300]
+    assert framer.pending == 0
+    assert framer.frames_total == 3
+
+
+def test_header_split_across_reads():
+    data = _message(1, b'abc')
+    framer = MessageFramer()
+    framer.feed(data[:3])
+    assert _payloads(framer) == []
+    framer.feed(data[3:10])
+    assert _payloads(framer) == []
+    framer.feed(data[10:])
+    assert _payloads(framer) == [b'abc']
+
+
+def test_message_larger_than_buffer_grows_it():
+    framer = MessageFramer(initial_size=32)
+    payload = bytes(range(256)) * 40
+    data = _message(5, payload)
+    framer.feed(data[:100])
+    assert _payloads(framer) == []
+    framer.feed(data[100:])
+    assert _payloads(framer) == [payload]
+
+
+def test_invalid_length_raises_value_error():
+    framer = MessageFramer()
+    framer.feed(b'\x00\x00\x00\x03' + b'\x00' * 4)
+    with pytest.raises(ValueError):
+        list(framer.frames())
+
+
+def test_messages_match_frames():
+    stream = _message(1, b'hello') + _message(2, b'') + _message(3, b'x' * 300) + _message(4, b'ab')[:5]
+    by_frame = MessageFramer(initial_size=16)
+    by_frame.feed(stream)
+    by_message = MessageFramer(initial_size=16)
+    by_message.feed(stream)
+    messages = list(by_message.messages())
+    expected = [ProtocolMessage.deserialize(frame) for frame in by_frame.frames()]
+    assert [(msg.length, msg.type, msg.sequence, bytes(msg.payload)) for msg in messages] == \
+        [(msg.length, msg.type, msg.sequence, bytes(msg.payload)) for msg in expected]
+    assert by_message.pending == by_frame.pending == 5
+    by_message.feed(_message(4, b'ab')[5:])
+    assert [bytes(msg.payload) for msg in by_message.messages()] == [b'ab']